@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Benchmarks the python and numpy backends of the posting list operations on real term pairs of an index.
+
+usage: bench_backends.py -d dictionary-file -p postings-file [-n repeat]
+For every length ratio from 1 to 1024, the longest postings of the index are paired with a term whose doc
+frequency is that many times smaller. Both numpy algorithms, merging and binary searching, are timed apart,
+so the crossover that npbackend.SKEW_RATIO and MIN_VECTOR_LEN should sit at can be read off the table.
+Only intersect picks between the two, union always merges and difference always searches.
+"""
+import getopt
+import sys
+import time
+
+import npbackend
+import postinglist
+from postinglist import PostingList
+from postingsfile import PostingsReader
+from termdict import load_dictionary
+
+RATIOS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+LONG_TERMS = 3
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file [-n repeat]")
+
+
+def timed(fn, repeat: int) -> float:
+    """
+    Returns the best wall time of fn over repeat runs, in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def load_pairs(dict_file: str, postings_file: str) -> list:
+    """
+    Returns (long, short) posting pairs of the index for every ratio in RATIOS, fully decoded.
+    """
+    dictionary = load_dictionary(dict_file)
+    by_freq = sorted(dictionary, key=dictionary.get_term_freq, reverse=True)
+    pairs = []
+    with PostingsReader(postings_file, dictionary.get_postings_format()) as reader:
+        def read(term: str) -> PostingList:
+            posting = reader.read(dictionary.get_term_pointer(term), dictionary.get_term_length(term))
+            return PostingList(posting.get_ids()[:])
+        for long_term in by_freq[:LONG_TERMS]:
+            long = read(long_term)
+            for ratio in RATIOS:
+                target = len(long) // ratio
+                short_term = min(by_freq[LONG_TERMS:], key=lambda t: abs(dictionary.get_term_freq(t) - target))
+                pairs.append((long_term, long, short_term, read(short_term)))
+    return pairs
+
+
+def with_skew_ratio(skew_ratio: int, fn):
+    """
+    Runs fn with npbackend forced to one algorithm, a skew ratio of 1 always searches, a huge one always merges.
+    """
+    saved = npbackend.SKEW_RATIO, npbackend.MIN_VECTOR_LEN
+    npbackend.SKEW_RATIO, npbackend.MIN_VECTOR_LEN = skew_ratio, 0
+    try:
+        return fn()
+    finally:
+        npbackend.SKEW_RATIO, npbackend.MIN_VECTOR_LEN = saved
+
+
+def run(pairs: list, repeat: int):
+    print("{:<10} {:<26} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+        "operation", "terms", "ratio", "python ms", "merge ms", "search ms", "adaptive"))
+    for name in ("intersect", "union", "difference"):
+        py_op = getattr(postinglist, name)
+        np_op = getattr(npbackend, name)
+        for long_term, long, short_term, short in pairs:
+            a, b = (long, short) if name == "difference" else (short, long)
+            expected = py_op(a, b)
+            merge = with_skew_ratio(sys.maxsize, lambda: np_op(a, b))
+            search = with_skew_ratio(1, lambda: np_op(a, b))
+            assert merge == expected and search == expected and np_op(a, b) == expected, name
+            print("{:<10} {:<26} {:>7.1f} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                name, "{} x {}".format(long_term, short_term), len(long) / max(len(short), 1),
+                timed(lambda: py_op(a, b), repeat),
+                with_skew_ratio(sys.maxsize, lambda: timed(lambda: np_op(a, b), repeat)),
+                with_skew_ratio(1, lambda: timed(lambda: np_op(a, b), repeat)),
+                timed(lambda: np_op(a, b), repeat)))
+
+
+def main():
+    dict_file = postings_file = None
+    repeat = 5
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:n:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-d':
+            dict_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-n':
+            repeat = int(a)
+        else:
+            assert False, "unhandled option"
+    if dict_file is None or postings_file is None:
+        usage()
+        sys.exit(2)
+    if not npbackend.is_available():
+        print("numpy is not installed")
+        sys.exit(1)
+    run(load_pairs(dict_file, postings_file), repeat)
+
+
+if __name__ == "__main__":
+    main()
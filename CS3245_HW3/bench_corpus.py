@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+"""
+Generates a synthetic Reuters-like corpus for benchmarks, reproducible from its seed.
+
+usage: bench_corpus.py -o output-directory -n number-of-documents [-s seed] [-v vocabulary-size] [-l mean-length]
+Like the Reuters training set, documents are plain text files named by ascending, sparse doc ids, a few
+sentences of newswire words with punctuation and numbers. Words are drawn from a Zipf-Mandelbrot distribution
+over the vocabulary, whose most frequent words are common Reuters words and the rest made up from syllables,
+and document lengths follow a log-normal distribution, so doc frequencies and posting lengths are skewed the
+way real postings are.
+"""
+import getopt
+import math
+import os
+import random
+import sys
+from itertools import accumulate
+from typing import List
+
+DEFAULT_VOCAB_SIZE = 50000
+DEFAULT_MEAN_LENGTH = 120  # words per document, close to the Reuters training set
+ZIPF_EXPONENT = 1.0
+ZIPF_SHIFT = 2.7  # flattens the head of the distribution, as in natural text
+LENGTH_SIGMA = 0.8  # spread of the log-normal document lengths
+NUMBER_RATE = 0.04  # share of tokens that are numbers, figures are common in newswire
+COMMON_WORDS = [
+    "the", "of", "to", "in", "and", "said", "a", "mln", "for", "dlrs", "it", "pct", "on", "is", "from", "vs",
+    "that", "its", "cts", "by", "at", "year", "be", "with", "will", "was", "billion", "net", "has", "would",
+    "an", "as", "u.s.", "not", "loss", "which", "are", "company", "inc", "but", "were", "bank", "shr", "oil",
+    "trade", "market", "share", "stock", "price", "rate", "profit", "qtr", "revs", "corp", "new", "also",
+    "last", "exchange", "government", "sales", "tonnes", "week", "quarter", "yen", "dollar", "prices",
+    "shares", "rates", "march", "april", "japan", "foreign", "group", "offer", "debt", "earnings",
+]
+_ONSETS = ["", "b", "c", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z",
+           "br", "ch", "cr", "dr", "fl", "gr", "pl", "pr", "sh", "st", "tr"]
+_VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "io", "ou"]
+_CODAS = ["", "", "", "", "n", "r", "s", "t", "l", "m", "nd", "rt", "st"]
+_SYLLABLES = [1, 2, 2, 2, 3, 3]
+
+
+def make_vocabulary(size: int, seed: int) -> List[str]:
+    """
+    Returns size distinct words, most frequent first: the common Reuters words, then words of one to three
+    made up syllables.
+    """
+    rng = random.Random(seed)
+    vocabulary = COMMON_WORDS[:size]
+    seen = set(vocabulary)
+    while len(vocabulary) < size:
+        word = "".join(rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS)
+                       for _ in range(rng.choice(_SYLLABLES)))
+        if len(word) > 1 and word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+def zipf_cum_weights(size: int) -> List[float]:
+    """
+    Returns the cumulative Zipf-Mandelbrot weights of ranks 0 to size - 1, for random.choices.
+    """
+    return list(accumulate(1 / (rank + ZIPF_SHIFT) ** ZIPF_EXPONENT for rank in range(size)))
+
+
+def make_doc(rng: random.Random, vocabulary: List[str], cum_weights: List[float], mean_length: int) -> str:
+    """
+    Returns the text of one document: a title line in capitals, then sentences of 8 to 30 words.
+    """
+    n_words = max(3, int(rng.lognormvariate(math.log(mean_length) - LENGTH_SIGMA ** 2 / 2, LENGTH_SIGMA)))
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=n_words)
+    for i in range(n_words):
+        if rng.random() < NUMBER_RATE:
+            words[i] = str(rng.randint(1, 999)) if rng.random() < 0.7 else "{:.1f}".format(rng.uniform(0, 100))
+    title_length = min(len(words), rng.randint(3, 8))
+    lines = [" ".join(words[:title_length]).upper()]
+    sentences = []
+    start = title_length
+    while start < n_words:
+        end = min(n_words, start + rng.randint(8, 30))
+        sentence = words[start:end]
+        sentence[0] = sentence[0].capitalize()
+        for i in range(1, len(sentence) - 1):
+            if rng.random() < 0.06:
+                sentence[i] += ","
+        sentences.append(" ".join(sentence) + ".")
+        start = end
+    lines.append(" ".join(sentences))
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(out_dir: str, n_docs: int, seed: int = 0, vocab_size: int = DEFAULT_VOCAB_SIZE,
+                    mean_length: int = DEFAULT_MEAN_LENGTH) -> List[int]:
+    """
+    Writes n_docs documents to out_dir and returns their doc ids. The same arguments always write the same corpus.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocab_size, seed)
+    cum_weights = zipf_cum_weights(vocab_size)
+    os.makedirs(out_dir, exist_ok=True)
+    doc_ids = []
+    doc_id = 0
+    for _ in range(n_docs):
+        doc_id += rng.randint(1, 3)  # Reuters doc ids are sparse
+        with open(os.path.join(out_dir, str(doc_id)), "wt") as f:
+            f.write(make_doc(rng, vocabulary, cum_weights, mean_length))
+        doc_ids.append(doc_id)
+    return doc_ids
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -o output-directory -n number-of-documents [-s seed] [-v vocabulary-size]"
+          + " [-l mean-length]")
+    print("  -s: random seed, the same seed and sizes always generate the same corpus, 0 by default")
+    print("  -v: number of distinct words, " + str(DEFAULT_VOCAB_SIZE) + " by default")
+    print("  -l: mean number of words per document, " + str(DEFAULT_MEAN_LENGTH) + " by default")
+
+
+def main():
+    out_dir = None
+    n_docs = 0
+    seed = 0
+    vocab_size = DEFAULT_VOCAB_SIZE
+    mean_length = DEFAULT_MEAN_LENGTH
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'o:n:s:v:l:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-o':
+            out_dir = a
+        elif o == '-n':
+            n_docs = int(a)
+        elif o == '-s':
+            seed = int(a)
+        elif o == '-v':
+            vocab_size = int(a)
+        elif o == '-l':
+            mean_length = int(a)
+        else:
+            assert False, "unhandled option"
+    if out_dir is None or n_docs <= 0:
+        usage()
+        sys.exit(2)
+    doc_ids = generate_corpus(out_dir, n_docs, seed, vocab_size, mean_length)
+    print("{} documents written to '{}', doc ids {} to {}".format(len(doc_ids), out_dir, doc_ids[0], doc_ids[-1]))
+
+
+if __name__ == "__main__":
+    main()
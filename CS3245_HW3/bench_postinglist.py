@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Benchmarks PostingList against the linked SortedSkipList it replaced.
+
+usage: bench_postinglist.py [-p postings-file] [-n repeat]
+Without a postings file, synthetic lists sized like the high-df terms of the Reuters corpus are used.
+"""
+import getopt
+import random
+import sys
+import time
+import tracemalloc
+
+from postinglist import PostingList
+from postinglist import union
+from postinglist import intersect
+from postinglist import complement
+from sortedskiplist import SortedSkipList
+from sortedskiplist import union as skip_union
+from sortedskiplist import intersect as skip_intersect
+from sortedskiplist import complement as skip_complement
+
+MAX_DOC_ID = 22000
+SYNTHETIC_SIZES = [7000, 3000, 300, 20]  # roughly "the", "pct", a mid-df term and a rare term
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " [-p postings-file] [-n repeat]")
+
+
+def load_real_lists(postings_file: str, count: int = 4) -> list:
+    """
+    Loads the doc ids of the longest posting lists in a text postings file,
+    plus one short list, so that skewed intersections are also covered.
+    """
+    lists = []
+    with open(postings_file, "rt") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 2 or not parts[1].isdigit():
+                continue
+            lists.append(sorted(map(int, parts[1:])))
+    lists.sort(key=len, reverse=True)
+    return lists[:count - 1] + [lists[len(lists) // 10]]
+
+
+def synthetic_lists() -> list:
+    rng = random.Random(3245)
+    return [sorted(rng.sample(range(MAX_DOC_ID), size)) for size in SYNTHETIC_SIZES]
+
+
+def build_skip_list(ids, shuffle: bool = False) -> SortedSkipList:
+    if shuffle:
+        ids = random.Random(0).sample(ids, len(ids))
+    res = SortedSkipList()
+    for i in ids:
+        res.add_val(i)
+    res.build_skip()
+    return res
+
+
+def build_posting_list(ids, shuffle: bool = False) -> PostingList:
+    if shuffle:
+        ids = random.Random(0).sample(ids, len(ids))
+    res = PostingList()
+    for i in ids:
+        res.add_val(i)
+    return res
+
+
+def timed(fn, repeat: int) -> float:
+    """
+    Returns the best wall time of fn over repeat runs, in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def memory_of(fn) -> int:
+    tracemalloc.start()
+    obj = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def report(name: str, old_ms: float, new_ms: float):
+    print("{:<34} {:>12.3f} {:>12.3f} {:>9.1f}x".format(name, old_ms, new_ms, old_ms / max(new_ms, 1e-9)))
+
+
+def run(lists: list, repeat: int):
+    all_ids = sorted(set().union(*lists))
+    print("list sizes: " + ", ".join(str(len(ids)) for ids in lists) + ", all ids: " + str(len(all_ids)))
+    print("{:<34} {:>12} {:>12} {:>10}".format("operation", "skiplist ms", "array ms", "speedup"))
+
+    longest = lists[0]
+    report("build {} in order".format(len(longest)),
+           timed(lambda: build_skip_list(longest), repeat), timed(lambda: build_posting_list(longest), repeat))
+    report("build {} shuffled".format(len(longest)),
+           timed(lambda: build_skip_list(longest, True), 1), timed(lambda: build_posting_list(longest, True), 1))
+
+    skip_lists = [build_skip_list(ids) for ids in lists]
+    posting_lists = [PostingList(ids) for ids in lists]
+    skip_all = build_skip_list(all_ids)
+    posting_all = PostingList(all_ids)
+    for i in range(len(lists)):
+        for j in range(i + 1, len(lists)):
+            pair = "{}x{}".format(len(lists[i]), len(lists[j]))
+            report("intersect " + pair,
+                   timed(lambda: skip_intersect(skip_lists[i], skip_lists[j]), repeat),
+                   timed(lambda: intersect(posting_lists[i], posting_lists[j]), repeat))
+            report("union " + pair,
+                   timed(lambda: skip_union(skip_lists[i], skip_lists[j]), repeat),
+                   timed(lambda: union(posting_lists[i], posting_lists[j]), repeat))
+    for i in range(len(lists)):
+        report("complement {}".format(len(lists[i])),
+               timed(lambda: skip_complement(skip_lists[i], skip_all), repeat),
+               timed(lambda: complement(posting_lists[i], posting_all), repeat))
+
+    print("{:<34} {:>12} {:>12}".format("memory of longest list (bytes)",
+                                        memory_of(lambda: build_skip_list(longest)),
+                                        memory_of(lambda: PostingList(longest))))
+
+
+def main():
+    postings_file = None
+    repeat = 5
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'p:n:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-p':
+            postings_file = a
+        elif o == '-n':
+            repeat = int(a)
+        else:
+            assert False, "unhandled option"
+
+    lists = load_real_lists(postings_file) if postings_file is not None else synthetic_lists()
+    run(lists, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Benchmarks MaxScore pruning against exhaustive scoring on the free text queries of a query file.
+
+usage: bench_ranked.py -d dictionary-file -p postings-file -q file-of-queries [-k K] [-n repeat]
+The index must be built with index.py --ranked. Query lines are split on whitespace, operators and parentheses
+are dropped. Both algorithms must return the same K doc ids for every query, and for each k from 1 up to K
+the table shows the postings scored and the best wall time of either, summed over the queries.
+"""
+import getopt
+import sys
+import time
+from collections import Counter
+
+from postingsfile import PostingsReader
+from query import OPERATORS
+from ranked import get_tf_path
+from ranked import query_weight
+from ranked import ScoreStats
+from ranked import TermScorer
+from ranked import TfReader
+from ranked import top_k_exhaustive
+from ranked import top_k_maxscore
+from stemcache import StemCache
+from termdict import load_dictionary
+
+KS = [1, 10, 100, 1000]
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries [-k K] [-n repeat]")
+
+
+def load_queries(dict_file: str, postings_file: str, queries_file: str) -> tuple:
+    """
+    Returns the ((doc ids, tfs, weight, max weight) of every term) of every query, fully decoded,
+    and the document norms.
+    """
+    dictionary = load_dictionary(dict_file)
+    stem_cache = StemCache()
+    queries = []
+    with PostingsReader(postings_file, dictionary.get_postings_format()) as reader, \
+            TfReader(get_tf_path(postings_file)) as tf_reader, open(queries_file, "rt") as f:
+        n_docs = tf_reader.get_n_docs()
+        for line in f:
+            tokens = [stem_cache.stem(token) for token in line.replace("(", " ").replace(")", " ").split()
+                      if token not in OPERATORS]
+            terms = []
+            for term, count in Counter(token for token in tokens if token in dictionary).items():
+                df = dictionary.get_term_freq(term)
+                if df >= n_docs:
+                    continue
+                pointer = dictionary.get_term_pointer(term)
+                posting = reader.read(pointer, dictionary.get_term_length(term))
+                terms.append((posting.get_ids()[:], tf_reader.read_tfs(pointer), query_weight(count, df, n_docs),
+                              tf_reader.get_max_weight(pointer)))
+            queries.append(terms)
+        norms = tf_reader.norms
+    return queries, norms
+
+
+def run_all(top_k, queries: list, k: int, norms: dict, stats: ScoreStats) -> list:
+    return [top_k([TermScorer(*term) for term in terms], k, norms, stats) for terms in queries]
+
+
+def timed(fn, repeat: int) -> float:
+    """
+    Returns the best wall time of fn over repeat runs, in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(queries: list, norms: dict, max_k: int, repeat: int):
+    print("{:>6} {:>12} {:>12} {:>9} {:>14} {:>14} {:>8}".format(
+        "k", "postings", "scored", "skipped", "exhaustive ms", "maxscore ms", "speedup"))
+    for k in [k for k in KS if k < max_k] + [max_k]:
+        stats = ScoreStats()
+        assert run_all(top_k_maxscore, queries, k, norms, stats) == run_all(top_k_exhaustive, queries, k, norms, None)
+        exhaustive = timed(lambda: run_all(top_k_exhaustive, queries, k, norms, None), repeat)
+        maxscore = timed(lambda: run_all(top_k_maxscore, queries, k, norms, None), repeat)
+        print("{:>6} {:>12} {:>12} {:>8.1%} {:>14.3f} {:>14.3f} {:>7.2f}x".format(
+            k, stats.postings, stats.scored, stats.skipped_rate(), exhaustive, maxscore, exhaustive / maxscore))
+
+
+def main():
+    dict_file = postings_file = queries_file = None
+    max_k = 10
+    repeat = 3
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:k:n:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-d':
+            dict_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-q':
+            queries_file = a
+        elif o == '-k':
+            max_k = int(a)
+        elif o == '-n':
+            repeat = int(a)
+        else:
+            assert False, "unhandled option"
+    if dict_file is None or postings_file is None or queries_file is None:
+        usage()
+        sys.exit(2)
+    queries, norms = load_queries(dict_file, postings_file, queries_file)
+    run(queries, norms, max_k, repeat)
+
+
+if __name__ == "__main__":
+    main()
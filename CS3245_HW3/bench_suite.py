@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+"""
+Benchmarks indexing and search end to end on a corpus, and compares the results with a stored baseline.
+
+usage: bench_suite.py -c corpus-directory -w work-directory -o results.json [--docs N] [--seed S]
+                      [-n queries-per-workload] [-r repeat] [--tokenizer nltk|fast] [-j jobs]
+                      [--baseline baseline.json] [--tolerance T] [--min-delta MS] [--search-args ARGS]
+A corpus directory that does not exist yet is generated with bench_corpus.py, N documents from seed S.
+The suite times build_index, merge_blocks again on the blocks build_index left behind, and loading the
+dictionary, then runs every workload of bench_workload.py through search.py --serve and records the
+latency percentiles of its queries, as measured by the server. The time to first result, from starting
+search.py to reading its first answer, is measured with and without --snapshot. Every metric is in
+milliseconds, lower is better. Results are written as JSON; with --baseline, a metric that got more than T times slower, and by more
+than MS milliseconds, is reported as a regression and the suite exits with status 1.
+"""
+import contextlib
+import getopt
+import io
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import time
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import index
+from bench_corpus import generate_corpus
+from bench_workload import generate_queries
+from bench_workload import terms_by_freq
+from bench_workload import WORKLOADS
+from block import Block
+from block import BLK_DICT_FORMAT
+from stats import percentile
+from stemcache import get_stems_path
+from stemcache import StemCache
+from termdict import load_dictionary
+from tokenizer import TOKENIZERS
+
+DICT_FILE = "dictionary.txt"
+POSTINGS_FILE = "postings.txt"
+MERGE_DICT_FILE = "merged-dictionary.txt"
+MERGE_POSTINGS_FILE = "merged-postings.txt"
+SNAPSHOT_FILE = "snapshot.bin"
+DEFAULT_DOCS = 10000
+DEFAULT_QUERIES = 200
+DEFAULT_TOLERANCE = 0.2  # a metric this much slower than its baseline is a regression
+DEFAULT_MIN_DELTA_MS = 1.0  # differences below this are timer noise, never regressions
+PERCENTILES = [50, 90, 99]
+SEARCH_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search.py")
+
+
+def timed(fn) -> Tuple[float, object]:
+    """
+    Returns the wall time of fn in milliseconds, and what it returned. Its output is swallowed.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn()
+        return (time.perf_counter() - start) * 1000, result
+
+
+def bench_index(corpus_dir: str, work_dir: str) -> Dict[str, float]:
+    """
+    Times build_index on the corpus, then merge_blocks on its blocks into a scratch index.
+    The stems are saved next to the dictionary, untimed, so search starts warm.
+    """
+    index.TMP_DIR = os.path.join(work_dir, "tmp")
+    index.ALL_DOC_IDS_FILE = os.path.join(work_dir, index.ALL_DOC_IDS_FILE)
+    out_dict, out_postings = os.path.join(work_dir, DICT_FILE), os.path.join(work_dir, POSTINGS_FILE)
+    build_ms, _ = timed(lambda: index.build_index(corpus_dir, out_dict, out_postings))
+    index.stem_cache.save(get_stems_path(out_dict))
+    n_blocks = 0
+    while os.path.exists(os.path.join(index.TMP_DIR, BLK_DICT_FORMAT.format(no=n_blocks))):
+        n_blocks += 1
+    blocks = [Block(blk_no, index.TMP_DIR) for blk_no in range(n_blocks)]
+    merge_dict, merge_postings = os.path.join(work_dir, MERGE_DICT_FILE), os.path.join(work_dir, MERGE_POSTINGS_FILE)
+    merge_ms, _ = timed(lambda: index.merge_blocks(blocks, merge_dict, merge_postings))
+    os.remove(merge_dict)
+    os.remove(merge_postings)
+    index.clean_up()
+    return {"build_index_ms": build_ms, "merge_blocks_ms": merge_ms}
+
+
+def bench_dict_load(work_dir: str, repeat: int) -> Dict[str, float]:
+    """
+    Times loading the dictionary, best of repeat loads, and touching every term so a lazy loader pays in full.
+    """
+    dict_file = os.path.join(work_dir, DICT_FILE)
+    best = min(timed(lambda: sum(1 for _ in load_dictionary(dict_file)))[0] for _ in range(repeat))
+    return {"dict_load_ms": best}
+
+
+def bench_queries(work_dir: str, n_queries: int, seed: int, search_args: List[str]) -> Dict[str, float]:
+    """
+    Answers the queries of every workload with one search.py --serve process, over its stdin and stdout,
+    and returns the latency percentiles and mean of every workload.
+    """
+    terms = terms_by_freq(os.path.join(work_dir, DICT_FILE))
+    command = [sys.executable, SEARCH_PY, "-d", DICT_FILE, "-p", POSTINGS_FILE, "--serve"] + search_args
+    metrics = {}
+    with subprocess.Popen(command, cwd=work_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True) as server:
+        for workload in WORKLOADS:
+            latencies = []
+            for query in generate_queries(workload, terms, n_queries, seed):
+                server.stdin.write(query + "\n")
+                server.stdin.flush()
+                response = server.stdout.readline()
+                if response == "":
+                    raise RuntimeError("search.py --serve exited, run: " + " ".join(command))
+                latencies.append(float(response.split("\t", 1)[0]))
+            latencies.sort()
+            for p in PERCENTILES:
+                metrics["query.{}.p{}_ms".format(workload, p)] = percentile(latencies, p)
+            metrics["query.{}.mean_ms".format(workload)] = sum(latencies) / len(latencies)
+        server.stdin.close()
+        server.stdout.read()
+    return metrics
+
+
+def first_result_ms(work_dir: str, query: str, search_args: List[str]) -> float:
+    """
+    Starts search.py --serve, sends it query and returns the milliseconds until its answer is read,
+    imports and loading the index included.
+    """
+    command = [sys.executable, SEARCH_PY, "-d", DICT_FILE, "-p", POSTINGS_FILE, "--serve"] + search_args
+    start = time.perf_counter()
+    with subprocess.Popen(command, cwd=work_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True) as server:
+        server.stdin.write(query + "\n")
+        server.stdin.flush()
+        response = server.stdout.readline()
+        elapsed = (time.perf_counter() - start) * 1000
+        server.stdin.close()
+        server.stdout.read()
+    if response == "":
+        raise RuntimeError("search.py --serve exited, run: " + " ".join(command))
+    return elapsed
+
+
+def bench_first_result(work_dir: str, seed: int, repeat: int, search_args: List[str]) -> Dict[str, float]:
+    """
+    Times the first result of a fresh search.py, best of repeat starts, with the index loaded as usual and
+    mapped in from a snapshot. The query has a NOT, so all doc ids are loaded too, and its terms are
+    tokens of the saved stems, words a user would type rather than stems. The snapshot is taken by an
+    untimed start first.
+    """
+    dict_file = os.path.join(work_dir, DICT_FILE)
+    saved = StemCache()
+    saved.load(get_stems_path(dict_file))
+    query = generate_queries("not_heavy", [term for term in terms_by_freq(dict_file) if term in saved], 1, seed)[0]
+    snapshot_args = search_args + ["--snapshot", SNAPSHOT_FILE]
+    snapshot_file = os.path.join(work_dir, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_file):
+        os.remove(snapshot_file)
+    first_result_ms(work_dir, query, snapshot_args)
+    return {
+        "first_result_ms": min(first_result_ms(work_dir, query, search_args) for _ in range(repeat)),
+        "first_result_snapshot_ms": min(first_result_ms(work_dir, query, snapshot_args) for _ in range(repeat)),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> List[Tuple[str, float, float, bool]]:
+    """
+    Returns (metric, baseline, current, regressed) of every metric in both results. A metric regressed when
+    it is over 1 + tolerance times its baseline and over min_delta milliseconds more.
+    """
+    rows = []
+    for name, current in results["metrics"].items():
+        if name not in baseline["metrics"]:
+            continue
+        base = baseline["metrics"][name]
+        rows.append((name, base, current, current > base * (1 + tolerance) and current - base > min_delta))
+    return rows
+
+
+def print_comparison(rows: List[Tuple[str, float, float, bool]]):
+    print("{:<28} {:>12} {:>12} {:>8}".format("metric", "baseline ms", "current ms", "change"))
+    for name, base, current, regressed in rows:
+        change = "{:+.1%}".format(current / base - 1) if base > 0 else "n/a"
+        print("{:<28} {:>12.3f} {:>12.3f} {:>8}{}".format(name, base, current, change,
+                                                         "  REGRESSION" if regressed else ""))
+
+
+def run(corpus_dir: str, work_dir: str, n_docs: int, seed: int, n_queries: int, repeat: int,
+        search_args: List[str]) -> dict:
+    if not os.path.isdir(corpus_dir):
+        print("generating {} documents into '{}'...".format(n_docs, corpus_dir))
+        generate_corpus(corpus_dir, n_docs, seed)
+    os.makedirs(work_dir, exist_ok=True)
+    corpus_docs = len(os.listdir(corpus_dir))
+    print("indexing {} documents...".format(corpus_docs))
+    metrics = bench_index(corpus_dir, work_dir)
+    metrics.update(bench_dict_load(work_dir, repeat))
+    print("running {} queries of every workload...".format(n_queries))
+    metrics.update(bench_queries(work_dir, n_queries, seed, search_args))
+    print("timing the first result of a fresh search.py...")
+    metrics.update(bench_first_result(work_dir, seed, repeat, search_args))
+    return {
+        "config": {"corpus": os.path.abspath(corpus_dir), "docs": corpus_docs, "seed": seed, "queries": n_queries,
+                   "tokenizer": index.tokenizer, "jobs": index.jobs, "search_args": search_args,
+                   "python": platform.python_version()},
+        "metrics": metrics,
+        "throughput": {"index_docs_per_s": corpus_docs / metrics["build_index_ms"] * 1000},
+    }
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -c corpus-directory -w work-directory -o results.json [--docs N] [--seed S]"
+          + " [-n queries-per-workload] [-r repeat] [--tokenizer nltk|fast] [-j jobs]"
+          + " [--baseline baseline.json] [--tolerance T] [--min-delta MS] [--search-args ARGS]")
+    print("  --docs, --seed: size and seed of the corpus generated when the corpus directory does not exist, "
+          + str(DEFAULT_DOCS) + " documents from seed 0 by default; the seed also picks the queries")
+    print("  -n: queries per workload, " + str(DEFAULT_QUERIES) + " by default")
+    print("  -r: dictionary loads and search.py starts timed, the best is kept")
+    print("  --baseline: results of an earlier run to compare with")
+    print("  --tolerance: relative slowdown reported as a regression, " + str(DEFAULT_TOLERANCE) + " by default")
+    print("  --min-delta: slowdowns of fewer milliseconds are never regressions, " + str(DEFAULT_MIN_DELTA_MS)
+          + " by default")
+    print("  --search-args: extra options of search.py, e.g. '--engine daat'")
+
+
+def main():
+    corpus_dir = work_dir = out_file = baseline_file = None
+    n_docs = DEFAULT_DOCS
+    seed = 0
+    n_queries = DEFAULT_QUERIES
+    repeat = 5
+    tolerance = DEFAULT_TOLERANCE
+    min_delta = DEFAULT_MIN_DELTA_MS
+    search_args = []
+    index_args = []  # parsed by index.py, whose worker processes parse them again
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'c:w:o:n:r:j:', ['docs=', 'seed=', 'tokenizer=', 'baseline=',
+                                                                 'tolerance=', 'min-delta=', 'search-args='])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-c':
+            corpus_dir = a
+        elif o == '-w':
+            work_dir = a
+        elif o == '-o':
+            out_file = a
+        elif o == '-n':
+            n_queries = int(a)
+        elif o == '-r':
+            repeat = int(a)
+        elif o == '-j':
+            index_args += ['-j', a]
+        elif o == '--docs':
+            n_docs = int(a)
+        elif o == '--seed':
+            seed = int(a)
+        elif o == '--tokenizer':
+            if a not in TOKENIZERS:
+                usage()
+                sys.exit(2)
+            index_args += ['--tokenizer', a]
+        elif o == '--baseline':
+            baseline_file = a
+        elif o == '--tolerance':
+            tolerance = float(a)
+        elif o == '--min-delta':
+            min_delta = float(a)
+        elif o == '--search-args':
+            search_args = shlex.split(a)
+        else:
+            assert False, "unhandled option"
+    if corpus_dir is None or work_dir is None or out_file is None:
+        usage()
+        sys.exit(2)
+    index.parse_options(index_args)
+    results = run(corpus_dir, work_dir, n_docs, seed, n_queries, repeat, search_args)
+    with open(out_file, "wt") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("results have been written to '{}'".format(out_file))
+    if baseline_file is None:
+        return
+    with open(baseline_file, "rt") as f:
+        baseline = json.load(f)
+    if baseline["config"] != results["config"]:
+        print("warning: the baseline was run with a different configuration")
+    rows = compare(results, baseline, tolerance, min_delta)
+    print_comparison(rows)
+    if any(regressed for _, _, _, regressed in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Generates Boolean query workloads for benchmarks from the terms of an index, reproducible from their seed.
+
+usage: bench_workload.py -d dictionary-file -o file-of-queries -w workload [-n number-of-queries] [-s seed]
+Terms are picked from three bands of doc frequency: the most frequent 1% of the terms, the next 19%,
+and the rare rest, so every workload mixes long and short postings the way user queries do.
+"""
+import getopt
+import random
+import sys
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from termdict import load_dictionary
+
+FREQUENT_BAND = 0.01  # share of the terms, by descending doc frequency, that are frequent
+MID_BAND = 0.2  # the terms up to this share that are not frequent are mid frequency, the rest are rare
+DEFAULT_QUERIES = 200
+
+
+class TermPicker:
+    """
+    Picks random query terms from the bands of doc frequency.
+
+    Attributes:
+        bands: the frequent, mid frequency and rare terms.
+    """
+    def __init__(self, terms_by_freq: List[str], rng: random.Random):
+        frequent_end = max(1, int(len(terms_by_freq) * FREQUENT_BAND))
+        mid_end = max(frequent_end + 1, int(len(terms_by_freq) * MID_BAND))
+        self.bands = [terms_by_freq[:frequent_end], terms_by_freq[frequent_end:mid_end], terms_by_freq[mid_end:]]
+        self.bands = [band for band in self.bands if len(band) != 0]
+        self._rng = rng
+
+    def pick(self) -> str:
+        return self._rng.choice(self._rng.choice(self.bands))
+
+    def picks(self, n: int) -> List[str]:
+        return [self.pick() for _ in range(n)]
+
+
+def short_and(picker: TermPicker, rng: random.Random) -> str:
+    return " AND ".join(picker.picks(2))
+
+
+def long_and(picker: TermPicker, rng: random.Random) -> str:
+    return " AND ".join(picker.picks(rng.randint(4, 8)))
+
+
+def or_chain(picker: TermPicker, rng: random.Random) -> str:
+    return " OR ".join(picker.picks(rng.randint(4, 12)))
+
+
+def not_heavy(picker: TermPicker, rng: random.Random) -> str:
+    shape = rng.randrange(3)
+    if shape == 0:
+        return picker.pick() + "".join(" AND NOT " + term for term in picker.picks(rng.randint(1, 3)))
+    if shape == 1:
+        return " OR ".join("NOT " + term for term in picker.picks(rng.randint(2, 3)))
+    return "NOT " + picker.pick()
+
+
+def nested(picker: TermPicker, rng: random.Random) -> str:
+    return _nested_expression(picker, rng, rng.randint(2, 3))
+
+
+def _nested_expression(picker: TermPicker, rng: random.Random, depth: int) -> str:
+    """
+    Returns a random expression of AND, OR and NOT over parenthesized operands, depth levels deep.
+    """
+    if depth == 0:
+        return picker.pick()
+    operands = []
+    for _ in range(rng.randint(2, 3)):
+        operand = _nested_expression(picker, rng, depth - 1 if rng.random() < 0.7 else 0)
+        if " " in operand:
+            operand = "(" + operand + ")"
+        if rng.random() < 0.2:
+            operand = "NOT " + operand
+        operands.append(operand)
+    return rng.choice([" AND ", " OR "]).join(operands)
+
+
+WORKLOADS: Dict[str, Callable[[TermPicker, random.Random], str]] = {
+    "short_and": short_and,
+    "long_and": long_and,
+    "or_chain": or_chain,
+    "not_heavy": not_heavy,
+    "nested": nested,
+}
+
+
+def generate_queries(workload: str, terms_by_freq: List[str], n_queries: int, seed: int = 0) -> List[str]:
+    """
+    Returns n_queries queries of a workload over terms sorted by descending doc frequency.
+    The same arguments always return the same queries.
+    """
+    rng = random.Random(seed)
+    picker = TermPicker(terms_by_freq, rng)
+    return [WORKLOADS[workload](picker, rng) for _ in range(n_queries)]
+
+
+def terms_by_freq(dict_file: str) -> List[str]:
+    """
+    Returns the terms of a dictionary by descending doc frequency, ties by term.
+    """
+    dictionary = load_dictionary(dict_file)
+    return sorted(dictionary, key=lambda term: (-dictionary.get_term_freq(term), term))
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -o file-of-queries -w workload [-n number-of-queries]"
+          + " [-s seed]")
+    print("  -w: one of " + ", ".join(WORKLOADS))
+    print("  -n: " + str(DEFAULT_QUERIES) + " queries by default")
+
+
+def main():
+    dict_file = out_file = workload = None
+    n_queries = DEFAULT_QUERIES
+    seed = 0
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:o:w:n:s:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for o, a in opts:
+        if o == '-d':
+            dict_file = a
+        elif o == '-o':
+            out_file = a
+        elif o == '-w':
+            workload = a
+        elif o == '-n':
+            n_queries = int(a)
+        elif o == '-s':
+            seed = int(a)
+        else:
+            assert False, "unhandled option"
+    if dict_file is None or out_file is None or workload not in WORKLOADS:
+        usage()
+        sys.exit(2)
+    with open(out_file, "wt") as f:
+        for query in generate_queries(workload, terms_by_freq(dict_file), n_queries, seed):
+            f.write(query + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from termdict import TermDict
+import os
 
 BLK_POSTINGS_FORMAT = "{no}.posting"
 BLK_DICT_FORMAT = "{no}.dict"
@@ -6,11 +6,17 @@ BLK_DICT_FORMAT = "{no}.dict"
 
 class Block:
     """
-    Represents a block in indexing. Records the block's block number, stores dictionary of the block,
-    and the location of block dictionary and postings on the disk.
+    Represents a block in indexing. Records the block's block number, and the location of block dictionary
+    and postings on the disk, from which the block dictionary is streamed while merging.
     """
-    def __init__(self, blk_no: int, dictionary: TermDict):
+    def __init__(self, blk_no: int, directory: str):
         self.blk_no = blk_no
-        self.dictionary = dictionary
+        self.directory = directory
         self.dict_name = BLK_DICT_FORMAT.format(no=blk_no)
         self.postings_name = BLK_POSTINGS_FORMAT.format(no=blk_no)
+
+    def get_dict_path(self) -> str:
+        return os.path.join(self.directory, self.dict_name)
+
+    def get_postings_path(self) -> str:
+        return os.path.join(self.directory, self.postings_name)
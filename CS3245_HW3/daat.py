@@ -0,0 +1,149 @@
+import heapq
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import TextIO
+
+from postinglist import Cursor
+from postinglist import EXHAUSTED
+from postinglist import PostingList
+from query import And
+from query import Not
+from query import Or
+from query import QueryNode
+from query import Term
+
+ENGINE_TAAT = "taat"
+ENGINE_DAAT = "daat"
+ENGINES = (ENGINE_TAAT, ENGINE_DAAT)
+WRITE_BATCH = 4096  # doc ids formatted per write
+
+
+class AndCursor(Cursor):
+    """
+    The doc ids on every child cursor and on no negated cursor. The first child, the one with the fewest
+    doc ids after planning, leads: the others only skip to the doc ids it proposes, and a doc id one of them
+    skips past becomes the lead's next target.
+    """
+    def __init__(self, children: List[Cursor], negated: List[Cursor]):
+        self._children = children
+        self._negated = negated
+        self.doc = self._match(children[0].doc)
+
+    def _match(self, candidate: int) -> int:
+        lead = self._children[0]
+        while candidate != EXHAUSTED:
+            for child in self._children[1:]:
+                target = child.advance_to(candidate)
+                if target != candidate:
+                    break
+            else:
+                if not any(negated.advance_to(candidate) == candidate for negated in self._negated):
+                    return candidate
+                target = candidate + 1
+            candidate = lead.advance_to(target)
+        return EXHAUSTED
+
+    def next(self) -> int:
+        if self.doc != EXHAUSTED:
+            self.doc = self._match(self._children[0].next())
+        return self.doc
+
+    def advance_to(self, target: int) -> int:
+        if self.doc < target:
+            self.doc = self._match(self._children[0].advance_to(target))
+        return self.doc
+
+
+class OrCursor(Cursor):
+    """
+    The doc ids on any child cursor. A heap keyed on the current doc id of every child finds the smallest,
+    and only the children behind a target are moved.
+    """
+    def __init__(self, children: List[Cursor]):
+        self._children = children
+        self._heap = [(child.doc, i) for i, child in enumerate(children) if child.doc != EXHAUSTED]
+        heapq.heapify(self._heap)
+        self.doc = self._heap[0][0] if len(self._heap) != 0 else EXHAUSTED
+
+    def next(self) -> int:
+        return self.advance_to(self.doc + 1) if self.doc != EXHAUSTED else EXHAUSTED
+
+    def advance_to(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        heap = self._heap
+        while len(heap) != 0 and heap[0][0] < target:
+            i = heap[0][1]
+            doc = self._children[i].advance_to(target)
+            if doc == EXHAUSTED:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (doc, i))
+        self.doc = heap[0][0] if len(heap) != 0 else EXHAUSTED
+        return self.doc
+
+
+class NotCursor(Cursor):
+    """
+    The doc ids of the collection, walked by all_docs, that are not on child.
+    """
+    def __init__(self, child: Cursor, all_docs: Cursor):
+        self._child = child
+        self._all = all_docs
+        self.doc = self._match(all_docs.doc)
+
+    def _match(self, candidate: int) -> int:
+        while candidate != EXHAUSTED and self._child.advance_to(candidate) == candidate:
+            candidate = self._all.next()
+        return candidate
+
+    def next(self) -> int:
+        self.doc = self._match(self._all.next())
+        return self.doc
+
+    def advance_to(self, target: int) -> int:
+        if self.doc < target:
+            self.doc = self._match(self._all.advance_to(target))
+        return self.doc
+
+
+def build_cursor(node: QueryNode, get_posting: Callable[[str], PostingList],
+                 get_all_doc_ids: Callable[[], PostingList]) -> Cursor:
+    """
+    Composes the cursor of a planned expression tree. No posting is combined with another until the cursor
+    is walked, and AND NOT operands are only probed at the doc ids the AND already matched.
+    """
+    if isinstance(node, Term):
+        return get_posting(node.term).cursor()
+    if isinstance(node, Not):
+        return NotCursor(build_cursor(node.child, get_posting, get_all_doc_ids), get_all_doc_ids().cursor())
+    if isinstance(node, Or):
+        return OrCursor([build_cursor(child, get_posting, get_all_doc_ids) for child in node.children])
+    assert isinstance(node, And)
+    return AndCursor([build_cursor(child, get_posting, get_all_doc_ids) for child in node.children],
+                     [build_cursor(child, get_posting, get_all_doc_ids) for child in node.negated])
+
+
+def iter_docs(cursor: Cursor) -> Iterator[int]:
+    doc = cursor.doc
+    while doc != EXHAUSTED:
+        yield doc
+        doc = cursor.next()
+
+
+def write_docs(cursor: Cursor, out: TextIO):
+    """
+    Writes the doc ids of cursor separated by spaces as they are found, WRITE_BATCH at a time,
+    so the result is never held as a whole.
+    """
+    batch = []
+    separator = ""
+    for doc in iter_docs(cursor):
+        batch.append(doc)
+        if len(batch) == WRITE_BATCH:
+            out.write(separator + " ".join(map(str, batch)))
+            separator = " "
+            batch = []
+    if len(batch) != 0:
+        out.write(separator + " ".join(map(str, batch)))
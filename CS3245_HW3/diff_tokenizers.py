@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+"""
+Compares the nltk and fast tokenizers on a corpus: their throughput, and the terms only one of them produces.
+
+usage: diff_tokenizers.py -i directory-of-documents [-n max-docs] [-k shown-terms]
+"""
+import getopt
+import os
+import sys
+import time
+from collections import Counter
+
+from tokenizer import fast_tokens
+from tokenizer import nltk_tokens
+
+SHOWN_TERMS = 20
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -i directory-of-documents [-n max-docs] [-k shown-terms]")
+
+
+def read_docs(in_dir: str, max_docs: int) -> list:
+    file_list = sorted(os.listdir(in_dir), key=int)
+    if max_docs != -1:
+        file_list = file_list[:max_docs]
+    docs = []
+    for file_name in file_list:
+        with open(os.path.join(in_dir, file_name), "rt") as f:
+            docs.append((file_name, f.read()))
+    return docs
+
+
+def tokenize_all(tokenize, docs: list):
+    """
+    Tokenizes every document, returns the token sets and the docs per second.
+    """
+    start = time.perf_counter()
+    token_sets = [tokenize(content) for _, content in docs]
+    elapsed = time.perf_counter() - start
+    return token_sets, len(docs) / elapsed if elapsed > 0 else float("inf")
+
+
+def print_terms(title: str, counter: Counter, shown: int):
+    print("{}: {} terms".format(title, len(counter)))
+    for term, count in counter.most_common(shown):
+        print("  {!r} in {} docs".format(term, count))
+
+
+def diff_tokenizers(in_dir: str, max_docs: int, shown: int):
+    docs = read_docs(in_dir, max_docs)
+    nltk_sets, nltk_rate = tokenize_all(nltk_tokens, docs)
+    fast_sets, fast_rate = tokenize_all(fast_tokens, docs)
+    print("nltk: {:.1f} docs/s, fast: {:.1f} docs/s, {:.1f}x".format(nltk_rate, fast_rate, fast_rate / nltk_rate))
+
+    only_nltk = Counter()
+    only_fast = Counter()
+    differing = []
+    for (file_name, _), nltk_set, fast_set in zip(docs, nltk_sets, fast_sets):
+        if nltk_set != fast_set:
+            differing.append(file_name)
+            only_nltk.update(nltk_set - fast_set)
+            only_fast.update(fast_set - nltk_set)
+    nltk_vocab = set().union(*nltk_sets)
+    fast_vocab = set().union(*fast_sets)
+    print("vocabulary: nltk {} terms, fast {} terms, {} in both".format(
+        len(nltk_vocab), len(fast_vocab), len(nltk_vocab & fast_vocab)))
+    print("{} of {} docs get different terms".format(len(differing), len(docs)), " ".join(differing[:shown]))
+    print_terms("only in nltk", only_nltk, shown)
+    print_terms("only in fast", only_fast, shown)
+
+
+input_directory = None
+max_docs = -1
+shown_terms = SHOWN_TERMS
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'i:n:k:')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-i':
+        input_directory = a
+    elif o == '-n':
+        max_docs = int(a)
+    elif o == '-k':
+        shown_terms = int(a)
+    else:
+        assert False, "unhandled option"
+
+if input_directory is None:
+    usage()
+    sys.exit(2)
+
+diff_tokenizers(input_directory, max_docs, shown_terms)
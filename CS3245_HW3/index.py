@@ -1,42 +1,99 @@
 #!/usr/bin/python3
-import linecache
+import heapq
+import logging
+import multiprocessing
 import os
-import pickle
-import shutil
-import string
-
-import nltk
+import subprocess
 import sys
 import getopt
-from collections import OrderedDict
+from array import array
+from collections import Counter
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
 from typing.io import TextIO
 
 import test_index
 from termdict import TermDict
-from pair import Pair
-from sortedskiplist import SortedSkipList
-from sortedskiplist import union
+from termdict import CompactDictWriter
+from termdict import load_dictionary
+from postinglist import PostingList
+from postinglist import union_all
+from ranked import doc_norm
+from ranked import get_tf_path
+from ranked import max_doc_weight
+from ranked import merge_tfs
+from ranked import TfReader
+from ranked import TfWriter
+from spimi import DEFAULT_MEM_LIMIT
+from spimi import SpimiBuffer
+from stats import DEFAULT_LOG_LEVEL
+from stats import LOG_LEVELS
+from stats import set_log_level
+from stats import stats
+from stemcache import get_stems_path
+from stemcache import StemCache
+from stemcache import DEFAULT_CACHE_SIZE
+from tokenizer import get_token_lister
+from tokenizer import get_tokenizer
+from tokenizer import TOKENIZER_NLTK
+from tokenizer import TOKENIZERS
 from block import Block
-from block import BLK_DICT_FORMAT
-from block import BLK_POSTINGS_FORMAT
+from segments import merge_lock
+from segments import pick_merge
+from segments import Segment
+from segments import update_manifest
+from shards import get_shard_path
+from shards import split_docs
+from shards import write_shard_count
+from postingsfile import PostingsWriter
+from postingsfile import decode_postings
+from postingsfile import POSTINGS_FORMAT_BINARY
+from postingsfile import POSTINGS_FORMAT_TEXT
 
 TMP_DIR = "tmp"
-BLOCK_SIZE = 50000
 TEST_SIZE = -1  # change test size to -1 to index the whole corpus
-all_doc_ids = SortedSkipList()
 ALL_DOC_IDS_FILE = "all-ids.txt"
+postings_format = POSTINGS_FORMAT_BINARY
+read_buffer_size = 64 * 1024  # bytes buffered per block while merging
+jobs = 1  # processes tokenizing and stemming documents
+PARSE_CHUNK_SIZE = 16  # documents sent to a worker at a time
+stem_cache = StemCache()
+save_stems = False
+tokenizer = TOKENIZER_NLTK
+mem_limit = DEFAULT_MEM_LIMIT  # estimated bytes of postings buffered before a block is written
+shards = 1  # doc id ranges indexed separately, each with its own dictionary, postings and all doc ids
+ranked = False  # also write term frequencies and document norms, for search.py --ranked
+doc_norms = {}  # norm of every document indexed, with --ranked
+input_directory = output_file_dictionary = output_file_postings = segments_directory = stats_file = None
+is_merging = False
+options_argv = []  # the options indexed with, parsed again by worker processes
+mp_context = multiprocessing.get_context()  # start method of the worker processes, the platform's default
+logger = logging.getLogger("index")
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
-
-
-def get_tmp_path(file_name: str) -> str:
-    """
-    Appends tmp directory to file_name
-    """
-    return os.path.join(TMP_DIR, file_name)
+    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file [-t] [-b bytes]")
+    print("  -t: write postings as plain text, for debugging")
+    print("  -b: read buffer size per block when merging blocks")
+    print("  -j: number of processes tokenizing and stemming documents")
+    print("  --mem-limit: bytes of postings held in memory before a block is written, " + str(DEFAULT_MEM_LIMIT) +
+          " by default")
+    print("  --stem-cache-size: number of tokens whose stems are memoized, " + str(DEFAULT_CACHE_SIZE) + " by default")
+    print("  --save-stems: save the memoized stems next to the dictionary, for search to start warm")
+    print("  --tokenizer: nltk (default), or fast, a regex tokenizer giving the same terms several times faster")
+    print("       " + sys.argv[0] + " -i directory-of-documents --segments segments-directory")
+    print("       " + sys.argv[0] + " --segments segments-directory --merge")
+    print("  --segments: index the documents no segment holds yet as a new segment, then merge segments in the"
+          + " background; with --merge, merge them now")
+    print("  --ranked: also store the term frequencies of every posting and the norm of every document,"
+          + " for ranked search")
+    print("  --stats: write the time of every indexing stage and counters, e.g. bytes read and written, as JSON")
+    print("  --log-level: " + ", ".join(LOG_LEVELS) + ", " + DEFAULT_LOG_LEVEL + " by default")
+    print("  --shards: split the collection into N doc id ranges indexed apart, -j of them at a time,"
+          + " into dictionary-file.0, postings-file.0, ...")
 
 
 def clean_up():
@@ -52,235 +109,299 @@ def clean_up():
 
 def generate_word_tokens(file: TextIO) -> set:
     """
-    Generate a set of word tokens from input file.
+    Generate a set of word tokens from input file, with the tokenizer chosen by --tokenizer.
+    """
+    return get_tokenizer(tokenizer)(file.read())
+
+
+def generate_word_token_counts(file: TextIO) -> Counter:
+    """
+    Counts the word tokens of input file, with the tokenizer chosen by --tokenizer.
     """
-    content = file.read()
-    sent_tokens = nltk.sent_tokenize(content)
-    word_tokens = set()
-    for sent in sent_tokens:
-        words = nltk.word_tokenize(sent)
-        for word in words:
-            # if word.isalpha():
-            word = word.strip(string.punctuation + "\n" + " ")
-            if word == "":
-                continue
-            word_tokens.add(word.lower())
-    return word_tokens
+    return Counter(get_token_lister(tokenizer)(file.read()))
 
 
 def stem(tokens: set) -> set:
     """
-    Stems tokens using Porter Stemmer.
+    Stems tokens using Porter Stemmer, through the shared stem cache.
+    """
+    return set(map(stem_cache.stem, tokens))
+
+
+def stem_counts(counts: Counter) -> Counter:
+    """
+    Stems counted tokens, adding up the counts of tokens with the same stem.
+    """
+    stems = Counter()
+    for token, count in counts.items():
+        stems[stem_cache.stem(token)] += count
+    return stems
+
+
+def parse_doc(path: str) -> Optional[Tuple[List[str], Optional[List[int]]]]:
+    """
+    Tokenizes and stems a document, returns its sorted terms and, with --ranked, their frequencies in the document,
+    or None if the document cannot be found. With -j this runs in the worker processes.
+    """
+    try:
+        with open(path, "rt") as f:
+            with stats.timer("index.tokenize"):
+                tokens = generate_word_token_counts(f) if ranked else generate_word_tokens(f)
+            if stats.enabled:
+                stats.add("index.bytes_read", os.fstat(f.fileno()).st_size)
+    except FileNotFoundError:
+        return None
+    with stats.timer("index.stem"):
+        if not ranked:
+            return sorted(stem(tokens)), None
+        counts = stem_counts(tokens)
+    terms = sorted(counts)
+    return terms, [counts[term] for term in terms]
+
+
+def parse_doc_in_worker(path: str) -> Tuple[Optional[Tuple[List[str], Optional[List[int]]]], tuple, tuple]:
+    """
+    Parses a document in a worker process, also handing back what its stem cache learnt and its stats.
     """
-    STEMMER = nltk.stem.porter.PorterStemmer()
-    stemmed_tokens = set()
-    for token in tokens:
-        stemmed_tokens.add(STEMMER.stem(token))
-    return stemmed_tokens
+    return parse_doc(path), stem_cache.take_delta(), stats.take_delta()
 
 
-def create_blocks(in_dir: str) -> List[Block]:
+def init_parse_worker(argv: List[str]):
     """
-    Generates a list of term-id pairs, when the size of the list equals to BLOCK_SIZE,
-    groups pairs and converts them to a block.
+    Sets up a -j worker process with the options of argv.
+    """
+    parse_options(argv)  # a spawned worker imported this module afresh, with every option at its default
+    stem_cache.track_delta = True  # parse_doc_in_worker hands the new stems back
+
+
+def parse_docs(paths: List[str], n_jobs: int) -> Iterator[Optional[Tuple[List[str], Optional[List[int]]]]]:
+    """
+    Parses documents with n_jobs processes, yielding their terms in the order of paths.
+    """
+    if n_jobs <= 1:
+        yield from map(parse_doc, paths)
+        return
+    with mp_context.Pool(n_jobs, initializer=init_parse_worker, initargs=(options_argv,)) as pool:
+        for parsed, stem_delta, stats_delta in pool.imap(parse_doc_in_worker, paths, chunksize=PARSE_CHUNK_SIZE):
+            stem_cache.merge_delta(stem_delta)
+            stats.merge_delta(stats_delta)
+            yield parsed
+
+
+def list_docs(in_dir: str) -> List[str]:
+    """
+    Returns the file names of the documents to index, in ascending doc id order.
+    """
+    file_list = sorted(os.listdir(in_dir), key=int)  # ascending doc ids keep every posting append-only
+    if TEST_SIZE != -1:
+        file_list = file_list[:TEST_SIZE]
+    return file_list
+
+
+def create_blocks(in_dir: str, file_list: List[str], all_ids_file: str) -> List[Block]:
+    """
+    Indexes documents into a SpimiBuffer, and when its estimated memory crosses mem_limit,
+    writes the buffer to the disk as a block sorted by term. The doc ids indexed are written to all_ids_file.
     A list of resulting blocks is returned.
     """
-    file_list = os.listdir(in_dir)
+    all_doc_ids = PostingList()
+    doc_norms.clear()
     blocks = []  # a queue representing blocks to be merged
-    pairs = []  # a list of term - doc_id pair
-    cnt = 0
-    blk_cnt = 0
-    for file_name in file_list:
-        cnt += 1
+    buffer = SpimiBuffer()
+    paths = [os.path.join(in_dir, file_name) for file_name in file_list]
+    # documents are parsed in parallel but consumed in doc id order, so the index does not depend on -j
+    for file_name, parsed in zip(file_list, parse_docs(paths, jobs)):
         all_doc_ids.add_val(int(file_name))
-        if cnt == TEST_SIZE:
-            break
-        try:
-            path = os.path.join(in_dir, file_name)
-            with open(path, "rt") as f:
-                tokens = generate_word_tokens(f)
-                tokens = stem(tokens)
-            for token in tokens:
-                if len(pairs) == BLOCK_SIZE:
-                    block = pairs_to_block(pairs, blk_cnt)
-                    blocks.append(block)
-                    blk_cnt += 1
-                    pairs = []
-                pairs.append(Pair(token, int(file_name)))
-        except FileNotFoundError:
+        if parsed is None:
             print("Cannot find file" + file_name)
-    if len(pairs) != 0:  # leftover
-        blk = pairs_to_block(pairs, blk_cnt)
-        blocks.append(blk)
-        blk_cnt += 1
-    with open(ALL_DOC_IDS_FILE, "wt") as f:
+            continue
+        terms, tfs = parsed
+        stats.add("index.docs")
+        stats.add("index.postings", len(terms))
+        buffer.add_doc(int(file_name), terms, tfs)
+        if tfs is not None:
+            doc_norms[int(file_name)] = doc_norm(tfs)
+        if buffer.estimate_bytes() >= mem_limit:
+            blocks.append(buffer_to_block(buffer, len(blocks)))
+    if len(buffer) != 0:  # leftover
+        blocks.append(buffer_to_block(buffer, len(blocks)))
+    with open(all_ids_file, "wt") as f:
         f.write(str(all_doc_ids))
     return blocks
 
 
-def pairs_to_block(pairs: list, blk_no: int) -> Block:
+def buffer_to_block(buffer: SpimiBuffer, blk_no: int) -> Block:
     """
-    Convert a list of pairs of maximum BLOCK_SIZE to a block,
-    writes the block to the disk and returns relevant information about the block.
+    Writes the postings of a buffer to the disk as a block, clears the buffer
+    and returns relevant information about the block.
     """
-    blk_dict = TermDict()
-    blk_postings = {}
-    for pair in pairs:
-        if pair.key not in blk_dict:
-            blk_dict.add_term(pair.key)
-            assert pair.key not in blk_postings.keys()
-            blk_postings[pair.key] = SortedSkipList()
-        blk_postings[pair.key].add_val(pair.doc_id)
-
-    blk_postings = OrderedDict(sorted(blk_postings.items()))
-    blk = Block(blk_no, blk_dict)
-    write_blk(blk, blk_postings)
+    blk = Block(blk_no, TMP_DIR)
+    with stats.timer("index.flush_block"):
+        write_blk(blk, buffer.sorted_postings(), buffer.sorted_tfs() if ranked else None)
+    stats.add("index.blocks")
+    if stats.enabled:
+        stats.add("index.bytes_written", file_bytes(blk.get_dict_path(), blk.get_postings_path()))
+    logger.debug("flushed block %d: %d documents, about %d bytes of postings", blk_no, buffer.n_docs,
+                 buffer.estimate_bytes())
+    buffer.clear()
     return blk
 
 
-def write_blk(blk: Block, postings: OrderedDict):
+def write_blk(blk: Block, postings: Iterable[Tuple[str, PostingList]], tfs: Iterable[array] = None):
     """
-    Writes a block to the disk.
+    Writes a block to the disk, postings must come in term order. Its dictionary is written in the compact format,
+    in the same term order, so merging streams it one entry at a time.
+    The term frequencies of the postings, when given, are written to a tf file next to the block postings.
     """
     blk_no = blk.blk_no
-    line_no = 0
-    if not os.path.isdir(TMP_DIR):
-        os.mkdir(TMP_DIR)
-    postings_name = get_tmp_path(BLK_POSTINGS_FORMAT.format(no=blk_no))
-    dict_name = get_tmp_path(BLK_DICT_FORMAT.format(no=blk_no))
-    try:
-        with open(postings_name, "wt") as f:
-            for term, posting in postings.items():
-                line = term + " " + str(posting) + os.linesep
-                f.write(line)
-                line_no += 1
-                posting.build_skip()
-                line = posting.skip_to_str() + os.linesep
-                f.write(line)
-                blk.dictionary.set_term_pointer(term, line_no)
-                line_no += 1
-                blk.dictionary.set_term_freq(term, len(posting))
-    except FileNotFoundError:
-        raise RuntimeWarning("Cannot write posting for blk " + str(blk_no))
+    if not os.path.isdir(blk.directory):
+        os.mkdir(blk.directory)
+    postings_name = blk.get_postings_path()
     try:
-        with open(dict_name, "wb") as f:
-            pickle.dump(blk.dictionary, f)
+        tf_writer = TfWriter(get_tf_path(postings_name)) if tfs is not None else None
+        with PostingsWriter(postings_name, POSTINGS_FORMAT_BINARY) as writer, \
+                CompactDictWriter(blk.get_dict_path(), POSTINGS_FORMAT_BINARY) as dict_writer:
+            for term, posting in postings:
+                pointer, length = writer.write(term, posting)
+                dict_writer.add(term, len(posting), pointer, length)
+                if tf_writer is not None:
+                    tf_writer.write(pointer, next(tfs))
+        if tf_writer is not None:
+            tf_writer.close()
     except FileNotFoundError:
-        raise RuntimeWarning("Cannot write dictionary for blk " + str(blk_no))
+        raise RuntimeWarning("Cannot write blk " + str(blk_no))
 
 
 def load_blk_dict(blk: Block) -> TermDict:
     """
-    Loads dictionary of a block from memory.
-    """
-    file_name = get_tmp_path(blk.dict_name)
-    with open(file_name, "rb") as f:
-        dummy = pickle.load(f)
-        return dummy
-
-
-def load_blk_line(blk: Block, line_no: int) -> SortedSkipList:
-    """
-    Loads a specified line of a block from the file.
-    """
-    file_name = get_tmp_path(blk.postings_name)
-    line = linecache.getline(file_name, line_no)
-    line = line.strip("\r\n")
-    line = line.strip("\n")
-    assert line != ""
-    term, posting = line.split(" ", 1)
-    posting = posting.split(" ")
-    posting_list = SortedSkipList()
-    for doc_id in posting:
-        posting_list.add_val(doc_id)
-    line = linecache.getline(file_name, line_no+1)
-    line = line.strip("\r\n")
-    line = line.strip("\n")
-    skips = line.split(" ")
-    # skips = [int(skip) for skip in skips]
-    posting_list.build_skip_from_list(skips)
-    return posting_list
-
-
-def merge_blocks(blocks: List[Block]) -> Block:
-    """
-    Merges a list of blocks into one final block.
-    """
-    blk_cnt = len(blocks)
-    while len(blocks) != 1:
-        n = len(blocks)
-        i = 0
-        while i != n:
-            blk1 = blocks.pop(0)
-            if i + 1 != n:
-                blk2 = blocks.pop(0)
-                blocks.append(merge_two_blocks(blk1, blk2, blk_cnt))
-                blk_cnt += 1
-                i += 2
-            else:
-                blocks.append(blk1)
-                i += 1
-    return blocks[0]
-
-
-def merge_two_blocks(blk1: Block, blk2: Block, result_blk_no: int) -> Block:
-    """
-    Merges two blocks blk1 and blk2, returns the merged block.
-    """
-    dict1 = load_blk_dict(blk1)
-    dict2 = load_blk_dict(blk2)
-    result_dict = TermDict()
-
-    for term in dict1:
-        result_dict.add_term(term)
-        dict1_freq = dict1.get_term_freq(term)
-        dict2_freq = dict2.get_term_freq(term) if term in dict2 else 0
-        result_dict.set_term_freq(term, dict1_freq + dict2_freq)
-    for term in dict2:
-        if term not in result_dict:
-            assert term not in dict1
-            result_dict.add_term(term)
-            result_dict.set_term_freq(term, dict2.get_term_freq(term))
-    result_blk = Block(result_blk_no, result_dict)
-
-    posting_file_name = get_tmp_path(result_blk.postings_name)
-    with open(posting_file_name, "wt") as f:
-        line_cnt = 0
-        for term in sorted(result_dict.dict):
-            line_cnt += 1
-            if term not in dict1.dict:
-                assert term in dict2
-                line = term + " " + str(load_blk_line(blk2, dict2.get_term_pointer(term))) + os.linesep
-                line += linecache.getline(blk2.postings_name, dict2.get_term_pointer(term)+1) + os.linesep
-            elif term not in dict2.dict:
-                assert term in dict1
-                line = term + " " + str(load_blk_line(blk1, dict1.get_term_pointer(term))) + os.linesep
-                line += linecache.getline(blk1.postings_name, dict1.get_term_pointer(term)+1) + os.linesep
-            else:  # term appear in both blocks
-                assert term in dict1 and term in dict2
-                posting1 = load_blk_line(blk1, dict1.get_term_pointer(term))
-                posting2 = load_blk_line(blk2, dict2.get_term_pointer(term))
-                posting = union(posting1, posting2)
-                posting.build_skip()
-                line = term + " " + str(posting) + os.linesep
-                line += posting.skip_to_str() + os.linesep
-            result_blk.dictionary.set_term_pointer(term, line_cnt)
-            line_cnt += 1
-            f.write(line)
-    dict_file_name = get_tmp_path(result_blk.dict_name)
-    with open(dict_file_name, "wb") as f:
-        pickle.dump(result_dict, f)
-    return result_blk
-
-
-def migrate_final_blk(final_blk: Block, out_dict: str, out_postings: str):
-    """
-    Copy the final merged block's dictionary and postings to be the index output dictionary and postings.
-    """
-    dict_file = get_tmp_path(final_blk.dict_name)
-    postings_file = get_tmp_path(final_blk.postings_name)
-    shutil.copyfile(dict_file, out_dict)
-    shutil.copyfile(postings_file, out_postings)
+    Loads the dictionary of a block or of a segment, both compact dictionaries.
+    """
+    return load_dictionary(blk.get_dict_path())
+
+
+def file_bytes(*paths: str) -> int:
+    """
+    Returns the total size of the files of paths, and of the tf files of any of them.
+    """
+    return sum(os.path.getsize(path) for path in paths + tuple(map(get_tf_path, paths)) if os.path.exists(path))
+
+
+def iter_blk_postings(blk: Block, buffer_size: int) -> Iterator[Tuple[str, PostingList, Optional[array]]]:
+    """
+    Streams the (term, posting, term frequencies) of a block in term order, frequencies are None
+    unless the block has a tf file. The postings file is read sequentially through a buffer of buffer_size bytes,
+    and the dictionary entry by entry, so a reader holds only its current entry, whatever the block vocabulary.
+    """
+    blk_dict = load_blk_dict(blk)
+    tf_path = get_tf_path(blk.get_postings_path())
+    tf_reader = TfReader(tf_path) if os.path.exists(tf_path) else None
+    with open(blk.get_postings_path(), "rb", buffering=buffer_size) as f:
+        for term, _, pointer, length in blk_dict.iter_entries():  # postings were written in term order
+            posting = decode_postings(f.read(length))
+            tfs = tf_reader.read_tfs(pointer) if tf_reader is not None else None
+            yield term, posting, tfs
+    if tf_reader is not None:
+        tf_reader.close()
+
+
+def merge_blocks(blocks: List[Block], out_dict: str, out_postings: str):
+    """
+    Merges all blocks in a single pass, writing the final postings and dictionary.
+    Every block is streamed in term order, a heap keyed on (term, block number) yields the smallest term next,
+    and the postings of that term from all blocks are merged and written out, along with its compact dictionary entry.
+    With --ranked, the term frequencies of the blocks are merged too, into a tf file next to the postings,
+    along with the score upper bound of every term and the document norms.
+    """
+    logger.debug("merging %d blocks into %s", len(blocks), out_postings)
+    with stats.timer("index.merge"):
+        _merge_blocks(blocks, out_dict, out_postings)
+    stats.add("index.merge_passes")
+    stats.add("index.blocks_merged", len(blocks))
+    if stats.enabled:
+        stats.add("index.bytes_read", sum(file_bytes(blk.get_dict_path(), blk.get_postings_path()) for blk in blocks))
+        stats.add("index.bytes_written", file_bytes(out_dict, out_postings))
+
+
+def _merge_blocks(blocks: List[Block], out_dict: str, out_postings: str):
+    readers = [iter_blk_postings(blk, read_buffer_size) for blk in blocks]
+    heap = []
+    for i, reader in enumerate(readers):
+        entry = next(reader, None)
+        if entry is not None:
+            heap.append((entry[0], i, entry[1], entry[2]))
+    heapq.heapify(heap)
+
+    tf_writer = TfWriter(get_tf_path(out_postings), doc_norms) if ranked else None
+    with PostingsWriter(out_postings, postings_format) as writer, \
+            CompactDictWriter(out_dict, postings_format) as dict_writer:
+        while len(heap) != 0:
+            term = heap[0][0]
+            parts = []
+            while len(heap) != 0 and heap[0][0] == term:
+                _, i, blk_posting, blk_tfs = heap[0]
+                parts.append((blk_posting, blk_tfs))
+                entry = next(readers[i], None)
+                if entry is None:
+                    heapq.heappop(heap)
+                else:
+                    heapq.heapreplace(heap, (entry[0], i, entry[1], entry[2]))
+            # one union of all the parts, a chain of binary unions would copy the growing posting once per block
+            posting = parts[0][0] if len(parts) == 1 else union_all([blk_posting for blk_posting, _ in parts])
+            pointer, length = writer.write(term, posting)
+            dict_writer.add(term, len(posting), pointer, length)
+            if tf_writer is not None:
+                tfs = merge_tfs(parts)
+                tf_writer.write(pointer, tfs, max_doc_weight(posting.get_ids(), tfs, doc_norms))
+    if tf_writer is not None:
+        tf_writer.close()
+
+
+def index_docs(in_dir: str, file_list: List[str], out_dict: str, out_postings: str, all_ids_file: str):
+    """
+    Indexes the given documents into blocks, then merges them into the dictionary and postings files.
+    """
+    clean_up()
+    with stats.timer("index.create_blocks"):
+        blocks = create_blocks(in_dir, file_list, all_ids_file)
+    merge_blocks(blocks, out_dict, out_postings)
+
+
+def init_shard_worker(argv: List[str]):
+    """
+    Sets up a shard worker process with the options of argv.
+    """
+    global jobs
+    parse_options(argv)  # a spawned worker imported this module afresh, with every option at its default
+    jobs = 1  # a pool worker cannot start processes of its own
+    stem_cache.track_delta = True  # build_shard hands the new stems back
+
+
+def build_shard(task: Tuple[str, List[str], str, str, str, str]) -> tuple:
+    """
+    Indexes the documents of one shard in a worker process, into its own copy of every index file,
+    and hands back what its stem cache learnt and its stats.
+    """
+    global TMP_DIR
+    in_dir, file_list, shard_dict, shard_postings, shard_ids, TMP_DIR = task  # the worker runs a single shard
+    index_docs(in_dir, file_list, shard_dict, shard_postings, shard_ids)
+    return stem_cache.take_delta(), stats.take_delta()
+
+
+def build_shards(in_dir: str, file_list: List[str], out_dict: str, out_postings: str):
+    """
+    Splits the documents into doc id ranges and indexes each range as a shard, -j shards at a time.
+    Each shard is built by a fresh worker process, in its own tmp directory. The number of shards is recorded
+    last, for search.py --shards to check.
+    """
+    tasks = [(in_dir, shard_docs, get_shard_path(out_dict, shard_no), get_shard_path(out_postings, shard_no),
+              get_shard_path(ALL_DOC_IDS_FILE, shard_no), get_shard_path(TMP_DIR, shard_no))
+             for shard_no, shard_docs in enumerate(split_docs(file_list, shards))]
+    with mp_context.Pool(max(1, min(jobs, shards)), initializer=init_shard_worker, initargs=(options_argv,),
+                         maxtasksperchild=1) as pool:
+        for stem_delta, stats_delta in pool.imap_unordered(build_shard, tasks):
+            stem_cache.merge_delta(stem_delta)
+            stats.merge_delta(stats_delta)
+    write_shard_count(out_dict, shards)
 
 
 def build_index(in_dir, out_dict, out_postings):
@@ -291,22 +412,114 @@ def build_index(in_dir, out_dict, out_postings):
     print('indexing...')
     # This is an empty method
     # Pls implement your code in below
-    clean_up()
-    blocks = create_blocks(in_dir)
-    final_blk = merge_blocks(blocks)
-    migrate_final_blk(final_blk, out_dict, out_postings)
+    file_list = list_docs(in_dir)
+    with stats.timer("index.build"):
+        if shards > 1:
+            build_shards(in_dir, file_list, out_dict, out_postings)
+        else:
+            index_docs(in_dir, file_list, out_dict, out_postings, ALL_DOC_IDS_FILE)
+    print(stem_cache.stats_str())
+    if save_stems:
+        stem_cache.save(get_stems_path(out_dict))
     # test_index.test(out_dict, out_postings)
     # clean_up()
 
     print("\nindex finished.")
-    print("results have been written to '{}' and '{}'".format(out_dict, out_postings))
+    if shards > 1:
+        print("results have been written to {} shards of '{}' and '{}'".format(shards, out_dict, out_postings))
+    else:
+        print("results have been written to '{}' and '{}'".format(out_dict, out_postings))
 
 
-def main():
-    input_directory = output_file_dictionary = output_file_postings = None
+def read_doc_ids(file_name: str) -> PostingList:
+    with open(file_name, "rt") as f:
+        return PostingList.from_unsorted(map(int, f.readline().split()))
 
+
+def add_segment(in_dir: str, seg_dir: str):
+    """
+    Indexes the documents of in_dir that no live segment holds yet into a new segment of seg_dir,
+    then starts merging segments in the background when the merge policy picks some.
+    """
+    global TMP_DIR
+    print('indexing new documents into a segment...')
+    with update_manifest(seg_dir) as manifest:
+        # the documents are picked and claimed under the manifest lock, so concurrent adds never index one twice
+        manifest.remove_abandoned()
+        claimed = manifest.segments + [segment for segment, _ in manifest.pending]
+        indexed = set(union_all([read_doc_ids(segment.get_ids_path()) for segment in claimed]).get_ids())
+        file_list = [file_name for file_name in list_docs(in_dir) if int(file_name) not in indexed]
+        segment = manifest.claim(file_list) if len(file_list) != 0 else None
+    if segment is None:
+        print("no new documents in " + in_dir)
+        return
+    TMP_DIR = segment.get_tmp_dir()  # concurrent adds never share it
+    index_docs(in_dir, file_list, segment.get_dict_path(), segment.get_postings_path(), segment.get_ids_path())
+    clean_up()
+    with update_manifest(seg_dir) as manifest:
+        manifest.publish(segment)  # the segment is searchable from here on
+        manifest.remove_expired()
+        needs_merge = pick_merge(manifest.segments) is not None
+    print("{} documents added as segment {}".format(len(file_list), segment.blk_no))
+    if needs_merge:
+        start_background_merge(seg_dir)
+
+
+def start_background_merge(seg_dir: str):
+    """
+    Starts index.py --merge in a detached process, which outlives this one.
+    """
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--segments", seg_dir, "--merge"],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def merge_segments(seg_dir: str, segments: List[Segment], seg_no: int) -> Segment:
+    """
+    Merges segments into a new segment numbered seg_no, their postings with merge_blocks and their doc ids.
+    """
+    merged = Segment(seg_no, sum(segment.n_docs for segment in segments), seg_dir)
+    merge_blocks(segments, merged.get_dict_path(), merged.get_postings_path())
+    doc_ids = union_all([read_doc_ids(segment.get_ids_path()) for segment in segments])
+    with open(merged.get_ids_path(), "wt") as f:
+        f.write(str(doc_ids))
+    return merged
+
+
+def compact_segments(seg_dir: str):
+    """
+    Merges the segments picked by the tiered merge policy until it picks none. The merged segment replaces
+    its sources in one manifest update, so searches see either. Only one process merges a directory at a time,
+    any other returns at once.
+    """
+    with merge_lock(seg_dir) as is_merger:
+        if not is_merger:
+            return
+        while True:
+            with update_manifest(seg_dir) as manifest:
+                manifest.remove_expired()
+                segments = pick_merge(manifest.segments)
+                if segments is None:
+                    break
+                seg_no = manifest.take_segment_no()
+            merged = merge_segments(seg_dir, segments, seg_no)
+            with update_manifest(seg_dir) as manifest:
+                manifest.retire(segments)
+                manifest.segments.append(merged)
+            print("merged segments {} into {}".format(" ".join(str(segment.blk_no) for segment in segments),
+                                                      seg_no))
+
+
+def parse_options(argv: List[str]):
+    """
+    Sets the options of the module from command line arguments, exiting with the usage on a bad one.
+    """
+    global postings_format, read_buffer_size, jobs, stem_cache, save_stems, tokenizer, mem_limit, shards, ranked
+    global input_directory, output_file_dictionary, output_file_postings, segments_directory, stats_file
+    global is_merging, options_argv
+    options_argv = argv
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
+        opts, args = getopt.getopt(argv, 'i:d:p:tb:j:', ['stem-cache-size=', 'save-stems', 'tokenizer=', 'mem-limit=', 'shards=', 'segments=', 'merge', 'ranked', 'stats=', 'log-level='])
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -318,14 +531,64 @@ def main():
             output_file_dictionary = a
         elif o == '-p':  # postings file
             output_file_postings = a
+        elif o == '-t':  # text postings
+            postings_format = POSTINGS_FORMAT_TEXT
+        elif o == '-b':  # read buffer size
+            read_buffer_size = int(a)
+        elif o == '-j':  # parallel jobs
+            jobs = int(a)
+        elif o == '--stem-cache-size':
+            stem_cache = StemCache(int(a))
+        elif o == '--save-stems':
+            save_stems = True
+        elif o == '--tokenizer':
+            if a not in TOKENIZERS:
+                usage()
+                sys.exit(2)
+            tokenizer = a
+        elif o == '--mem-limit':
+            mem_limit = int(a)
+        elif o == '--shards':
+            shards = int(a)
+        elif o == '--segments':
+            segments_directory = a
+        elif o == '--merge':
+            is_merging = True
+        elif o == '--ranked':
+            ranked = True
+        elif o == '--stats':
+            stats_file = a
+            stats.enabled = True
+        elif o == '--log-level':
+            if a not in LOG_LEVELS:
+                usage()
+                sys.exit(2)
+            set_log_level(a)
         else:
             assert False, "unhandled option"
 
+
+def main():
+    parse_options(sys.argv[1:])
+    if segments_directory is not None:
+        if postings_format != POSTINGS_FORMAT_BINARY or ranked or (input_directory is None) == (not is_merging):
+            usage()
+            sys.exit(2)
+        if is_merging:
+            compact_segments(segments_directory)
+        else:
+            add_segment(input_directory, segments_directory)
+        if stats_file is not None:
+            stats.write(stats_file)
+        sys.exit(0)
+
     if input_directory is None or output_file_postings is None or output_file_dictionary is None:
         usage()
         sys.exit(2)
 
     build_index(input_directory, output_file_dictionary, output_file_postings)
+    if stats_file is not None:
+        stats.write(stats_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+from array import array
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, search falls back to the python backend
+    np = None
+
+import postinglist
+from postinglist import BitmapPostingList
+from postinglist import PostingList
+from postinglist import POSTING_TYPECODE
+from postingsfile import SkipPostingList
+
+BACKEND_PYTHON = "python"
+BACKEND_NUMPY = "numpy"
+BACKENDS = (BACKEND_PYTHON, BACKEND_NUMPY)
+# crossovers measured with bench_backends.py on the Reuters index
+MIN_VECTOR_LEN = 8  # with a shorter list below this many doc ids, numpy call overhead outweighs the python loops
+SKEW_RATIO = 8  # a longer list at least this many times longer is binary searched instead of merged
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+def to_numpy(posting: PostingList):
+    """
+    Returns the doc ids of posting as a read only uint32 view, no ids are copied.
+    """
+    return np.frombuffer(posting.get_ids(), dtype=np.uint32)
+
+
+def from_numpy(doc_ids) -> PostingList:
+    return PostingList(array(POSTING_TYPECODE, doc_ids.astype(np.uint32, copy=False).tobytes()))
+
+
+def _is_small(list1: PostingList, list2: PostingList) -> bool:
+    return min(len(list1), len(list2)) < MIN_VECTOR_LEN
+
+
+def _has_bitmap(lists: List[PostingList]) -> bool:
+    """
+    Whether an operation on lists is left to the python backend, which runs it on the bitmaps directly.
+    """
+    return any(isinstance(posting, BitmapPostingList) for posting in lists)
+
+
+def union(list1: PostingList, list2: PostingList) -> PostingList:
+    """
+    The two lists are concatenated and stably sorted, which merges the two sorted runs, then duplicates are dropped.
+    Inserting the ids the longer list misses after binary searching them was never faster, even when skewed.
+    """
+    if _is_small(list1, list2) or _has_bitmap([list1, list2]):
+        return postinglist.union(list1, list2)
+    merged = np.concatenate((to_numpy(list1), to_numpy(list2)))
+    merged.sort(kind="stable")
+    keep = np.empty(len(merged), dtype=bool)
+    keep[0] = True
+    np.not_equal(merged[1:], merged[:-1], out=keep[1:])
+    return from_numpy(merged[keep])
+
+
+def intersect(list1: PostingList, list2: PostingList) -> PostingList:
+    """
+    Similar sizes: np.intersect1d. Skewed sizes: every id of the shorter list is binary searched in the longer one,
+    unless the longer one is a SkipPostingList, whose skip table then finds the few blocks to decode.
+    """
+    if len(list1) > len(list2):
+        list1, list2 = list2, list1
+    if _is_small(list1, list2) or _has_bitmap([list1, list2]):
+        return postinglist.intersect(list1, list2)
+    skewed = len(list2) >= SKEW_RATIO * len(list1)
+    if skewed and isinstance(list2, SkipPostingList):
+        return postinglist.intersect(list1, list2)
+    short, long = to_numpy(list1), to_numpy(list2)
+    if not skewed:
+        return from_numpy(np.intersect1d(short, long, assume_unique=True))
+    pos = np.searchsorted(long, short)
+    found = pos < len(long)
+    found[found] = long[pos[found]] == short[found]
+    return from_numpy(short[found])
+
+
+def difference(list1: PostingList, list2: PostingList) -> PostingList:
+    """
+    Returns doc ids in list1 but not in list2, searching the ids of the shorter list in the longer one.
+    """
+    if _is_small(list1, list2) or _has_bitmap([list1, list2]):
+        return postinglist.difference(list1, list2)
+    a, b = to_numpy(list1), to_numpy(list2)
+    if len(a) <= len(b):
+        pos = np.searchsorted(b, a)
+        found = pos < len(b)
+        found[found] = b[pos[found]] == a[found]
+        return from_numpy(a[~found])
+    pos = np.searchsorted(a, b)
+    inside = pos < len(a)
+    pos = pos[inside]
+    pos = pos[a[pos] == b[inside]]
+    keep = np.ones(len(a), dtype=bool)
+    keep[pos] = False
+    return from_numpy(a[keep])
+
+
+def union_all(lists: List[PostingList]) -> PostingList:
+    """
+    Unions any number of posting lists with a single sort of all their doc ids.
+    """
+    if _has_bitmap(lists):
+        return postinglist.union_all(lists)
+    arrays = [to_numpy(posting) for posting in lists if len(posting) != 0]
+    if sum(map(len, arrays)) < MIN_VECTOR_LEN:
+        return postinglist.union_all(lists)
+    return from_numpy(np.unique(np.concatenate(arrays)))
+
+
+def intersect_all(lists: List[PostingList]) -> PostingList:
+    """
+    Intersects any number of posting lists, shortest first, stopping as soon as the result is empty.
+    """
+    if len(lists) == 0:
+        return PostingList()
+    if _has_bitmap(lists):
+        return postinglist.intersect_all(lists)
+    lists = sorted(lists, key=len)
+    if len(lists) == 1:
+        return PostingList(lists[0].get_ids()[:])
+    res = intersect(lists[0], lists[1])
+    for posting in lists[2:]:
+        if len(res) == 0:
+            break
+        res = intersect(res, posting)
+    return res
+
+
+def complement(list: PostingList, all_doc: PostingList) -> PostingList:
+    return difference(all_doc, list)
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Optional
+
+from postinglist import PostingList
+
+CACHE_POLICY_LRU = "lru"
+CACHE_POLICY_COST = "cost"
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class CacheEntry:
+    """
+    A cached posting with its accounted size in bytes and the number of hits it got.
+    """
+    def __init__(self, posting: PostingList):
+        self.posting = posting
+        self.nbytes = posting.nbytes()
+        self.hits = 0
+
+
+class PostingCache:
+    """
+    Caches posting lists by term, keeping their total size within a budget in bytes.
+
+    With the "lru" policy the least recently used posting is evicted first. With the "cost" policy the posting
+    with the smallest doc_freq * (hits + 1) is evicted first, so long postings that keep being asked for stay.
+
+    Attributes:
+        hits: lookups answered from the cache.
+        misses: lookups of terms that were not cached.
+        evictions: postings evicted to make room.
+    """
+    def __init__(self, budget: int = DEFAULT_CACHE_BYTES, policy: str = CACHE_POLICY_LRU):
+        if policy not in (CACHE_POLICY_LRU, CACHE_POLICY_COST):
+            raise ValueError("unknown cache policy " + policy)
+        self.budget = budget
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._used = 0
+        self._entries = OrderedDict()
+
+    def get(self, term: str) -> Optional[PostingList]:
+        entry = self._entries.get(term)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry.hits += 1
+        self._entries.move_to_end(term)
+        return entry.posting
+
+    def put(self, term: str, posting: PostingList):
+        """
+        Caches the posting of term, evicting others until it fits. A posting larger than the budget is not cached.
+        """
+        entry = CacheEntry(posting)
+        if entry.nbytes > self.budget:
+            return
+        old = self._entries.pop(term, None)
+        if old is not None:
+            self._used -= old.nbytes
+        while self._used + entry.nbytes > self.budget:
+            self._evict()
+        self._entries[term] = entry
+        self._used += entry.nbytes
+
+    def _evict(self):
+        if self.policy == CACHE_POLICY_LRU:
+            term = next(iter(self._entries))
+        else:
+            term = min(self._entries, key=lambda t: len(self._entries[t].posting) * (self._entries[t].hits + 1))
+        self._used -= self._entries.pop(term).nbytes
+        self.evictions += 1
+
+    def get_used_bytes(self) -> int:
+        return self._used
+
+    def stats_str(self) -> str:
+        return "posting cache: {} postings, {} of {} bytes, {} hits, {} misses, {} evictions".format(
+            len(self), self._used, self.budget, self.hits, self.misses, self.evictions)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._entries
@@ -0,0 +1,398 @@
+from abc import ABC
+from abc import abstractmethod
+from array import array
+from bisect import bisect_left
+from bisect import insort
+from itertools import compress
+import math
+from typing import Iterable
+from typing import List
+
+from stats import stats
+
+POSTING_TYPECODE = "I"  # unsigned 32-bit doc ids
+EXHAUSTED = 1 << 32  # larger than every doc id, the doc of a cursor past its last doc id
+_BIT_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+_FLAG_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_popcount = int.bit_count if hasattr(int, "bit_count") else lambda bits: bin(bits).count("1")
+
+
+class PostingList:
+    """
+    A compact posting list, storing sorted and unique doc ids in a flat array('I').
+    Set operations walk the arrays by index and use galloping search, so no per-id objects are allocated.
+
+    Attributes:
+        _ids: sorted doc ids.
+    """
+    def __init__(self, doc_ids: Iterable[int] = ()):
+        """
+        Builds a posting list from doc ids that are already sorted and unique.
+        """
+        if isinstance(doc_ids, array) and doc_ids.typecode == POSTING_TYPECODE:
+            self._ids = doc_ids
+        else:
+            self._ids = array(POSTING_TYPECODE, doc_ids)
+
+    @classmethod
+    def from_unsorted(cls, doc_ids: Iterable[int]):
+        """
+        Builds a posting list from doc ids in any order, duplicates are dropped.
+        """
+        return cls(sorted(set(doc_ids)))
+
+    def get_ids(self) -> array:
+        return self._ids
+
+    def add_val(self, val: int):
+        """
+        Adds a doc id, appending is O(1) when ids arrive in ascending order.
+        """
+        ids = self.get_ids()
+        if len(ids) == 0 or val > ids[-1]:
+            ids.append(val)
+        elif val not in self:
+            insort(ids, val)
+
+    def nbytes(self) -> int:
+        """
+        Returns the memory taken by the doc ids.
+        """
+        ids = self.get_ids()
+        return ids.itemsize * len(ids)
+
+    def skip_to_str(self) -> str:
+        """
+        Returns the doc ids that carry a skip pointer, with skips evenly spaced sqrt(len) apart.
+        """
+        ids = self.get_ids()
+        n = len(ids)
+        if n == 0:
+            return ""
+        skip_l = int(math.sqrt(n))
+        last = (n - 1) // skip_l * skip_l  # the last skip target has no skip of its own
+        return " ".join(map(str, ids[0:last:skip_l]))
+
+    def intersect_ids(self, doc_ids: array) -> array:
+        """
+        Returns the ids in doc_ids, a sorted array no longer than this list, that are also in this list.
+        Each of them gallops forward through this list.
+        """
+        large = self.get_ids()
+        res = array(POSTING_TYPECODE)
+        lo = 0
+        n = len(large)
+        if n == 0:
+            return res
+        skips = 0
+        for doc_id in doc_ids:
+            if large[lo] < doc_id:
+                lo = _gallop(large, doc_id, lo + 1)
+                skips += 1
+                if lo == n:
+                    break
+            if large[lo] == doc_id:
+                res.append(doc_id)
+                lo += 1
+                if lo == n:
+                    break
+        if stats.enabled:  # a match steps to the next doc id, any other move gallops
+            stats.add("intersect.skips", skips)
+            stats.add("intersect.steps", len(res))
+        return res
+
+    def cursor(self):
+        return PostingCursor(self.get_ids())
+
+    def __len__(self) -> int:
+        return len(self.get_ids())
+
+    def __contains__(self, item: int) -> bool:
+        ids = self.get_ids()
+        i = bisect_left(ids, item)
+        return i != len(ids) and ids[i] == item
+
+    def __iter__(self):
+        return iter(self.get_ids())
+
+    def __getitem__(self, index):
+        return self.get_ids()[index]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PostingList) and self.get_ids() == other.get_ids()
+
+    def __str__(self) -> str:
+        return " ".join(map(str, self.get_ids()))
+
+
+class BitmapPostingList(PostingList):
+    """
+    A posting list of a dense term, kept as a bitmap: bit i is set when doc id i is in the list.
+    The bitmap is a Python int, so AND, OR and AND NOT between two bitmaps run word by word in C.
+    The sorted doc ids are only built when something walks them.
+
+    Attributes:
+        _bits: the bitmap.
+        _count: number of doc ids.
+        _bytes: the bitmap as little endian bytes, for testing single doc ids, None until needed.
+        _ids: sorted doc ids, None until needed.
+    """
+    def __init__(self, bits: int = 0, count: int = None):
+        self._bits = bits
+        self._count = _popcount(bits) if count is None else count
+        self._bytes = None
+        self._ids = None
+
+    @classmethod
+    def from_ids(cls, doc_ids: Iterable[int]):
+        return cls(_to_bits(doc_ids))
+
+    def get_bits(self) -> int:
+        return self._bits
+
+    def get_ids(self) -> array:
+        if self._ids is None:
+            # one 0 or 1 byte per doc id, lowest first, selecting the doc ids from a range in C
+            flags = bin(self._bits)[:1:-1].encode("ascii").translate(_BIT_FLAGS)
+            self._ids = array(POSTING_TYPECODE, compress(range(len(flags)), flags))
+        return self._ids
+
+    def _get_bytes(self) -> bytes:
+        if self._bytes is None:
+            self._bytes = self._bits.to_bytes((self._bits.bit_length() + 7) // 8, "little")
+        return self._bytes
+
+    def add_val(self, val: int):
+        if val not in self:
+            self._bits |= 1 << val
+            self._count += 1
+            self._bytes = self._ids = None
+
+    def nbytes(self) -> int:
+        """
+        Returns the memory the posting takes once it is fully decoded: the bitmap, its bytes and the sorted doc ids,
+        built or not, like SkipPostingList.nbytes, so a cache charges it the same before and after it is walked.
+        """
+        bitmap_bytes = (self._bits.bit_length() + 7) // 8
+        return 2 * bitmap_bytes + self._count * array(POSTING_TYPECODE).itemsize
+
+    def intersect_ids(self, doc_ids: array) -> array:
+        """
+        Returns the ids in doc_ids that are also in this list, testing the bit of each.
+        """
+        data = self._get_bytes()
+        n_bits = len(data) << 3
+        if stats.enabled:
+            stats.add("intersect.bit_tests", len(doc_ids))
+        return array(POSTING_TYPECODE, [doc_id for doc_id in doc_ids
+                                        if doc_id < n_bits and data[doc_id >> 3] >> (doc_id & 7) & 1])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, item: int) -> bool:
+        data = self._get_bytes()
+        return item < len(data) << 3 and data[item >> 3] >> (item & 7) & 1 == 1
+
+
+def _to_bits(doc_ids: Iterable[int]) -> int:
+    """
+    Returns the bitmap of doc ids as an int, parsed in C from one 0 or 1 digit per doc id, highest first.
+    """
+    if not isinstance(doc_ids, (array, list)):
+        doc_ids = list(doc_ids)
+    if len(doc_ids) == 0:
+        return 0
+    flags = bytearray(max(doc_ids) + 1)
+    for doc_id in doc_ids:
+        flags[doc_id] = 1
+    return int(flags[::-1].translate(_FLAG_DIGITS), 2)
+
+
+def _bits_of(posting: PostingList) -> int:
+    if isinstance(posting, BitmapPostingList):
+        return posting.get_bits()
+    return _to_bits(posting.get_ids())
+
+
+def _gallop(ids: array, target: int, lo: int) -> int:
+    """
+    Returns the first index i >= lo with ids[i] >= target, probing exponentially from lo.
+    """
+    n = len(ids)
+    bound = 1
+    while lo + bound < n and ids[lo + bound] < target:
+        bound *= 2
+    return bisect_left(ids, target, lo + bound // 2, min(lo + bound + 1, n))
+
+
+class Cursor(ABC):
+    """
+    Walks the doc ids of a posting or of a query node in ascending order, one document at a time.
+    A new cursor is on its first doc id.
+
+    Attributes:
+        doc: the current doc id, EXHAUSTED once every doc id has been passed.
+    """
+    doc = EXHAUSTED
+
+    @abstractmethod
+    def next(self) -> int:
+        """
+        Moves to the next doc id and returns it.
+        """
+
+    @abstractmethod
+    def advance_to(self, target: int) -> int:
+        """
+        Moves to the first doc id that is not below target and returns it, skipping the doc ids in between.
+        """
+
+
+class PostingCursor(Cursor):
+    def __init__(self, ids: array):
+        self._ids = ids
+        self._pos = 0
+        self.doc = ids[0] if len(ids) != 0 else EXHAUSTED
+
+    def next(self) -> int:
+        self._pos += 1
+        self.doc = self._ids[self._pos] if self._pos < len(self._ids) else EXHAUSTED
+        return self.doc
+
+    def advance_to(self, target: int) -> int:
+        if self.doc < target:
+            self._pos = _gallop(self._ids, target, self._pos + 1)
+            self.doc = self._ids[self._pos] if self._pos < len(self._ids) else EXHAUSTED
+        return self.doc
+
+
+def union(list1: PostingList, list2: PostingList) -> PostingList:
+    if isinstance(list1, BitmapPostingList) or isinstance(list2, BitmapPostingList):
+        return BitmapPostingList(_bits_of(list1) | _bits_of(list2))
+    a = list1.get_ids()
+    b = list2.get_ids()
+    res = array(POSTING_TYPECODE)
+    i = j = 0
+    na, nb = len(a), len(b)
+    while i < na and j < nb:
+        x, y = a[i], b[j]
+        if x < y:
+            k = _gallop(a, y, i)
+            res += a[i:k]
+            i = k
+        elif x > y:
+            k = _gallop(b, x, j)
+            res += b[j:k]
+            j = k
+        else:
+            res.append(x)
+            i += 1
+            j += 1
+    res += a[i:]
+    res += b[j:]
+    return PostingList(res)
+
+
+def intersect(list1: PostingList, list2: PostingList) -> PostingList:
+    """
+    Intersects two posting lists. The shorter list drives, the longer one decides how to skip through itself.
+    Two bitmaps are ANDed, against one bitmap every doc id of the other list tests its bit.
+    """
+    is_bitmap1, is_bitmap2 = isinstance(list1, BitmapPostingList), isinstance(list2, BitmapPostingList)
+    if is_bitmap1 and is_bitmap2:
+        return BitmapPostingList(list1.get_bits() & list2.get_bits())
+    if is_bitmap1 or (not is_bitmap2 and len(list1) > len(list2)):
+        list1, list2 = list2, list1
+    return PostingList(list2.intersect_ids(list1.get_ids()))
+
+
+def union_all(lists: List[PostingList]) -> PostingList:
+    """
+    Unions any number of posting lists at once, instead of a chain of binary unions that copies the growing
+    result once per list. Doc ids are gathered in one set and sorted once, both in C loops, which on the
+    Reuters index beats a k-way heap merge, whose heap operations run per doc id in Python.
+    When some of the lists are bitmaps, the others are turned into bitmaps as well and all of them ORed.
+    """
+    if any(isinstance(posting, BitmapPostingList) for posting in lists):
+        bits = 0
+        for posting in lists:
+            bits |= _bits_of(posting)
+        return BitmapPostingList(bits)
+    doc_ids = set()
+    for posting in lists:
+        doc_ids.update(posting.get_ids())
+    return PostingList(sorted(doc_ids))
+
+
+def intersect_all(lists: List[PostingList]) -> PostingList:
+    """
+    Intersects any number of posting lists. The shortest list drives: its doc ids skip through the next
+    shortest list, the ids left skip through the one after, and so on, stopping as soon as none is left.
+    Bitmaps are ANDed together first, then the doc ids left of the other lists test their bits.
+    """
+    if len(lists) == 0:
+        return PostingList()
+    bitmaps = [posting for posting in lists if isinstance(posting, BitmapPostingList)]
+    if len(bitmaps) != 0:
+        bits = bitmaps[0].get_bits()
+        for posting in bitmaps[1:]:
+            bits &= posting.get_bits()
+        bitmap = BitmapPostingList(bits)
+        others = [posting for posting in lists if not isinstance(posting, BitmapPostingList)]
+        if len(others) == 0:
+            return bitmap
+        return PostingList(bitmap.intersect_ids(intersect_all(others).get_ids()))
+    lists = sorted(lists, key=len)
+    if len(lists) == 1:
+        return PostingList(lists[0].get_ids()[:])
+    res = lists[1].intersect_ids(lists[0].get_ids())
+    for posting in lists[2:]:
+        if len(res) == 0:
+            break
+        res = posting.intersect_ids(res)
+    return PostingList(res)
+
+
+def difference(list1: PostingList, list2: PostingList) -> PostingList:
+    """
+    Returns doc ids in list1 but not in list2. From a bitmap, the bits of list2 are cleared.
+    """
+    if isinstance(list1, BitmapPostingList):
+        return BitmapPostingList(list1.get_bits() & ~_bits_of(list2))
+    if isinstance(list2, BitmapPostingList):
+        return PostingList(array(POSTING_TYPECODE, [doc_id for doc_id in list1.get_ids() if doc_id not in list2]))
+    a = list1.get_ids()
+    b = list2.get_ids()
+    res = array(POSTING_TYPECODE)
+    i = j = 0
+    na, nb = len(a), len(b)
+    while i < na and j < nb:
+        x, y = a[i], b[j]
+        if x < y:
+            k = _gallop(a, y, i)
+            res += a[i:k]
+            i = k
+        elif x > y:
+            j = _gallop(b, x, j)
+        else:
+            i += 1
+            j += 1
+    res += a[i:]
+    return PostingList(res)
+
+
+def complement(list: PostingList, all_doc: PostingList) -> PostingList:
+    return difference(all_doc, list)
+
+
+class Complement:
+    """
+    A lazy negation: the doc ids of the collection that are not in posting.
+    It is only materialized against all doc ids when nothing else can absorb it.
+    """
+    def __init__(self, posting: PostingList):
+        self.posting = posting
+
+    def materialize(self, all_doc: PostingList) -> PostingList:
+        return complement(self.posting, all_doc)
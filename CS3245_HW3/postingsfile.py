@@ -0,0 +1,463 @@
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from itertools import accumulate
+from itertools import groupby
+import linecache
+import math
+import mmap
+import os
+from typing import Iterable
+from typing import Tuple
+
+from postinglist import BitmapPostingList
+from postinglist import Cursor
+from postinglist import EXHAUSTED
+from postinglist import PostingList
+from postinglist import POSTING_TYPECODE
+from stats import stats
+
+POSTINGS_FORMAT_TEXT = "text"
+POSTINGS_FORMAT_BINARY = "binary"
+SKIP_MIN_BLOCK = 8  # shorter postings are kept in a single block
+BITMAP_MIN_DF = 256  # shorter postings are always kept as sorted doc ids
+BITMAP_DENSITY = 8  # a posting holding at least one doc id in this many of its doc id range is kept as a bitmap
+CONTAINER_BITS = 16  # a bitmap container holds the doc ids that share their bits above these
+ARRAY_CONTAINER_MAX = 4096  # containers with at most this many doc ids keep their gaps instead of a bitmap
+_LOW_7_BITS = bytes(byte & 0x7F for byte in range(256))
+
+
+def encode_vbyte(number: int, out: bytearray):
+    """
+    Appends number to out in variable byte encoding, 7 bits per byte, most significant group first.
+    The high bit marks the last byte of a number.
+    """
+    groups = [number & 0x7F]
+    number >>= 7
+    while number:
+        groups.append(number & 0x7F)
+        number >>= 7
+    groups[0] |= 0x80
+    out.extend(reversed(groups))
+
+
+def decode_vbyte(buf) -> list:
+    """
+    Decodes every variable byte encoded number in buf.
+    """
+    numbers = []
+    n = 0
+    for byte in buf:
+        if byte < 0x80:
+            n = (n << 7) | byte
+        else:
+            numbers.append((n << 7) | (byte & 0x7F))
+            n = 0
+    return numbers
+
+
+def decode_vbyte_prefix(buf, count: int, pos: int = 0) -> Tuple[list, int]:
+    """
+    Decodes the first count variable byte encoded numbers in buf from pos,
+    returns the numbers and the position right after them.
+    """
+    numbers = []
+    n = 0
+    while len(numbers) < count:
+        byte = buf[pos]
+        pos += 1
+        if byte < 0x80:
+            n = (n << 7) | byte
+        else:
+            numbers.append((n << 7) | (byte & 0x7F))
+            n = 0
+    return numbers, pos
+
+
+def _decode_gaps(data: bytes):
+    if len(data) != 0 and min(data) >= 0x80:
+        # every gap fits in one byte, which is the common case for long postings
+        return data.translate(_LOW_7_BITS)
+    return decode_vbyte(data)
+
+
+def is_dense(ids: array) -> bool:
+    return len(ids) >= BITMAP_MIN_DF and len(ids) * BITMAP_DENSITY >= ids[-1] - ids[0] + 1
+
+
+def encode_postings(posting: PostingList) -> bytes:
+    """
+    Encodes a posting as blocks of variable byte encoded gaps behind a skip table.
+
+    Layout: doc_freq, number of blocks, then for every block the gap between its first doc id and the
+    previous block's first doc id and the byte length of the block, followed by the blocks. A block holds the
+    gaps between its doc ids, its first doc id is only kept in the skip table.
+    Blocks are sqrt(doc_freq) doc ids long, so the skip table is as long as one block.
+    """
+    ids = posting.get_ids()
+    n = len(ids)
+    block_len = max(int(math.sqrt(n)), SKIP_MIN_BLOCK)
+    header = bytearray()
+    body = bytearray()
+    encode_vbyte(n, header)
+    encode_vbyte((n + block_len - 1) // block_len, header)
+    prev_first = 0
+    for start in range(0, n, block_len):
+        block = bytearray()
+        prev = ids[start]
+        for doc_id in ids[start + 1:start + block_len]:
+            encode_vbyte(doc_id - prev, block)
+            prev = doc_id
+        encode_vbyte(ids[start] - prev_first, header)
+        encode_vbyte(len(block), header)
+        prev_first = ids[start]
+        body += block
+    return bytes(header + body)
+
+
+def encode_bitmap(ids: array) -> bytes:
+    """
+    Encodes a dense posting as roaring style containers, each holding the doc ids that share their high bits.
+
+    Layout: doc_freq, 0 in place of the number of skip blocks, the number of containers, then for every container
+    the gap between its key, the shared high bits, and the previous container's key, its number of doc ids and
+    its byte length, followed by the containers. A container with more than ARRAY_CONTAINER_MAX doc ids is a little
+    endian bitmap of their low bits without trailing zero bytes, a smaller one holds the gaps between their low bits.
+    """
+    low_mask = (1 << CONTAINER_BITS) - 1
+    containers = [(key, [doc_id & low_mask for doc_id in group])
+                  for key, group in groupby(ids, key=lambda doc_id: doc_id >> CONTAINER_BITS)]
+    header = bytearray()
+    body = bytearray()
+    encode_vbyte(len(ids), header)
+    encode_vbyte(0, header)
+    encode_vbyte(len(containers), header)
+    prev_key = 0
+    for key, lows in containers:
+        if len(lows) > ARRAY_CONTAINER_MAX:
+            bits = BitmapPostingList.from_ids(lows).get_bits()
+            data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        else:
+            data = bytearray()
+            prev = 0
+            for low in lows:
+                encode_vbyte(low - prev, data)
+                prev = low
+        encode_vbyte(key - prev_key, header)
+        encode_vbyte(len(lows), header)
+        encode_vbyte(len(data), header)
+        prev_key = key
+        body += data
+    return bytes(header + body)
+
+
+def decode_bitmap(buf) -> BitmapPostingList:
+    """
+    Decodes a posting written by encode_bitmap.
+    """
+    (df, _, num_containers), pos = decode_vbyte_prefix(buf, 3)
+    table, pos = decode_vbyte_prefix(buf, 3 * num_containers, pos)
+    stats.add("postings.bytes_decoded", len(buf))
+    bits = 0
+    for key, count, length in zip(accumulate(table[0::3]), table[1::3], table[2::3]):
+        data = bytes(buf[pos:pos + length])
+        pos += length
+        if count > ARRAY_CONTAINER_MAX:
+            container = int.from_bytes(data, "little")
+        else:
+            container = BitmapPostingList.from_ids(accumulate(_decode_gaps(data))).get_bits()
+        bits |= container << (key << CONTAINER_BITS)
+    return BitmapPostingList(bits, df)
+
+
+def open_posting(buf) -> PostingList:
+    """
+    Returns the posting written by encode_postings or encode_bitmap in buf: a BitmapPostingList for a dense posting,
+    else a SkipPostingList that decodes its blocks on demand.
+    """
+    (df, num_blocks), _ = decode_vbyte_prefix(buf, 2)
+    if df != 0 and num_blocks == 0:
+        return decode_bitmap(buf)
+    return SkipPostingList(buf)
+
+
+def decode_postings(buf) -> PostingList:
+    """
+    Decodes a whole posting written by encode_postings or encode_bitmap.
+    """
+    posting = open_posting(buf)
+    if isinstance(posting, BitmapPostingList):
+        return posting
+    return PostingList(posting.get_ids())
+
+
+class SkipPostingList(PostingList):
+    """
+    A posting list that stays encoded until it is needed. Only the skip table is decoded up front,
+    intersect decodes just the blocks whose doc id range can hold a doc id of the other list.
+
+    Attributes:
+        _first_ids: first doc id of every block.
+        _block_starts: offset of every block in _buf, plus the end of the last block.
+        _blocks: decoded blocks by block number.
+    """
+    def __init__(self, buf):
+        (self._df, num_blocks), pos = decode_vbyte_prefix(buf, 2)
+        table, pos = decode_vbyte_prefix(buf, 2 * num_blocks, pos)
+        self._first_ids = array(POSTING_TYPECODE, accumulate(table[0::2]))
+        self._block_starts = list(accumulate(table[1::2], initial=pos))
+        self._buf = buf
+        self._blocks = {}
+        self._ids = None
+
+    def get_ids(self) -> array:
+        if self._ids is None:
+            ids = array(POSTING_TYPECODE)
+            for blk_no in range(len(self._first_ids)):
+                ids += self._decode_block(blk_no)
+            self._ids = ids
+            self._blocks = {}
+        return self._ids
+
+    def nbytes(self) -> int:
+        """
+        Returns the memory the posting takes once it is fully decoded, plus its encoded bytes.
+        """
+        return len(self._buf) + self._df * self._first_ids.itemsize
+
+    def get_blocks_decoded(self) -> int:
+        return len(self._first_ids) if self._ids is not None else len(self._blocks)
+
+    def _decode_block(self, blk_no: int) -> array:
+        block = self._blocks.get(blk_no)
+        if block is None:
+            data = bytes(self._buf[self._block_starts[blk_no]:self._block_starts[blk_no + 1]])
+            stats.add("postings.bytes_decoded", len(data))
+            stats.add("postings.blocks_decoded")
+            block = array(POSTING_TYPECODE, accumulate(_decode_gaps(data), initial=self._first_ids[blk_no]))
+            self._blocks[blk_no] = block
+        return block
+
+    def intersect_ids(self, doc_ids: array) -> array:
+        if self._ids is not None:
+            return super().intersect_ids(doc_ids)
+        res = array(POSTING_TYPECODE)
+        first_ids = self._first_ids
+        if len(first_ids) == 0:
+            return res
+        blk_no = 0
+        skips = 0
+        for doc_id in doc_ids:
+            if doc_id < first_ids[0]:
+                continue
+            # doc_ids ascend, so the block holding doc_id is never before the previous one
+            next_blk_no = bisect_right(first_ids, doc_id, blk_no) - 1
+            if next_blk_no != blk_no:
+                skips += 1
+                blk_no = next_blk_no
+            block = self._decode_block(blk_no)
+            i = bisect_left(block, doc_id)
+            if i != len(block) and block[i] == doc_id:
+                res.append(doc_id)
+        if stats.enabled:  # every doc id probed either followed the skip table to a later block or stayed in its block
+            stats.add("intersect.skips", skips)
+            stats.add("intersect.steps", len(doc_ids) - bisect_left(doc_ids, first_ids[0]) - skips)
+        return res
+
+    def cursor(self) -> Cursor:
+        if self._ids is not None:
+            return super().cursor()
+        return SkipPostingCursor(self)
+
+    def __len__(self) -> int:
+        return self._df
+
+
+class SkipPostingCursor(Cursor):
+    """
+    A cursor over a SkipPostingList that decodes a block only when it lands in it,
+    advance_to finds the block through the skip table.
+    """
+    def __init__(self, posting: SkipPostingList):
+        self._posting = posting
+        self._blk_no = -1
+        self._block = array(POSTING_TYPECODE)
+        self._pos = 0
+        self.doc = self._enter_block(0)
+
+    def _enter_block(self, blk_no: int) -> int:
+        if blk_no >= len(self._posting._first_ids):
+            self._pos = len(self._block)
+            self.doc = EXHAUSTED
+            return self.doc
+        self._blk_no = blk_no
+        self._block = self._posting._decode_block(blk_no)
+        self._pos = 0
+        self.doc = self._block[0]
+        return self.doc
+
+    def next(self) -> int:
+        self._pos += 1
+        if self._pos < len(self._block):
+            self.doc = self._block[self._pos]
+            return self.doc
+        return self._enter_block(self._blk_no + 1)
+
+    def advance_to(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        block = self._block
+        if target > block[-1]:
+            # the last block starting at or before target, the one after it if target is past its end
+            blk_no = bisect_right(self._posting._first_ids, target, self._blk_no + 1) - 1
+            if blk_no == self._blk_no:
+                return self._enter_block(blk_no + 1)
+            self._enter_block(blk_no)
+            block = self._block
+        self._pos = bisect_left(block, target, self._pos)
+        if self._pos == len(block):
+            return self._enter_block(self._blk_no + 1)
+        self.doc = block[self._pos]
+        return self.doc
+
+
+class PostingsWriter:
+    """
+    Sequentially writes postings of sorted terms in either format.
+
+    In text format every term takes two lines, the posting and its skip ids, and the pointer is the one-indexed
+    line number of the posting. In binary format the pointer is the byte offset of the encoded posting,
+    dense postings are written as bitmaps.
+    """
+    def __init__(self, file_name: str, postings_format: str = POSTINGS_FORMAT_BINARY):
+        self.postings_format = postings_format
+        if postings_format == POSTINGS_FORMAT_TEXT:
+            self._file = open(file_name, "wt")
+        else:
+            self._file = open(file_name, "wb")
+        self._line_no = 1
+        self._offset = 0
+
+    def write(self, term: str, posting: PostingList) -> Tuple[int, int]:
+        """
+        Writes the posting of term, returns its (pointer, length in bytes).
+        """
+        if self.postings_format == POSTINGS_FORMAT_TEXT:
+            line = term + " " + str(posting) + os.linesep + posting.skip_to_str() + os.linesep
+            self._file.write(line)
+            pointer = self._line_no
+            self._line_no += 2
+            return pointer, len(line)
+        ids = posting.get_ids()
+        data = encode_bitmap(ids) if is_dense(ids) else encode_postings(posting)
+        self._file.write(data)
+        pointer = self._offset
+        self._offset += len(data)
+        return pointer, len(data)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_posting(file_name: str, postings_format: str, pointer: int, length: int) -> PostingList:
+    """
+    Reads one posting list written by PostingsWriter.
+    """
+    if postings_format == POSTINGS_FORMAT_TEXT:
+        line = linecache.getline(file_name, pointer).rstrip("\r\n")
+        assert line != ""
+        term, posting = line.split(" ", 1)
+        return PostingList(sorted(map(int, posting.split(" "))))
+    with open(file_name, "rb") as f:
+        f.seek(pointer)
+        return decode_postings(f.read(length))
+
+
+class PostingsReader:
+    """
+    Reads postings from a postings file that is opened and memory mapped once.
+    Postings are decoded straight from the mapped buffer, no per-term open, seek or read is needed.
+    """
+    def __init__(self, file_name: str, postings_format: str = POSTINGS_FORMAT_BINARY):
+        self.postings_format = postings_format
+        self._file = open(file_name, "rb")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._mmap = None
+            self._buf = memoryview(b"")
+        else:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buf = memoryview(self._mmap)
+        self._line_starts = None
+
+    def read(self, pointer: int, length: int) -> PostingList:
+        """
+        Decodes the posting at pointer, see PostingsWriter for the meaning of pointer and length.
+        """
+        if self.postings_format == POSTINGS_FORMAT_TEXT:
+            return self._read_line(pointer)
+        return open_posting(self._buf[pointer:pointer + length])
+
+    def prefetch(self, pointer: int, length: int):
+        """
+        Reads the bytes of a posting into the page cache, so that decoding it from the mapping later does not wait
+        on the disk. os.pread releases the GIL, so prefetch threads overlap their reads with query evaluation.
+        Text postings are only prefetched once their line offsets are known.
+        """
+        if not hasattr(os, "pread"):
+            return
+        if self.postings_format == POSTINGS_FORMAT_TEXT:
+            line_starts = self._line_starts
+            if line_starts is None:
+                return
+            start = line_starts[pointer - 1]
+            end = line_starts[pointer] if pointer < len(line_starts) else len(self._buf)
+        else:
+            start, end = pointer, pointer + length
+        os.pread(self._file.fileno(), end - start, start)
+
+    def _read_line(self, line_no: int) -> PostingList:
+        if self._line_starts is None:
+            self._line_starts = self._find_line_starts()
+        start = self._line_starts[line_no - 1]
+        end = self._line_starts[line_no] if line_no < len(self._line_starts) else len(self._buf)
+        stats.add("postings.bytes_decoded", end - start)
+        doc_ids = bytes(self._buf[start:end]).split()
+        # older index files stored ids in string order, so sort while parsing
+        return PostingList(sorted(map(int, doc_ids[1:])))
+
+    def _find_line_starts(self) -> list:
+        """
+        Text postings are addressed by line number, so the start of every line is located once.
+        """
+        starts = []
+        if self._mmap is None:
+            return starts
+        offset = 0
+        size = len(self._mmap)
+        while offset < size:
+            starts.append(offset)
+            offset = self._mmap.find(b"\n", offset) + 1
+            if offset == 0:
+                break
+        return starts
+
+    def close(self):
+        self._buf.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # postings still in use keep the mapping alive, it is unmapped once they are freed
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
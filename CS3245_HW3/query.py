@@ -0,0 +1,200 @@
+import re
+from typing import Callable
+from typing import List
+
+from tokenizer import fast_token_list
+
+OPERATORS = {"AND", "OR", "NOT", "(", ")"}
+_QUERY_TOKEN_RE = re.compile(r"[()]|[^\s()]+")
+
+
+class QuerySyntaxError(ValueError):
+    """
+    Raised when a Boolean query cannot be parsed.
+    """
+
+
+class QueryNode:
+    """
+    A node of a Boolean query expression tree.
+
+    Attributes:
+        estimate: estimated number of doc ids in the result, filled in by the planner.
+    """
+    estimate = 0
+
+
+class Term(QueryNode):
+    def __init__(self, term: str):
+        self.term = term
+
+    def __str__(self) -> str:
+        return self.term
+
+
+class Not(QueryNode):
+    def __init__(self, child: QueryNode):
+        self.child = child
+
+    def __str__(self) -> str:
+        return "NOT " + str(self.child)
+
+
+class And(QueryNode):
+    """
+    Conjunction of children. After planning, children are ordered by ascending estimate,
+    and negated holds the operands of AND NOT, which are subtracted from the conjunction.
+    """
+    def __init__(self, children: List[QueryNode], negated: List[QueryNode] = None):
+        self.children = children
+        self.negated = negated if negated is not None else []
+
+    def __str__(self) -> str:
+        parts = [str(child) for child in self.children] + ["NOT " + str(child) for child in self.negated]
+        return "(" + " AND ".join(parts) + ")"
+
+
+class Or(QueryNode):
+    def __init__(self, children: List[QueryNode]):
+        self.children = children
+
+    def __str__(self) -> str:
+        return "(" + " OR ".join(str(child) for child in self.children) + ")"
+
+
+class Parser:
+    """
+    Recursive descent parser for Boolean queries, with precedence NOT > AND > OR.
+    Two operands without an operator in between are joined by AND.
+
+    or_expr  := and_expr ("OR" and_expr)*
+    and_expr := not_expr (["AND"] not_expr)*
+    not_expr := "NOT" not_expr | "(" or_expr ")" | term
+    """
+    def __init__(self, tokens: List[str]):
+        self._tokens = tokens
+        self._pos = 0
+
+    def parse(self) -> QueryNode:
+        if len(self._tokens) == 0:
+            raise QuerySyntaxError("empty query")
+        node = self._or_expr()
+        if self._peek() is not None:
+            raise QuerySyntaxError("unexpected " + self._peek())
+        return node
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise QuerySyntaxError("unexpected end of query")
+        self._pos += 1
+        return token
+
+    def _or_expr(self) -> QueryNode:
+        children = [self._and_expr()]
+        while self._peek() == "OR":
+            self._next()
+            children.append(self._and_expr())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def _and_expr(self) -> QueryNode:
+        children = [self._not_expr()]
+        while self._peek() is not None and self._peek() not in ("OR", ")"):
+            if self._peek() == "AND":
+                self._next()
+            children.append(self._not_expr())
+        return children[0] if len(children) == 1 else And(children)
+
+    def _not_expr(self) -> QueryNode:
+        token = self._next()
+        if token == "NOT":
+            return Not(self._not_expr())
+        if token == "(":
+            node = self._or_expr()
+            if self._next() != ")":
+                raise QuerySyntaxError("missing )")
+            return node
+        if token in OPERATORS:
+            raise QuerySyntaxError("unexpected " + token)
+        return Term(token)
+
+
+def tokenize(query: str) -> List[str]:
+    """
+    Splits a query line into parentheses, operators and words, the only tokens of the query grammar, without nltk.
+    Words are tokenized like documents are, by fast_token_list, so they are lowercase and stripped of punctuation.
+    """
+    tokens = []
+    for token in _QUERY_TOKEN_RE.findall(query):
+        if token in OPERATORS:
+            tokens.append(token)
+        else:
+            tokens.extend(fast_token_list(token))
+    return tokens
+
+
+def parse(tokens: List[str]) -> QueryNode:
+    """
+    Parses query tokens, where operators and parentheses are separate tokens, to an expression tree.
+    """
+    return Parser(tokens).parse()
+
+
+def plan(node: QueryNode, doc_freq: Callable[[str], int], n_docs: int) -> QueryNode:
+    """
+    Rewrites an expression tree so that it touches as few posting entries as possible:
+    nested AND/OR chains are flattened, double negations removed, AND NOT operands are moved to
+    And.negated to be evaluated as a difference, and AND operands are ordered by ascending estimate,
+    which for a term is its doc frequency. n_docs, the collection size, is only needed for NOT.
+    """
+    if isinstance(node, Term):
+        node.estimate = max(doc_freq(node.term), 0)
+        return node
+    if isinstance(node, Not):
+        if isinstance(node.child, Not):
+            return plan(node.child.child, doc_freq, n_docs)
+        node.child = plan(node.child, doc_freq, n_docs)
+        node.estimate = max(n_docs - node.child.estimate, 0)
+        return node
+    if isinstance(node, Or):
+        children = []
+        for child in _flatten(node, Or):
+            children.append(plan(child, doc_freq, n_docs))
+        children.sort(key=lambda child: child.estimate)
+        node.children = children
+        node.estimate = sum(child.estimate for child in children)
+        return node
+    assert isinstance(node, And)
+    positive = []
+    negated = [plan(child, doc_freq, n_docs) for child in node.negated]  # set when planned before
+    for child in _flatten(node, And):
+        child = plan(child, doc_freq, n_docs)
+        if isinstance(child, Not):
+            negated.append(child.child)
+        else:
+            positive.append(child)
+    if len(positive) == 0:
+        # NOT a AND NOT b is NOT (a OR b)
+        return plan(Not(Or(negated)), doc_freq, n_docs)
+    positive.sort(key=lambda child: child.estimate)
+    negated.sort(key=lambda child: child.estimate, reverse=True)  # larger subtrahends empty the result sooner
+    node.children = positive
+    node.negated = negated
+    node.estimate = positive[0].estimate
+    return node
+
+
+def _flatten(node: QueryNode, node_type: type) -> List[QueryNode]:
+    """
+    Returns the operands of a chain of nested node_type nodes.
+    """
+    operands = []
+    for child in node.children:
+        if isinstance(child, node_type):
+            operands.extend(_flatten(child, node_type))
+        else:
+            operands.append(child)
+    return operands
@@ -0,0 +1,265 @@
+import heapq
+import math
+import mmap
+import pickle
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from postinglist import EXHAUSTED
+from postinglist import PostingCursor
+from postinglist import PostingList
+from postinglist import POSTING_TYPECODE
+from postingsfile import decode_vbyte
+from postingsfile import encode_vbyte
+
+TF_FILE_FORMAT = "{postings_file}.tf"
+_TRAILER = struct.Struct("<Q")  # byte length of the pickled tables at the end of a tf file
+SCORE_DIGITS = 10  # scores are ranked rounded, so the order of additions never reorders tied documents
+BOUND_SLACK = 1e-9  # relative margin on upper bounds, so rounding never prunes a document that makes the top k
+
+
+def get_tf_path(postings_file: str) -> str:
+    """
+    Returns the path of the term frequencies kept next to a postings file.
+    """
+    return TF_FILE_FORMAT.format(postings_file=postings_file)
+
+
+def doc_weight(tf: int) -> float:
+    """
+    The logarithmic tf weight of a term in a document, lnc: no idf, cosine normalized by the document norm.
+    """
+    return 1 + math.log10(tf)
+
+
+def doc_norm(tfs: List[int]) -> float:
+    return math.sqrt(sum(doc_weight(tf) ** 2 for tf in tfs))
+
+
+def max_doc_weight(doc_ids: array, tfs: array, norms: Dict[int, float]) -> float:
+    """
+    Returns the largest normalized weight of a term in any document of its posting, its score upper bound
+    for a query weight of 1.
+    """
+    return max((doc_weight(tf) / norms[doc_id] for doc_id, tf in zip(doc_ids, tfs)), default=0.0)
+
+
+def merge_tfs(parts: List[Tuple[PostingList, array]]) -> array:
+    """
+    Returns the term frequencies of the union of the postings of parts, which hold disjoint doc ids,
+    in doc id order.
+    """
+    if len(parts) == 1:
+        return parts[0][1]
+    merged = heapq.merge(*(zip(posting.get_ids(), tfs) for posting, tfs in parts))
+    return array(POSTING_TYPECODE, (tf for _, tf in merged))
+
+
+class TfWriter:
+    """
+    Writes the term frequencies of every posting, in posting order, to a tf file next to the postings.
+    A posting's frequencies are found by the pointer of the posting, so the dictionary is left as it is.
+
+    Layout: the variable byte encoded frequencies of every posting, then the pickled tables, the pointers,
+    offsets and score upper bounds of the postings and the norm of every document, then their byte length.
+    """
+    def __init__(self, file_name: str, norms: Dict[int, float] = None):
+        self._file = open(file_name, "wb")
+        self._norms = norms if norms is not None else {}
+        self._pointers = array("Q")
+        self._offsets = array("Q", [0])
+        self._max_weights = array("d")
+
+    def write(self, pointer: int, tfs: array, max_weight: float = 0.0):
+        data = bytearray()
+        for tf in tfs:
+            encode_vbyte(tf, data)
+        self._file.write(data)
+        self._pointers.append(pointer)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._max_weights.append(max_weight)
+
+    def close(self):
+        doc_ids = sorted(self._norms)
+        tables = pickle.dumps((self._pointers, self._offsets, self._max_weights,
+                               array(POSTING_TYPECODE, doc_ids), array("d", map(self._norms.get, doc_ids))))
+        self._file.write(tables)
+        self._file.write(_TRAILER.pack(len(tables)))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TfReader:
+    """
+    Reads a tf file written by TfWriter. The frequencies stay memory mapped, only the tables are loaded.
+
+    Attributes:
+        _pointers: pointer of every posting, ascending as postings are written in order.
+        _offsets: offset of the frequencies of every posting, plus the end of the last one.
+        _max_weights: score upper bound of every posting.
+        norms: norm of every document.
+    """
+    def __init__(self, file_name: str):
+        self._file = open(file_name, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._mmap) - _TRAILER.size
+        tables_len, = _TRAILER.unpack(self._mmap[end:])
+        self._pointers, self._offsets, self._max_weights, doc_ids, norms = pickle.loads(
+            self._mmap[end - tables_len:end])
+        self.norms = dict(zip(doc_ids, norms))
+
+    def _find(self, pointer: int) -> int:
+        i = bisect_left(self._pointers, pointer)
+        if i == len(self._pointers) or self._pointers[i] != pointer:
+            raise KeyError(pointer)
+        return i
+
+    def read_tfs(self, pointer: int) -> array:
+        i = self._find(pointer)
+        return array(POSTING_TYPECODE, decode_vbyte(self._mmap[self._offsets[i]:self._offsets[i + 1]]))
+
+    def get_max_weight(self, pointer: int) -> float:
+        return self._max_weights[self._find(pointer)]
+
+    def get_n_docs(self) -> int:
+        return len(self.norms)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ScoreStats:
+    """
+    Counts the postings of the query terms and how many of them were scored, over all ranked queries.
+
+    Attributes:
+        postings: postings of the query terms.
+        scored: postings whose document got the term's score added.
+    """
+    def __init__(self):
+        self.postings = 0
+        self.scored = 0
+
+    def skipped_rate(self) -> float:
+        return 1 - self.scored / self.postings if self.postings != 0 else 0.0
+
+    def stats_str(self) -> str:
+        return "ranked: scored {} of {} postings, {:.1%} skipped".format(
+            self.scored, self.postings, self.skipped_rate())
+
+
+class TermScorer(PostingCursor):
+    """
+    Walks the posting of a query term along with its term frequencies, scoring the document it is on.
+
+    Attributes:
+        weight: the ltc weight of the term in the query, without the query norm, which does not change the ranking.
+        upper_bound: the largest score the term adds to any document.
+    """
+    def __init__(self, doc_ids: array, tfs: array, weight: float, max_weight: float):
+        super().__init__(doc_ids)
+        self._tfs = tfs
+        self.weight = weight
+        self.upper_bound = weight * max_weight
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def score(self, norms: Dict[int, float]) -> float:
+        return self.weight * doc_weight(self._tfs[self._pos]) / norms[self.doc]
+
+
+def query_weight(count: int, df: int, n_docs: int) -> float:
+    """
+    The ltc weight of a term occurring count times in the query, without the query norm.
+    """
+    return (1 + math.log10(count)) * math.log10(n_docs / df)
+
+
+def _ranked(top: List[Tuple[float, int]]) -> List[int]:
+    return [-neg_doc for _, neg_doc in sorted(top, reverse=True)]
+
+
+def top_k_exhaustive(scorers: List[TermScorer], k: int, norms: Dict[int, float],
+                     stats: ScoreStats = None) -> List[int]:
+    """
+    Returns the k doc ids with the highest scores, by descending score then ascending doc id,
+    scoring every posting of every term.
+    """
+    scores = {}
+    for scorer in scorers:
+        while scorer.doc != EXHAUSTED:
+            scores[scorer.doc] = scores.get(scorer.doc, 0.0) + scorer.score(norms)
+            scorer.next()
+    if stats is not None:
+        stats.postings += sum(map(len, scorers))
+        stats.scored += sum(map(len, scorers))
+    return _ranked(heapq.nlargest(k, ((round(score, SCORE_DIGITS), -doc) for doc, score in scores.items())))
+
+
+def top_k_maxscore(scorers: List[TermScorer], k: int, norms: Dict[int, float],
+                   stats: ScoreStats = None) -> List[int]:
+    """
+    Returns the same doc ids as top_k_exhaustive with MaxScore pruning, document at a time.
+
+    Terms are sorted by upper bound. Once k documents are kept, the terms with the smallest upper bounds, whose bounds
+    sum to no more than the k-th best score, are non-essential: a document on none of the other, essential terms
+    cannot make the top k, so only the doc ids of essential terms are candidates. A candidate probes the non-essential
+    terms, largest bound first, only while its score plus the bounds left could still beat the k-th best score.
+    Documents come in ascending order, so a later one never wins a tie against a kept one.
+    """
+    scorers = sorted(scorers, key=lambda scorer: scorer.upper_bound)
+    bounds = list(accumulate(scorer.upper_bound * (1 + BOUND_SLACK) for scorer in scorers))
+    top = []  # (rounded score, -doc) of the best documents so far, worst first
+    threshold = -1.0
+    first_essential = 0
+    scored = 0
+    while first_essential < len(scorers):
+        essential = scorers[first_essential:]
+        doc = min(scorer.doc for scorer in essential)
+        if doc == EXHAUSTED:
+            break
+        score = 0.0
+        for scorer in essential:
+            if scorer.doc == doc:
+                score += scorer.score(norms)
+                scored += 1
+                scorer.next()
+        for i in range(first_essential - 1, -1, -1):
+            if score + bounds[i] <= threshold:
+                break
+            if scorers[i].advance_to(doc) == doc:
+                score += scorers[i].score(norms)
+                scored += 1
+        entry = (round(score, SCORE_DIGITS), -doc)
+        if len(top) < k:
+            heapq.heappush(top, entry)
+        elif entry > top[0]:
+            heapq.heapreplace(top, entry)
+        else:
+            continue
+        if len(top) == k:
+            threshold = top[0][0]
+            while first_essential < len(scorers) and bounds[first_essential] <= threshold:
+                first_essential += 1
+    if stats is not None:
+        stats.postings += sum(map(len, scorers))
+        stats.scored += scored
+    return _ranked(top)
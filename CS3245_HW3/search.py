@@ -1,65 +1,196 @@
 #!/usr/bin/python3
+import io
+import logging
 import os
 import re
-import nltk
-from nltk.tokenize import word_tokenize
+import signal
 import sys
 import getopt
-import pickle
-from sortedskiplist import SortedSkipList
-from sortedskiplist import union
-from sortedskiplist import intersect
-from sortedskiplist import complement
+import heapq
+import time
+from collections import Counter
+from collections import deque
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import TextIO
+from typing import Tuple
+from typing import Union
+from postinglist import BitmapPostingList
+from postinglist import PostingList
+from postinglist import union
+from postinglist import intersect
+from postinglist import difference
+from postinglist import intersect_all
+from postinglist import union_all
+from postinglist import Complement
+from postinglist import Cursor
+from daat import build_cursor
+from daat import iter_docs
+from daat import write_docs
+from daat import ENGINE_DAAT
+from daat import ENGINE_TAAT
+from daat import ENGINES
+from query import parse
+from query import And
+from query import OPERATORS
+from query import plan
+from query import Not
+from query import Or
+from query import QueryNode
+from query import QuerySyntaxError
+from query import Term
+from query import tokenize
 from termdict import TermDict
+from termdict import load_dictionary
+from postingsfile import PostingsReader
+from stemcache import get_stems_path
+from stemcache import StemCache
+from postingcache import PostingCache
+from postingcache import CACHE_POLICY_COST
+from postingcache import CACHE_POLICY_LRU
+from postingcache import DEFAULT_CACHE_BYTES
+from ranked import get_tf_path
+from ranked import query_weight
+from ranked import ScoreStats
+from ranked import TermScorer
+from ranked import TfReader
+from ranked import top_k_maxscore
+from segments import read_manifest
+from shards import get_shard_path
+from shards import read_shard_count
+from snapshot import open_snapshot
+from snapshot import write_snapshot
+from stats import DEFAULT_LOG_LEVEL
+from stats import LOG_LEVELS
+from stats import set_log_level
+from stats import stats
+from tokenizer import TOKENIZER_FAST
+from tokenizer import TOKENIZER_NLTK
+from tokenizer import TOKENIZERS
 
 dictionary = TermDict()
-STEMMER = nltk.stem.porter.PorterStemmer()
-line_start_bytes = []
-all_doc_ids = SortedSkipList()
+stem_cache = StemCache()
+posting_cache = PostingCache()
+cache_budget = DEFAULT_CACHE_BYTES
+cache_policy = CACHE_POLICY_LRU
+warm_terms = 0
+engine = ENGINE_TAAT
+prefetch_depth = 0  # queries parsed and prefetched ahead, 0 runs queries strictly in order
+PREFETCH_THREADS = 4
+RESULTS_BUFFER_SIZE = 1024 * 1024
+shards = 1  # doc id range shards of the index, searched in parallel
+SHARD_BATCH = 64  # queries sent to every shard at a time
+shard_reader = None  # postings of the shard a worker process searches
+ranked_k = 0  # return the ranked_k best documents of a free text query instead of the Boolean result, 0 is Boolean
+tf_reader = None  # term frequencies and document norms, with --ranked
+ranked_stats = ScoreStats()
+all_doc_ids = None
 ALL_DOC_IDS_FILE = "all-ids.txt"
+query_tokenizer = TOKENIZER_FAST  # the built-in query tokenizer, nltk's word_tokenize is only imported for nltk
+snapshot_file = None  # index state mapped in at startup instead of loaded, with --snapshot
+snapshot = None
+dictionary_file = postings_file = file_of_queries = file_of_output = socket_file = segments_directory = None
+stats_file = None
+is_serving = False
+options_argv = []  # the options searched with, parsed again by worker processes
+logger = logging.getLogger("search")
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results"
+          + " [--stem-cache-size N] [--cache-bytes N] [--cache-policy lru|cost] [--warm N]"
+          + " [--backend python|numpy] [--engine taat|daat] [--prefetch K] [--shards N] [--ranked K]"
+          + " [--query-tokenizer fast|nltk] [--snapshot snapshot-file] [--stats stats-file] [--log-level LEVEL]")
+    print("  --cache-bytes: memory budget of the posting list cache, " + str(DEFAULT_CACHE_BYTES) + " by default")
+    print("  --cache-policy: evict the least recently used posting (lru) or the smallest doc_freq * hits (cost)")
+    print("  --warm: preload the postings of the N terms with the highest doc frequency")
+    print("  --backend: run posting list operations in python (default) or numpy, which is faster on long postings")
+    print("  --engine: evaluate operators a whole posting at a time (taat, default), or document at a time with"
+          + " cursors (daat), streaming results out without holding intermediate postings")
+    print("  --ranked: treat queries as free text and return their K best documents by tf-idf cosine score,"
+          + " needs an index built with index.py --ranked")
+    print("  --query-tokenizer: split queries into words, parentheses and operators with the built-in tokenizer"
+          + " (fast, default), or with nltk's word_tokenize, which is slow to import")
+    print("  --snapshot: map the stems and all doc ids in from snapshot-file, taking the snapshot first when it does"
+          + " not exist or the index changed since; most useful with stems saved by index.py --save-stems")
+    print("  --prefetch: read the postings of the next K queries on a thread pool while a query is evaluated")
+    print("  --stats: write counters, e.g. postings fetched, bytes decoded, skips and steps of intersections,"
+          + " and the latency of every query as JSON")
+    print("  --log-level: " + ", ".join(LOG_LEVELS) + ", " + DEFAULT_LOG_LEVEL + " by default")
+    print("       " + sys.argv[0] + " --segments segments-directory -q file-of-queries -o output-file-of-results")
+    print("  --segments: search the live segments of an index built incrementally with index.py --segments")
+    print("  --shards: search an index built with index.py --shards N, one process per shard")
+    print("       " + sys.argv[0] + " -d dictionary-file -p postings-file --serve [--socket socket-file]")
+    print("  --serve: keep the index loaded and answer queries over a Unix socket, or stdin and stdout without --socket")
 
 
-def build_line_start_bytes(file_name):
-    with open(file_name, "rt") as file:
-        global line_start_bytes
-        offset = 0
-        for line in file:
-            line_start_bytes.append(offset)
-            offset += len(line)
-        file.seek(0)  # reset
+def get_posting_list(term, postings_reader: PostingsReader) -> PostingList:
+    if term not in dictionary:
+        return PostingList()
+    posting = posting_cache.get(term)
+    if posting is None:
+        length = dictionary.get_term_length(term)
+        posting = postings_reader.read(dictionary.get_term_pointer(term), length)
+        posting_cache.put(term, posting)
+        stats.add("search.postings_fetched")
+        stats.add("search.bytes_read", length)
+        logger.debug("fetched the posting of %s: %d doc ids, %d bytes", term, len(posting), length)
+    return posting
 
 
-def get_posting_list(term, posting_file) -> SortedSkipList:
-    posting_list = SortedSkipList()
-    try:
-        pointer = dictionary.get_term_pointer(term)  # line-number in the file is one-indexed
-    except:
-        return posting_list
-    with open(posting_file, "rt") as f:
-        f.seek(line_start_bytes[pointer - 1])
-        line = f.readline()
-        doc_ids = line.split(" ")
-        assert doc_ids[0] == term
-        for i in range(1, len(doc_ids)):
-            posting_list.add_val(int(doc_ids[i]))
-        f.seek(line_start_bytes[pointer])
-        skips = f.readline()
-        skips = skips.split(" ")
-        posting_list.build_skip_from_list(skips)
-        return posting_list
+def warm_up_cache(postings_reader: PostingsReader, n_terms: int):
+    """
+    Preloads and decodes the postings of the n_terms terms with the highest doc frequency.
+    """
+    for term in heapq.nlargest(n_terms, dictionary, key=dictionary.get_term_freq):
+        posting = postings_reader.read(dictionary.get_term_pointer(term), dictionary.get_term_length(term))
+        posting.get_ids()
+        posting_cache.put(term, posting)
 
 
 def load_all_doc_ids():
     global all_doc_ids
     with open(ALL_DOC_IDS_FILE, "rt") as f:
         line = f.readline()
-        doc_ids = line.split(" ")
-        for doc_id in doc_ids:
-            all_doc_ids.add_val(int(doc_id))
+        all_doc_ids = BitmapPostingList.from_ids(map(int, line.split()))  # NOT clears bits of it
+
+
+def get_all_doc_ids() -> PostingList:
+    """
+    Returns all doc ids, loading them on first use. Only a query with NOT needs them.
+    """
+    global all_doc_ids
+    if all_doc_ids is None:
+        if snapshot is not None:
+            all_doc_ids = snapshot.get_all_doc_ids()
+        else:
+            load_all_doc_ids()
+    return all_doc_ids
+
+
+def get_snapshot_sources(dict_file: str) -> List[str]:
+    return [dict_file, ALL_DOC_IDS_FILE, get_stems_path(dict_file)]
+
+
+def load_state(dict_file: str):
+    """
+    Loads the stems and, with --snapshot, all doc ids. A current snapshot is mapped in and nothing else is read,
+    otherwise the saved stems are loaded and a snapshot of them is taken for the next start.
+    """
+    global snapshot
+    if snapshot_file is not None:
+        snapshot = open_snapshot(snapshot_file, get_snapshot_sources(dict_file))
+        if snapshot is not None:
+            stem_cache.attach(snapshot)
+            logger.debug("mapped the snapshot %s: %d stems, %d doc ids", snapshot_file, len(snapshot),
+                         snapshot.n_docs)
+            return
+    stem_cache.load(get_stems_path(dict_file))  # start warm when the indexer saved its stems
+    if snapshot_file is not None:
+        write_snapshot(snapshot_file, get_snapshot_sources(dict_file), get_all_doc_ids(), stem_cache.entries())
+        logger.info("took a snapshot of the index state to %s", snapshot_file)
 
 
 def clean_up(results_file):
@@ -67,6 +198,39 @@ def clean_up(results_file):
         pass
 
 
+def load_index(dict_file: str, postings_file: str) -> PostingsReader:
+    """
+    Loads the dictionary and opens the postings file, the state shared by every query.
+    """
+    global dictionary, posting_cache, tf_reader
+    with stats.timer("search.load_dictionary"):
+        dictionary = load_dictionary(dict_file)
+    if ranked_k > 0:
+        tf_path = get_tf_path(postings_file)
+        if not os.path.exists(tf_path):
+            print("no term frequencies at " + tf_path + ", build the index with index.py --ranked")
+            sys.exit(2)
+        tf_reader = TfReader(tf_path)
+    with stats.timer("search.load_state"):
+        load_state(dict_file)
+    posting_cache = PostingCache(cache_budget, cache_policy)  # shared by all queries
+    postings_reader = PostingsReader(postings_file, dictionary.get_postings_format())
+    warm_up_cache(postings_reader, warm_terms)
+    return postings_reader
+
+
+def tokenize_query(query: str) -> List[str]:
+    """
+    Tokenizes a query line and stems every token except the operators.
+    """
+    if query_tokenizer == TOKENIZER_NLTK:
+        from nltk.tokenize import word_tokenize
+        tokens = word_tokenize(query)
+    else:
+        tokens = tokenize(query)
+    return [token if token in OPERATORS else stem_cache.stem(token) for token in tokens]
+
+
 def run_search(dict_file, postings_file, queries_file, results_file):
     """
     using the given dictionary file and postings file,
@@ -76,108 +240,484 @@ def run_search(dict_file, postings_file, queries_file, results_file):
     print('running search on the queries...')
     # This is an empty method
     # Pls implement your code in below
-    with open(dict_file, "rb") as file:
-        global dictionary
-        dictionary = pickle.load(file)
-    build_line_start_bytes(postings_file)
-    load_all_doc_ids()
-
-    with open(queries_file, "rt") as file:
-        for line in file.readlines():
-            query = line.strip()
-            tokens = word_tokenize(query)
-            tokens = list(map(lambda token: STEMMER.stem(token) if token != "AND" and token != "OR" and
-                              token != "NOT" else token, tokens))
-            result = search(tokens, postings_file)
-            with open(results_file, "at") as result_f:
-                result_f.write(str(result) + os.linesep)
-
-
-def search(query, index_file):
-    # tokenize query and apply Boolean operators
-    terms = query
-    stack = []
-    current_operation = None
-    is_not = None
-    is_sub_query = False
-    subQuery = []
-    for term in terms:
-        print(term)
-        if is_sub_query:
-            if term == ")":
-                subResult = search(subQuery, index_file)
-
-                if is_not:
-                    subResult = complement(subResult, all_doc_ids)
-                    is_not = False
-                if current_operation is None:
-                    stack.append(subResult)
-                elif current_operation == "AND":
-                    posting_list1 = stack.pop()
-                    result = intersect(posting_list1, subResult)
-                    stack.append(result)
-                elif current_operation == "OR":
-                    posting_list1 = stack.pop()
-                    result = union(posting_list1, subResult)
-                    stack.append(result)
-
-                subQuery = []
-                is_sub_query = False
-            else:
-                subQuery.append(term)
+    with open(queries_file, "rt") as file, load_index(dict_file, postings_file) as postings_reader, \
+            open(results_file, "wt", buffering=RESULTS_BUFFER_SIZE) as result_f:
+        queries = (line.strip() for line in file)
+        if prefetch_depth > 0:
+            parsed = prefetched(queries, postings_reader, prefetch_depth)
+        else:
+            parsed = map(tokenize_query, queries)
+        for tokens in parsed:
+            start = time.perf_counter()
+            write_result(tokens, postings_reader, result_f)
+            elapsed = time.perf_counter() - start
+            stats.add_latency(elapsed)
+            logger.debug("answered %s in %.3f ms", tokens, elapsed * 1000)
+    print(stem_cache.stats_str())
+    print(posting_cache.stats_str())
+    stats.add("search.cache_hits", posting_cache.hits)
+    if ranked_k > 0:
+        print(ranked_stats.stats_str())
+        stats.add("ranked.postings", ranked_stats.postings)
+        stats.add("ranked.scored", ranked_stats.scored)
+
+
+def run_sharded_search(dict_file: str, postings_file: str, queries_file: str, results_file: str, n_shards: int):
+    """
+    Searches an index split into n_shards doc id ranges. The results of each query are concatenated
+    in shard order, which keeps them sorted.
+    """
+    print('running search on {} shards...'.format(n_shards))
+    parts = [(get_shard_path(dict_file, shard_no), get_shard_path(postings_file, shard_no),
+              get_shard_path(ALL_DOC_IDS_FILE, shard_no)) for shard_no in range(n_shards)]
+    run_parts_search(parts, queries_file, results_file, concat_results)
+
+
+def run_segments_search(seg_dir: str, queries_file: str, results_file: str):
+    """
+    Searches the live segments of a segments directory. Segments may hold interleaved doc ids,
+    so the results of each query are merged.
+    """
+    segments = read_manifest(seg_dir).segments
+    print('running search on {} segments...'.format(len(segments)))
+    parts = [(segment.get_dict_path(), segment.get_postings_path(), segment.get_ids_path()) for segment in segments]
+    run_parts_search(parts, queries_file, results_file, merge_results)
+
+
+def run_parts_search(parts: List[Tuple[str, str, str]], queries_file: str, results_file: str,
+                     join_results: Callable[[Tuple[str, ...]], str]):
+    """
+    Searches an index made of parts holding disjoint sets of doc ids, given as (dictionary, postings, all doc ids)
+    files. Every part is opened once by its own worker process, batches of queries are evaluated on all parts
+    in parallel, and join_results combines the results of a query on every part into its result.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    clean_up(results_file)
+    executors = [ProcessPoolExecutor(1, initializer=open_shard, initargs=(options_argv,) + part) for part in parts]
+    try:
+        with open(queries_file, "rt") as file, open(results_file, "wt", buffering=RESULTS_BUFFER_SIZE) as result_f:
+            pending = deque()  # the next batch is already being searched while the results of one are written
+            for batch in iter_batches(file, SHARD_BATCH):
+                pending.append((len(batch), [executor.submit(search_shard, batch) for executor in executors]))
+                if len(pending) > 1:
+                    write_shard_results(*pending.popleft(), join_results, result_f)
+            while len(pending) != 0:
+                write_shard_results(*pending.popleft(), join_results, result_f)
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+
+def concat_results(results: Tuple[str, ...]) -> str:
+    return " ".join(result for result in results if result != "")
+
+
+def merge_results(results: Tuple[str, ...]) -> str:
+    return " ".join(map(str, heapq.merge(*(map(int, result.split()) for result in results))))
+
+
+def iter_batches(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    batch = []
+    for line in lines:
+        batch.append(line.strip())
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) != 0:
+        yield batch
+
+
+def write_shard_results(n_queries: int, futures: list, join_results: Callable[[Tuple[str, ...]], str], out: TextIO):
+    if len(futures) == 0:  # nothing indexed yet
+        out.write(os.linesep * n_queries)
+        return
+    parts = [future.result() for future in futures]
+    for _, stats_delta in parts:
+        stats.merge_delta(stats_delta)
+    for results in zip(*(results for results, _ in parts)):
+        out.write(join_results(results))
+        out.write(os.linesep)
+
+
+def open_shard(argv: List[str], dict_file: str, postings_file: str, all_ids_file: str):
+    """
+    Opens the index of one shard in a worker process, for the life of the process, with the options of argv.
+    """
+    global ALL_DOC_IDS_FILE, shard_reader
+    parse_options(argv)  # a spawned worker imported this module afresh, with every option at its default
+    ALL_DOC_IDS_FILE = all_ids_file
+    shard_reader = load_index(dict_file, postings_file)
+
+
+def search_shard(queries: List[str]) -> Tuple[List[str], tuple]:
+    """
+    Returns the results of queries on the shard of this worker process, and its stats.
+    """
+    results = []
+    for query in queries:
+        out = io.StringIO()
+        write_result(tokenize_query(query), shard_reader, out)
+        results.append(out.getvalue()[:-len(os.linesep)])
+    return results, stats.take_delta()
+
+
+def write_result(tokens: List[str], postings_reader: PostingsReader, out: TextIO):
+    if ranked_k > 0:
+        out.write(" ".join(map(str, rank(tokens, postings_reader))))
+    elif engine == ENGINE_DAAT:
+        write_docs(search_cursor(tokens, postings_reader), out)  # streamed, never held whole
+    else:
+        out.write(str(search(tokens, postings_reader)))
+    out.write(os.linesep)
+
+
+def prefetched(queries: Iterable[str], postings_reader: PostingsReader, depth: int) -> Iterator[List[str]]:
+    """
+    Yields the tokens of every query in order, parsing and stemming depth queries ahead of the one being evaluated.
+    As soon as a query is parsed, the postings of its terms are read on a thread pool, so by the time it is
+    evaluated they are in the page cache and the disk reads overlapped the evaluation of the queries before it.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    window = deque()
+    with ThreadPoolExecutor(PREFETCH_THREADS) as pool:
+        for query in queries:
+            tokens = tokenize_query(query)
+            pool.submit(prefetch_terms, tokens, postings_reader)
+            window.append(tokens)
+            if len(window) > depth:
+                yield window.popleft()
+        while len(window) != 0:
+            yield window.popleft()
+
+
+def prefetch_terms(tokens: List[str], postings_reader: PostingsReader):
+    """
+    Reads the postings of the terms of a query that are not cached yet. Runs on a prefetch thread.
+    """
+    for token in tokens:
+        if token in OPERATORS or token in posting_cache or token not in dictionary:
+            continue
+        postings_reader.prefetch(dictionary.get_term_pointer(token), dictionary.get_term_length(token))
+
+
+def answer(query: str, postings_reader: PostingsReader) -> str:
+    """
+    Answers one query for the server, returning a response line: the latency in milliseconds,
+    a tab, then the result.
+    """
+    start = time.perf_counter()
+    tokens = tokenize_query(query.strip())
+    if ranked_k > 0:
+        result = " ".join(map(str, rank(tokens, postings_reader)))
+    elif engine == ENGINE_DAAT:
+        result = " ".join(map(str, iter_docs(search_cursor(tokens, postings_reader))))
+    else:
+        result = str(search(tokens, postings_reader))
+    elapsed = time.perf_counter() - start
+    stats.add_latency(elapsed)
+    return "{:.3f}\t{}\n".format(elapsed * 1000, result)
+
+
+async def handle_client(reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter",
+                        postings_reader: PostingsReader):
+    """
+    Answers the queries of one client, one query per line, until it disconnects.
+    """
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            writer.write(answer(line.decode("utf-8"), postings_reader).encode("utf-8"))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_socket(socket_path: str, postings_reader: PostingsReader):
+    """
+    Serves clients on a Unix socket until SIGINT or SIGTERM.
+    """
+    import asyncio
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_client(reader, writer, postings_reader), path=socket_path)
+    print("serving on " + socket_path, file=sys.stderr)
+    async with server:
+        serving = asyncio.ensure_future(server.serve_forever())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, serving.cancel)
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+
+
+def serve(dict_file: str, postings_file: str, socket_path: str = None):
+    """
+    Loads the index once and answers queries until stopped, over a Unix socket when socket_path is given,
+    else over stdin and stdout. Every query gets one response line, see answer.
+    """
+    with load_index(dict_file, postings_file) as postings_reader:
+        if socket_path is None:
+            for line in sys.stdin:
+                sys.stdout.write(answer(line, postings_reader))
+                sys.stdout.flush()
+        else:
+            import asyncio
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            try:
+                asyncio.run(serve_socket(socket_path, postings_reader))
+            finally:
+                if os.path.exists(socket_path):
+                    os.remove(socket_path)
+    print(stem_cache.stats_str(), file=sys.stderr)
+    print(posting_cache.stats_str(), file=sys.stderr)
+
+
+def search(query, postings_reader: PostingsReader) -> PostingList:
+    """
+    Parses the query tokens to an expression tree, plans it and evaluates it.
+    A query that cannot be parsed has no results.
+    """
+    try:
+        node = parse(query)
+    except QuerySyntaxError:
+        return PostingList()
+    n_docs = len(get_all_doc_ids()) if "NOT" in query else 0
+    node = plan(node, dictionary.get_term_freq, n_docs)
+    result = evaluate(node, postings_reader)
+    if isinstance(result, Complement):  # a negation nothing else could absorb
+        result = difference(get_all_doc_ids(), result.posting)
+    return result
+
+
+def search_cursor(query, postings_reader: PostingsReader) -> Cursor:
+    """
+    Parses and plans the query tokens like search, but returns a cursor that finds the results document at a time.
+    """
+    try:
+        node = parse(query)
+    except QuerySyntaxError:
+        return PostingList().cursor()
+    n_docs = len(get_all_doc_ids()) if "NOT" in query else 0
+    node = plan(node, dictionary.get_term_freq, n_docs)
+    return build_cursor(node, lambda term: get_posting_list(term, postings_reader), get_all_doc_ids)
+
+
+def rank(query: List[str], postings_reader: PostingsReader) -> List[int]:
+    """
+    Returns the ranked_k documents with the highest tf-idf cosine scores for the query tokens, best first,
+    ties broken by doc id. Operators are ignored, as are terms in every document, which score nothing.
+    """
+    n_docs = tf_reader.get_n_docs()
+    scorers = []
+    for term, count in Counter(token for token in query if token not in OPERATORS and token in dictionary).items():
+        df = dictionary.get_term_freq(term)
+        if df >= n_docs:
+            continue
+        pointer = dictionary.get_term_pointer(term)
+        scorers.append(TermScorer(get_posting_list(term, postings_reader).get_ids(), tf_reader.read_tfs(pointer),
+                                  query_weight(count, df, n_docs), tf_reader.get_max_weight(pointer)))
+    return top_k_maxscore(scorers, ranked_k, tf_reader.norms, ranked_stats)
+
+
+def evaluate(node: QueryNode, postings_reader: PostingsReader) -> Union[PostingList, Complement]:
+    """
+    Evaluates a planned expression tree. Negations stay lazy Complements, which AND turns into differences
+    and OR rewrites by De Morgan's laws, so the complement against all doc ids is never built in between.
+    """
+    if isinstance(node, Term):
+        return get_posting_list(node.term, postings_reader)
+    if isinstance(node, Not):
+        result = evaluate(node.child, postings_reader)
+        return result.posting if isinstance(result, Complement) else Complement(result)
+    if isinstance(node, Or):
+        return evaluate_or(node, postings_reader)
+    return evaluate_and(node, postings_reader)
+
+
+def evaluate_or(node: Or, postings_reader: PostingsReader) -> Union[PostingList, Complement]:
+    # a flat chain of OR is unioned at once, so long synonym expansions cost no more than one pass
+    positive = []
+    negated = []
+    for child in node.children:
+        result = evaluate(child, postings_reader)
+        if isinstance(result, Complement):
+            negated.append(result.posting)
         else:
-            if term == "AND":
-                current_operation = "AND"
-            elif term == "OR":
-                current_operation = "OR"
-            elif term == "NOT":
-                is_not = True
-            elif term == "(":
-                subQuery = []
-                is_sub_query = True
-            else:
-                posting_list2 = get_posting_list(term, index_file)
-                if is_not:
-                    is_not = False
-                    posting_list2 = complement(posting_list2, all_doc_ids)
-
-                if current_operation is None:
-                    stack.append(posting_list2)
-                elif current_operation == "AND":
-                    posting_list1 = stack.pop()
-                    result = intersect(posting_list1, posting_list2)
-                    stack.append(result)
-                elif current_operation == "OR":
-                    posting_list1 = stack.pop()
-                    result = union(posting_list1, posting_list2)
-                    stack.append(result)
-
-    # return final result
-    return stack[0]
-
-
-dictionary_file = postings_file = file_of_queries = output_file_of_results = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == '-d':
-        dictionary_file = a
-    elif o == '-p':
-        postings_file = a
-    elif o == '-q':
-        file_of_queries = a
-    elif o == '-o':
-        file_of_output = a
+            positive.append(result)
+    positive = union_all(positive)
+    if len(negated) == 0:
+        return positive
+    # NOT a OR NOT b is NOT (a AND b), and p OR NOT n is NOT (n AND NOT p)
+    return Complement(difference(intersect_all(negated), positive))
+
+
+def evaluate_and(node: And, postings_reader: PostingsReader) -> Union[PostingList, Complement]:
+    # AND operands ascend by estimated size, so an empty operand is met early and stops the evaluation
+    positive = []
+    subtrahends = []
+    for child in node.children:
+        posting = evaluate(child, postings_reader)
+        if isinstance(posting, Complement):
+            subtrahends.append(posting.posting)
+            continue
+        if len(posting) == 0:
+            return PostingList()
+        positive.append(posting)
+    for child in node.negated:
+        posting = evaluate(child, postings_reader)
+        if isinstance(posting, Complement):  # AND NOT NOT x is AND x
+            if len(posting.posting) == 0:
+                return PostingList()
+            positive.append(posting.posting)
+        else:
+            subtrahends.append(posting)
+    if len(positive) == 0:
+        # NOT a AND NOT b is NOT (a OR b)
+        return Complement(union_all(subtrahends))
+    # the shortest operand drives a single intersection of the whole chain
+    result = intersect_all(positive)
+    for posting in subtrahends:
+        if len(result) == 0:
+            break
+        result = difference(result, posting)
+    return result
+
+
+def parse_options(argv: List[str]):
+    """
+    Sets the search options of argv. Worker processes parse the same options in their initializer, so they
+    search like the parent whatever the start method of their pool.
+    """
+    global dictionary_file, postings_file, file_of_queries, file_of_output, socket_file, segments_directory
+    global stats_file, is_serving, options_argv, stem_cache, cache_budget, cache_policy, warm_terms, engine
+    global prefetch_depth, shards, ranked_k, query_tokenizer, snapshot_file
+    global union, intersect, difference, union_all, intersect_all
+    options_argv = argv
+    try:
+        opts, args = getopt.getopt(argv, 'd:p:q:o:', ['stem-cache-size=', 'cache-bytes=', 'cache-policy=', 'warm=', 'serve', 'socket=', 'backend=', 'engine=', 'prefetch=', 'shards=', 'segments=', 'ranked=', 'query-tokenizer=', 'snapshot=', 'stats=', 'log-level='])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-q':
+            file_of_queries = a
+        elif o == '-o':
+            file_of_output = a
+        elif o == '--stem-cache-size':
+            stem_cache = StemCache(int(a))
+        elif o == '--cache-bytes':
+            cache_budget = int(a)
+        elif o == '--cache-policy':
+            if a not in (CACHE_POLICY_LRU, CACHE_POLICY_COST):
+                usage()
+                sys.exit(2)
+            cache_policy = a
+        elif o == '--warm':
+            warm_terms = int(a)
+        elif o == '--backend':
+            import npbackend  # imports numpy
+            if a not in npbackend.BACKENDS:
+                usage()
+                sys.exit(2)
+            if a == npbackend.BACKEND_NUMPY:
+                if not npbackend.is_available():
+                    print("numpy is not installed, --backend numpy is not available")
+                    sys.exit(2)
+                union, intersect, difference = npbackend.union, npbackend.intersect, npbackend.difference
+                union_all, intersect_all = npbackend.union_all, npbackend.intersect_all
+        elif o == '--engine':
+            if a not in ENGINES:
+                usage()
+                sys.exit(2)
+            engine = a
+        elif o == '--prefetch':
+            prefetch_depth = int(a)
+        elif o == '--shards':
+            shards = int(a)
+        elif o == '--segments':
+            segments_directory = a
+        elif o == '--ranked':
+            ranked_k = int(a)
+        elif o == '--query-tokenizer':
+            if a not in TOKENIZERS:
+                usage()
+                sys.exit(2)
+            query_tokenizer = a
+        elif o == '--snapshot':
+            snapshot_file = a
+        elif o == '--stats':
+            stats_file = a
+            stats.enabled = True
+        elif o == '--log-level':
+            if a not in LOG_LEVELS:
+                usage()
+                sys.exit(2)
+            set_log_level(a)
+        elif o == '--serve':
+            is_serving = True
+        elif o == '--socket':
+            socket_file = a
+        else:
+            assert False, "unhandled option"
+
+
+def main():
+    parse_options(sys.argv[1:])
+    if ranked_k > 0 and (shards > 1 or segments_directory is not None):
+        print("--ranked searches a single index, not --shards or --segments")
+        sys.exit(2)
+    if snapshot_file is not None and (shards > 1 or segments_directory is not None):
+        print("--snapshot maps the state of a single index, not --shards or --segments")
+        sys.exit(2)
+
+    if segments_directory is not None:
+        if file_of_queries == None or file_of_output == None:
+            usage()
+            sys.exit(2)
+        run_segments_search(segments_directory, file_of_queries, file_of_output)
+        if stats_file is not None:
+            stats.write(stats_file)
+        sys.exit(0)
+
+    if dictionary_file == None or postings_file == None:
+        usage()
+        sys.exit(2)
+
+    if is_serving:
+        serve(dictionary_file, postings_file, socket_file)
+        if stats_file is not None:
+            stats.write(stats_file)
+        sys.exit(0)
+
+    if file_of_queries == None or file_of_output == None:
+        usage()
+        sys.exit(2)
+
+    if shards > 1:
+        n_built = read_shard_count(dictionary_file)
+        if n_built is None:
+            print("'{}' was not indexed with --shards".format(dictionary_file))
+            sys.exit(2)
+        if n_built != shards:
+            print("'{}' has {} shards, not {}".format(dictionary_file, n_built, shards))
+            sys.exit(2)
+        run_sharded_search(dictionary_file, postings_file, file_of_queries, file_of_output, shards)
     else:
-        assert False, "unhandled option"
+        run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+    if stats_file is not None:
+        stats.write(stats_file)
 
-if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None:
-    usage()
-    sys.exit(2)
 
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+import getopt
+import os
+import socket
+import sys
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -s socket-file -q file-of-queries -o output-file-of-results [-l]")
+    print("  sends the queries to a server started by search.py --serve, results are written as search.py writes them")
+    print("  -l: print the latency of every query and a summary")
+
+
+def run_client(socket_path: str, queries_file: str, results_file: str, show_latency: bool):
+    """
+    Sends every query to the server, one line per query, and writes the result lines to results_file.
+    """
+    latencies = []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        conn = sock.makefile("rwb")
+        with open(queries_file, "rt") as queries, open(results_file, "wt") as results:
+            for line in queries:
+                query = line.strip()
+                conn.write((query + "\n").encode("utf-8"))
+                conn.flush()
+                response = conn.readline().decode("utf-8")
+                if response == "":
+                    raise ConnectionError("server closed the connection")
+                latency, result = response.rstrip("\n").split("\t", 1)
+                latencies.append(float(latency))
+                if show_latency:
+                    print("{} ms\t{}".format(latency, query))
+                results.write(result + os.linesep)
+        conn.close()
+    if show_latency and len(latencies) != 0:
+        latencies.sort()
+        print("{} queries, mean {:.3f} ms, median {:.3f} ms, max {:.3f} ms".format(
+            len(latencies), sum(latencies) / len(latencies), latencies[len(latencies) // 2], latencies[-1]))
+
+
+socket_file = file_of_queries = file_of_output = None
+show_latency = False
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 's:q:o:l')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-s':
+        socket_file = a
+    elif o == '-q':
+        file_of_queries = a
+    elif o == '-o':
+        file_of_output = a
+    elif o == '-l':
+        show_latency = True
+    else:
+        assert False, "unhandled option"
+
+if socket_file == None or file_of_queries == None or file_of_output == None:
+    usage()
+    sys.exit(2)
+
+run_client(socket_file, file_of_queries, file_of_output, show_latency)
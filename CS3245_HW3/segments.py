@@ -0,0 +1,212 @@
+import fcntl
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from block import Block
+from ranked import get_tf_path
+
+SEGMENTS_FILE = "segments.txt"
+SEGMENT_IDS_FORMAT = "{no}.ids"
+SEGMENT_TMP_FORMAT = "tmp.{no}"
+MANIFEST_LOCK_FILE = "segments.lock"
+MERGE_LOCK_FILE = "merge.lock"
+MERGE_FACTOR = 4  # segments of a tier merged into one segment of the next tier
+TIER_DOCS = 100  # segments with fewer documents are all in tier 0, every tier is MERGE_FACTOR times larger
+RETIRE_SECONDS = 60  # files of a merged away segment outlive it this long, for searches that already read the manifest
+
+
+class Segment(Block):
+    """
+    An immutable index of some documents, added at once or merged from older segments. It is stored like a block,
+    in the segments directory, with the compact dictionary and postings of a final index and its doc ids.
+
+    Attributes:
+        n_docs: number of documents in the segment.
+        ids_name: file name of the doc ids of the segment.
+    """
+    def __init__(self, seg_no: int, n_docs: int, directory: str):
+        super().__init__(seg_no, directory)
+        self.n_docs = n_docs
+        self.ids_name = SEGMENT_IDS_FORMAT.format(no=seg_no)
+
+    def get_ids_path(self) -> str:
+        return os.path.join(self.directory, self.ids_name)
+
+    def get_tmp_dir(self) -> str:
+        return os.path.join(self.directory, SEGMENT_TMP_FORMAT.format(no=self.blk_no))
+
+    def get_tier(self) -> int:
+        tier = 0
+        size = TIER_DOCS
+        while self.n_docs >= size:
+            size *= MERGE_FACTOR
+            tier += 1
+        return tier
+
+    def remove_files(self):
+        for path in (self.get_dict_path(), self.get_postings_path(), get_tf_path(self.get_postings_path()),
+                     self.get_ids_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SegmentManifest:
+    """
+    The live segments of a segments directory, saved in its segments.txt. Segments are listed oldest first.
+    The manifest is replaced atomically, so a reader always sees a consistent set of segments, and writers
+    update it through update_manifest, one at a time.
+
+    Attributes:
+        directory: the segments directory.
+        next_no: number given to the next segment.
+        segments: the live segments.
+        retired: (segment, time it was merged away) of segments whose files are not removed yet.
+        pending: (segment, pid of the process indexing it) of segments being added. The doc ids file of a pending
+            segment is written when it is claimed, so a concurrent add never picks the same documents.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.next_no = 0
+        self.segments = []
+        self.retired = []
+        self.pending = []
+
+    def load(self) -> "SegmentManifest":
+        path = os.path.join(self.directory, SEGMENTS_FILE)
+        if not os.path.exists(path):
+            return self
+        with open(path, "rt") as f:
+            for line in f:
+                fields = line.split()
+                if fields[0] == "next":
+                    self.next_no = int(fields[1])
+                elif fields[0] == "segment":
+                    self.segments.append(Segment(int(fields[1]), int(fields[2]), self.directory))
+                elif fields[0] == "retired":
+                    self.retired.append((Segment(int(fields[1]), 0, self.directory), float(fields[2])))
+                elif fields[0] == "pending":
+                    self.pending.append((Segment(int(fields[1]), int(fields[2]), self.directory), int(fields[3])))
+        return self
+
+    def save(self):
+        path = os.path.join(self.directory, SEGMENTS_FILE)
+        with open(path + ".tmp", "wt") as f:
+            f.write("next {}\n".format(self.next_no))
+            for segment in self.segments:
+                f.write("segment {} {}\n".format(segment.blk_no, segment.n_docs))
+            for segment, retired_at in self.retired:
+                f.write("retired {} {}\n".format(segment.blk_no, retired_at))
+            for segment, pid in self.pending:
+                f.write("pending {} {} {}\n".format(segment.blk_no, segment.n_docs, pid))
+        os.replace(path + ".tmp", path)
+
+    def take_segment_no(self) -> int:
+        seg_no = self.next_no
+        self.next_no += 1
+        return seg_no
+
+    def claim(self, doc_ids: List[str]) -> Segment:
+        """
+        Starts a pending segment of doc_ids, writing its doc ids file now so they count as indexed.
+        """
+        segment = Segment(self.take_segment_no(), len(doc_ids), self.directory)
+        with open(segment.get_ids_path(), "wt") as f:
+            f.write(" ".join(doc_ids))
+        self.pending.append((segment, os.getpid()))
+        return segment
+
+    def publish(self, segment: Segment):
+        """
+        Turns a pending segment into a live one, searchable from the next read of the manifest.
+        """
+        self.pending = [(pending, pid) for pending, pid in self.pending if pending.blk_no != segment.blk_no]
+        self.segments.append(segment)
+
+    def remove_abandoned(self):
+        """
+        Drops the pending segments of processes that died before publishing them, and their files.
+        """
+        for segment, pid in self.pending:
+            if not is_running(pid):
+                segment.remove_files()
+                shutil.rmtree(segment.get_tmp_dir(), ignore_errors=True)
+        self.pending = [(segment, pid) for segment, pid in self.pending if is_running(pid)]
+
+    def retire(self, segments: List[Segment]):
+        """
+        Drops segments from the live ones. Their files are removed by remove_expired later.
+        """
+        seg_nos = {segment.blk_no for segment in segments}
+        self.segments = [segment for segment in self.segments if segment.blk_no not in seg_nos]
+        now = time.time()
+        self.retired.extend((segment, now) for segment in segments)
+
+    def remove_expired(self):
+        now = time.time()
+        for segment, retired_at in self.retired:
+            if now - retired_at >= RETIRE_SECONDS:
+                segment.remove_files()
+        self.retired = [(segment, retired_at) for segment, retired_at in self.retired
+                        if now - retired_at < RETIRE_SECONDS]
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, owned by another user
+        return True
+    return True
+
+
+def read_manifest(directory: str) -> SegmentManifest:
+    return SegmentManifest(directory).load()
+
+
+@contextmanager
+def update_manifest(directory: str) -> Iterator[SegmentManifest]:
+    """
+    Reads the manifest under an exclusive lock and saves it once the block exits without an error.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST_LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest(directory)
+        yield manifest
+        manifest.save()
+
+
+@contextmanager
+def merge_lock(directory: str) -> Iterator[bool]:
+    """
+    Yields whether this process is the only one merging the segments of directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MERGE_LOCK_FILE), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def pick_merge(segments: List[Segment]) -> Optional[List[Segment]]:
+    """
+    Tiered merge policy: returns the MERGE_FACTOR oldest segments of the lowest tier holding that many,
+    or None when no tier does. The live segments then never exceed MERGE_FACTOR - 1 per tier, and the number
+    of tiers grows with the log of the collection size.
+    """
+    tiers = {}
+    for segment in segments:
+        tiers.setdefault(segment.get_tier(), []).append(segment)
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= MERGE_FACTOR:
+            return tiers[tier][:MERGE_FACTOR]
+    return None
@@ -0,0 +1,51 @@
+import os
+from typing import List
+from typing import Optional
+
+SHARD_FILE_FORMAT = "{file}.{no}"
+SHARD_COUNT_FORMAT = "{file}.shards"
+
+
+def get_shard_path(file_name: str, shard_no: int) -> str:
+    """
+    Returns the path of the given shard's copy of an index file, e.g. dictionary.txt.0 for dictionary.txt.
+    """
+    return SHARD_FILE_FORMAT.format(file=file_name, no=shard_no)
+
+
+def get_shard_count_path(dict_file: str) -> str:
+    return SHARD_COUNT_FORMAT.format(file=dict_file)
+
+
+def write_shard_count(dict_file: str, n_shards: int):
+    """
+    Records the number of shards of an index next to its dictionary, once every shard is written.
+    """
+    with open(get_shard_count_path(dict_file), "wt") as f:
+        f.write(str(n_shards))
+
+
+def read_shard_count(dict_file: str) -> Optional[int]:
+    """
+    Returns the number of shards of an index, or None when it was not built with --shards.
+    """
+    if not os.path.exists(get_shard_count_path(dict_file)):
+        return None
+    with open(get_shard_count_path(dict_file), "rt") as f:
+        return int(f.read())
+
+
+def split_docs(file_list: List[str], n_shards: int) -> List[List[str]]:
+    """
+    Splits documents sorted by doc id into n_shards contiguous doc id ranges of nearly equal size,
+    so the sorted results of the shards, concatenated in shard order, are sorted too.
+    Every shard is returned even when there are fewer documents than shards, the last ones are then empty.
+    """
+    size, extra = divmod(len(file_list), n_shards)
+    ranges = []
+    start = 0
+    for shard_no in range(n_shards):
+        end = start + size + (1 if shard_no < extra else 0)
+        ranges.append(file_list[start:end])
+        start = end
+    return ranges
@@ -0,0 +1,143 @@
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from postinglist import BitmapPostingList
+
+SNAPSHOT_MAGIC = b"IDXSNAP1"
+_HEADER = struct.Struct("<8sQQQQ")  # magic, source stamps, doc count, bitmap bytes, stem count
+STAMP_TYPECODE = "q"
+OFFSET_TYPECODE = "Q"
+_ALIGN = array(OFFSET_TYPECODE).itemsize
+
+
+def source_stamps(sources: List[str]) -> List[int]:
+    """
+    Returns the size and modification time of every source file, -1 for one that does not exist.
+    """
+    stamps = []
+    for file_name in sources:
+        if os.path.exists(file_name):
+            stat = os.stat(file_name)
+            stamps.extend((stat.st_size, stat.st_mtime_ns))
+        else:
+            stamps.extend((-1, -1))
+    return stamps
+
+
+def _padded(n_bytes: int) -> int:
+    return -(-n_bytes // _ALIGN) * _ALIGN
+
+
+def write_snapshot(file_name: str, sources: List[str], all_doc_ids: BitmapPostingList, stems: Dict[str, str]):
+    """
+    Writes a snapshot of the state search.py loads at startup: all doc ids as their bitmap, and the stems
+    of tokens as two string tables sorted by token, each an array of offsets followed by the UTF-8 strings.
+    The size and modification time of the sources are recorded, so a snapshot of older files is never mapped.
+    """
+    bits = all_doc_ids.get_bits()
+    bitmap = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    pairs = sorted((token.encode("utf-8"), stemmed.encode("utf-8")) for token, stemmed in stems.items())
+    tables = []
+    for strings in ([token for token, _ in pairs], [stemmed for _, stemmed in pairs]):
+        offsets = array(OFFSET_TYPECODE, [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        tables.append((offsets, b"".join(strings)))
+    tmp_name = file_name + ".tmp"
+    stamps = array(STAMP_TYPECODE, source_stamps(sources))
+    with open(tmp_name, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(stamps), len(all_doc_ids), len(bitmap), len(pairs)))
+        f.write(stamps.tobytes())
+        f.write(bitmap.ljust(_padded(len(bitmap)), b"\0"))
+        for offsets, _ in tables:
+            f.write(offsets.tobytes())
+        for _, strings in tables:
+            f.write(strings)
+    os.replace(tmp_name, file_name)  # a reader never maps a half written snapshot
+
+
+class IndexSnapshot:
+    """
+    A snapshot written by write_snapshot, mapped into memory. Opening it reads only the header, the pages
+    of the bitmap and the string tables are read as they are touched, and stems are found by binary search.
+
+    Attributes:
+        stamps: size and modification time of every source when the snapshot was taken.
+        n_docs: number of doc ids.
+        n_stems: number of stemmed tokens.
+    """
+    def __init__(self, file_name: str):
+        with open(file_name, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError("not an index snapshot: " + file_name)
+        magic, n_stamps, self.n_docs, bitmap_size, self.n_stems = _HEADER.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not an index snapshot: " + file_name)
+        stamps = array(STAMP_TYPECODE)
+        stamps.frombytes(self._map[_HEADER.size:_HEADER.size + n_stamps * stamps.itemsize])
+        self.stamps = stamps.tolist()
+        self._bitmap_start = _HEADER.size + n_stamps * stamps.itemsize
+        offsets_start = self._bitmap_start + _padded(bitmap_size)
+        offsets_size = (self.n_stems + 1) * _ALIGN
+        self._bitmap_end = self._bitmap_start + bitmap_size
+        self._token_offsets = memoryview(self._map)[offsets_start:offsets_start + offsets_size].cast(OFFSET_TYPECODE)
+        self._stem_offsets = memoryview(self._map)[offsets_start + offsets_size:
+                                                   offsets_start + 2 * offsets_size].cast(OFFSET_TYPECODE)
+        self._tokens_start = offsets_start + 2 * offsets_size
+        self._stems_start = self._tokens_start + self._token_offsets[-1]
+
+    def is_current(self, sources: List[str]) -> bool:
+        return self.stamps == source_stamps(sources)
+
+    def get_all_doc_ids(self) -> BitmapPostingList:
+        bitmap = self._map[self._bitmap_start:self._bitmap_end]
+        return BitmapPostingList(int.from_bytes(bitmap, "little"), self.n_docs)
+
+    def get(self, token: str) -> Optional[str]:
+        """
+        Returns the stem of a token, or None when it was not in the stems the snapshot was taken with.
+        """
+        key = token.encode("utf-8")
+        offsets, start = self._token_offsets, self._tokens_start
+        lo, hi = 0, self.n_stems
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._map[start + offsets[mid]:start + offsets[mid + 1]]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                begin = self._stems_start + self._stem_offsets[mid]
+                return self._map[begin:self._stems_start + self._stem_offsets[mid + 1]].decode("utf-8")
+        return None
+
+    def __len__(self) -> int:
+        return self.n_stems
+
+    def close(self):
+        self._token_offsets.release()
+        self._stem_offsets.release()
+        self._map.close()
+
+
+def open_snapshot(file_name: str, sources: List[str]) -> Optional[IndexSnapshot]:
+    """
+    Maps a snapshot in, or returns None when it does not exist, is not a snapshot, or the sources changed since.
+    """
+    if not os.path.isfile(file_name):
+        return None
+    try:
+        snapshot = IndexSnapshot(file_name)
+    except ValueError:
+        return None
+    if not snapshot.is_current(sources):
+        snapshot.close()
+        return None
+    return snapshot
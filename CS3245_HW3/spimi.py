@@ -0,0 +1,96 @@
+import sys
+from array import array
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from postinglist import PostingList
+from postinglist import POSTING_TYPECODE
+
+DEFAULT_MEM_LIMIT = 64 * 1024 * 1024
+# estimated bytes a new term adds besides its string: its dict entry, list slots and an empty array
+TERM_OVERHEAD_BYTES = 160
+DOC_ID_BYTES = array(POSTING_TYPECODE).itemsize
+
+
+class SpimiBuffer:
+    """
+    Builds the postings of one block in memory, single-pass in-memory indexing style.
+    Terms are interned to integer ids in order of first appearance, and the doc ids of every term are
+    appended to its own array('I'), so no object is allocated per (term, doc id).
+    Documents must be added in ascending doc id order, which keeps every buffer sorted.
+
+    Attributes:
+        _term_ids: term id of every term.
+        _terms: term of every term id.
+        _postings: doc id buffer of every term id.
+        _tfs: term frequency buffer of every term id, parallel to its doc ids, when documents come with them.
+        _nbytes: estimated memory taken by the buffer.
+        n_docs: number of documents added since the buffer was last cleared.
+    """
+    def __init__(self):
+        self._term_ids = {}
+        self._terms = []
+        self._postings = []
+        self._tfs = []
+        self._nbytes = 0
+        self.n_docs = 0
+
+    def add_doc(self, doc_id: int, terms: Iterable[str], tfs: List[int] = None):
+        """
+        Appends doc_id to the buffers of terms, which must be unique, and the frequency of each term
+        in the document when tfs is given.
+        """
+        term_ids = self._term_ids
+        postings = self._postings
+        new_bytes = 0
+        count = 0
+        for term in terms:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(self._terms)
+                self._terms.append(term)
+                postings.append(array(POSTING_TYPECODE))
+                if tfs is not None:
+                    self._tfs.append(array(POSTING_TYPECODE))
+                new_bytes += sys.getsizeof(term) + TERM_OVERHEAD_BYTES
+            postings[term_id].append(doc_id)
+            count += 1
+        if tfs is not None:
+            buffers = self._tfs
+            for term, tf in zip(terms, tfs):
+                buffers[term_ids[term]].append(tf)
+            count *= 2
+        self._nbytes += new_bytes + count * DOC_ID_BYTES
+        self.n_docs += 1
+
+    def estimate_bytes(self) -> int:
+        return self._nbytes
+
+    def sorted_postings(self) -> Iterator[Tuple[str, PostingList]]:
+        """
+        Yields (term, posting) in term order.
+        """
+        terms = self._terms
+        for term_id in sorted(range(len(terms)), key=terms.__getitem__):
+            yield terms[term_id], PostingList(self._postings[term_id])
+
+    def sorted_tfs(self) -> Iterator[array]:
+        """
+        Yields the term frequencies of every posting of sorted_postings, in the same order.
+        """
+        terms = self._terms
+        for term_id in sorted(range(len(terms)), key=terms.__getitem__):
+            yield self._tfs[term_id]
+
+    def clear(self):
+        self._term_ids = {}
+        self._terms = []
+        self._postings = []
+        self._tfs = []
+        self._nbytes = 0
+        self.n_docs = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
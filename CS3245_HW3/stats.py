@@ -0,0 +1,119 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+DEFAULT_LOG_LEVEL = "warning"
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+class Stats:
+    """
+    Counters and stage timers of a run, written as JSON with --stats. While disabled, the default,
+    counting and timing do nothing, and hot loops check enabled once per call before adding their local counts.
+
+    Attributes:
+        enabled: whether anything is recorded.
+        counters: count by name, e.g. bytes written or postings fetched.
+        timers: (total seconds, calls) by stage name.
+        latencies: milliseconds of every query answered, in order.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.timers = {}
+        self.latencies = []
+
+    def add(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        total, n = self.timers.get(name, (0.0, 0))
+        self.timers[name] = (total + seconds, n + calls)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Adds the wall time of the block to the stage name.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_latency(self, seconds: float):
+        if self.enabled:
+            self.latencies.append(seconds * 1000)
+
+    def take_delta(self) -> Tuple[Dict[str, int], Dict[str, Tuple[float, int]]]:
+        """
+        Returns the counters and timers recorded since the last call, and resets them,
+        so worker processes can hand them back like StemCache.take_delta.
+        """
+        delta = (self.counters, self.timers)
+        self.counters = {}
+        self.timers = {}
+        return delta
+
+    def merge_delta(self, delta: Tuple[Dict[str, int], Dict[str, Tuple[float, int]]]):
+        counters, timers = delta
+        for name, n in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        for name, (seconds, calls) in timers.items():
+            self.add_time(name, seconds, calls)
+
+    def to_dict(self) -> dict:
+        result = {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {name: {"seconds": seconds, "calls": calls}
+                       for name, (seconds, calls) in sorted(self.timers.items())},
+        }
+        if len(self.latencies) != 0:
+            result["queries"] = latency_summary(self.latencies)
+            result["query_ms"] = self.latencies
+        return result
+
+    def write(self, file_name: str):
+        with open(file_name, "wt") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Returns the nearest rank p-th percentile of sorted values.
+    """
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    """
+    Returns the count, mean, nearest rank percentiles and maximum of latencies in milliseconds.
+    """
+    ordered = sorted(latencies)
+    summary = {"count": len(ordered), "mean_ms": sum(ordered) / len(ordered)}
+    for p in LATENCY_PERCENTILES:
+        summary["p{}_ms".format(p)] = percentile(ordered, p)
+    summary["max_ms"] = ordered[-1]
+    return summary
+
+
+def set_log_level(level: str):
+    """
+    Sets the level of the loggers of every module, debug messages below it are never formatted.
+    """
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger().setLevel(level.upper())
+
+
+stats = Stats()  # the stats of this process
@@ -0,0 +1,124 @@
+import os
+import pickle
+from collections import OrderedDict
+from typing import Tuple
+
+DEFAULT_CACHE_SIZE = 200000
+STEMS_FILE_FORMAT = "{dict_file}.stems"
+
+
+def get_stems_path(dict_file: str) -> str:
+    """
+    Returns the path of the stems file kept next to a dictionary file.
+    """
+    return STEMS_FILE_FORMAT.format(dict_file=dict_file)
+
+
+class StemCache:
+    """
+    Memoizes Porter stems of tokens. The corpus vocabulary is small next to its token count,
+    so most tokens are stemmed only once. At most max_size tokens are kept, least recently used first out.
+    The stemmer, and nltk with it, is only imported on the first token no one has stemmed yet.
+
+    Attributes:
+        hits: lookups answered from the cache or its backing stems.
+        misses: lookups that ran the stemmer.
+        track_delta: whether new entries are kept for take_delta, set in worker processes only, since
+            nothing else ever takes them and they would grow past max_size.
+        _backing: stems looked up before running the stemmer, e.g. those of a mapped index snapshot.
+        _new: entries stemmed since the last take_delta, so worker processes can hand them back.
+    """
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.track_delta = False
+        self._stemmer = None
+        self._backing = None
+        self._cache = OrderedDict()
+        self._new = {}
+
+    def stem(self, token: str) -> str:
+        cache = self._cache
+        stemmed = cache.get(token)
+        if stemmed is not None:
+            self.hits += 1
+            cache.move_to_end(token)
+            return stemmed
+        if self._backing is not None:
+            stemmed = self._backing.get(token)
+            if stemmed is not None:
+                self.hits += 1
+                self._put(token, stemmed)
+                return stemmed
+        self.misses += 1
+        if self._stemmer is None:
+            from nltk.stem.porter import PorterStemmer
+            self._stemmer = PorterStemmer()
+        stemmed = self._stemmer.stem(token)
+        self._put(token, stemmed)
+        if self.track_delta:
+            self._new[token] = stemmed
+        return stemmed
+
+    def _put(self, token: str, stemmed: str):
+        self._cache[token] = stemmed
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def take_delta(self) -> Tuple[dict, int, int]:
+        """
+        Returns the entries, hits and misses since the last call, and resets them.
+        """
+        delta = (self._new, self.hits, self.misses)
+        self._new = {}
+        self.hits = self.misses = 0
+        return delta
+
+    def merge_delta(self, delta: Tuple[dict, int, int]):
+        """
+        Adds the entries and counters taken from another cache, e.g. one in a worker process.
+        """
+        entries, hits, misses = delta
+        for token, stemmed in entries.items():
+            self._put(token, stemmed)
+        self.hits += hits
+        self.misses += misses
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups != 0 else 0.0
+
+    def stats_str(self) -> str:
+        return "stem cache: {} entries, {} hits, {} misses, hit rate {:.2%}".format(
+            len(self), self.hits, self.misses, self.hit_rate())
+
+    def attach(self, backing):
+        """
+        Looks tokens the cache misses up in backing, anything with a get(token) method, before stemming them.
+        """
+        self._backing = backing
+
+    def entries(self) -> dict:
+        return dict(self._cache)
+
+    def save(self, file_name: str):
+        with open(file_name, "wb") as f:
+            pickle.dump(self.entries(), f)
+
+    def load(self, file_name: str) -> bool:
+        """
+        Warms the cache from a saved stems file, returns whether the file exists.
+        """
+        if not os.path.isfile(file_name):
+            return False
+        with open(file_name, "rb") as f:
+            for token, stemmed in pickle.load(f).items():
+                self._put(token, stemmed)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._cache
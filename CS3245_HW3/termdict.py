@@ -1,3 +1,21 @@
+from array import array
+import mmap
+import os
+import pickle
+import struct
+from typing import Iterator
+from typing import Tuple
+
+from postingsfile import decode_vbyte_prefix
+from postingsfile import encode_vbyte
+
+COMPACT_DICT_MAGIC = b"TDC1"
+# magic, number of terms, terms per front coded block, number of blocks, postings format, padding
+COMPACT_DICT_HEADER = struct.Struct("=4sIIIB15x")
+FRONT_CODING_BLOCK = 16
+POSTINGS_FORMATS = ["text", "binary"]
+
+
 class TermItem:
     """
     Represents a token in the dictionary, containing term, doc frequency and pointer to the posting.
@@ -5,12 +23,14 @@ class TermItem:
     Attributes:
         _term: the word term itself.
         _doc_freq:  document frequency.
-        _pointer: line number of the posting in the postings file.
+        _pointer: line number (text format) or byte offset (binary format) of the posting in the postings file.
+        _length: length of the posting in bytes.
     """
-    def __init__(self, term: str, doc_freq: int = 1, pointer: int = -1):
+    def __init__(self, term: str, doc_freq: int = 1, pointer: int = -1, length: int = 0):
         self._term = term
         self._doc_freq = doc_freq
         self._pointer = pointer
+        self._length = length
 
     def get_term(self) -> str:
         return self._term
@@ -21,6 +41,10 @@ class TermItem:
     def get_pointer(self) -> int:
         return self._pointer
 
+    def get_length(self) -> int:
+        # items pickled before lengths were recorded only point into text postings, which ignore the length
+        return getattr(self, "_length", 0)
+
     def set_doc_freq(self, freq: int):
         self._doc_freq = freq
 
@@ -30,6 +54,9 @@ class TermItem:
     def set_pointer(self, pointer: int):
         self._pointer = pointer
 
+    def set_length(self, length: int):
+        self._length = length
+
     def __str__(self):
         return "({}, {}, {})".format(self._term, self._doc_freq, self._pointer)
 
@@ -37,9 +64,17 @@ class TermItem:
 class TermDict:
     """
     Represents a dictionary containing terms and their corresponding doc_freq and pointer to the posting.
+
+    Attributes:
+        postings_format: format of the postings file the pointers refer to, "text" or "binary".
     """
-    def __init__(self):
+    def __init__(self, postings_format: str = "text"):
         self.dict = {}
+        self.postings_format = postings_format
+
+    def get_postings_format(self) -> str:
+        # dictionaries pickled before the binary format existed only point into text postings
+        return getattr(self, "postings_format", "text")
 
     def add_term(self, term: str):
         if term not in self.dict.keys():
@@ -51,6 +86,11 @@ class TermDict:
             raise RuntimeError
         return self.dict[term].get_pointer()
 
+    def get_term_length(self, term: str) -> int:
+        if term not in self:
+            raise RuntimeError
+        return self.dict[term].get_length()
+
     def get_term_freq(self, term: str) -> int:
         if term not in self:
             return -1
@@ -66,6 +106,11 @@ class TermDict:
             raise KeyError
         self.dict[term].set_pointer(pointer)
 
+    def set_term_length(self, term: str, length: int):
+        if term not in self:
+            raise KeyError
+        self.dict[term].set_length(length)
+
     def __len__(self) -> int:
         return len(self.dict)
 
@@ -74,3 +119,198 @@ class TermDict:
 
     def __iter__(self):
         return iter(self.dict)
+
+    def iter_entries(self) -> Iterator[Tuple[str, int, int, int]]:
+        """
+        Yields the (term, doc_freq, pointer, length) of every term in term order.
+        """
+        for term in sorted(self.dict):
+            item = self.dict[term]
+            yield term, item.get_doc_freq(), item.get_pointer(), item.get_length()
+
+
+class CompactDictWriter:
+    """
+    Writes a compact dictionary file from terms added in sorted order.
+
+    Layout after the header: pointers ('Q'), offsets of front coded blocks in the string block ('I'),
+    doc frequencies ('I') and posting lengths ('I') as parallel arrays indexed by term number, then the string block.
+    Every FRONT_CODING_BLOCK terms form a block: the first term is stored whole, as its byte length and bytes,
+    and every other term as the length of the prefix it shares with the previous term, the length of the rest
+    and the rest.
+    """
+    def __init__(self, file_name: str, postings_format: str):
+        self.file_name = file_name
+        self.postings_format = postings_format
+        self._pointers = array("Q")
+        self._block_offsets = array("I")
+        self._doc_freqs = array("I")
+        self._lengths = array("I")
+        self._strings = bytearray()
+        self._last = None
+
+    def add(self, term: str, doc_freq: int, pointer: int, length: int):
+        encoded = term.encode("utf-8")
+        if self._last is not None and encoded <= self._last:
+            raise ValueError("terms must be added in sorted order")
+        if len(self._pointers) % FRONT_CODING_BLOCK == 0:
+            self._block_offsets.append(len(self._strings))
+            encode_vbyte(len(encoded), self._strings)
+            self._strings += encoded
+        else:
+            prefix = os.path.commonprefix([self._last, encoded])
+            encode_vbyte(len(prefix), self._strings)
+            encode_vbyte(len(encoded) - len(prefix), self._strings)
+            self._strings += encoded[len(prefix):]
+        self._last = encoded
+        self._pointers.append(pointer)
+        self._doc_freqs.append(doc_freq)
+        self._lengths.append(length)
+
+    def close(self):
+        with open(self.file_name, "wb") as f:
+            f.write(COMPACT_DICT_HEADER.pack(COMPACT_DICT_MAGIC, len(self._pointers), FRONT_CODING_BLOCK,
+                                             len(self._block_offsets),
+                                             POSTINGS_FORMATS.index(self.postings_format)))
+            for arr in (self._pointers, self._block_offsets, self._doc_freqs, self._lengths):
+                arr.tofile(f)
+            f.write(self._strings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+
+def write_compact_dict(term_dict: TermDict, file_name: str):
+    """
+    Writes a TermDict as a compact dictionary file.
+    """
+    with CompactDictWriter(file_name, term_dict.get_postings_format()) as writer:
+        for term in sorted(term_dict):
+            writer.add(term, term_dict.get_term_freq(term), term_dict.get_term_pointer(term),
+                       term_dict.get_term_length(term))
+
+
+class CompactTermDict:
+    """
+    A read-only view of a compact dictionary file, with the lookup methods of TermDict.
+    The file is memory mapped and the parallel arrays are used in place, so opening it takes constant time
+    whatever the vocabulary size. A term is found by binary search over the first terms of the front coded blocks,
+    then a scan of at most FRONT_CODING_BLOCK terms.
+    """
+    def __init__(self, file_name: str):
+        self._file = open(file_name, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        magic, n_terms, self._block_k, n_blocks, postings_format = COMPACT_DICT_HEADER.unpack_from(buf)
+        if magic != COMPACT_DICT_MAGIC:
+            raise ValueError(file_name + " is not a compact dictionary")
+        self.postings_format = POSTINGS_FORMATS[postings_format]
+        self._n_terms = n_terms
+        pos = COMPACT_DICT_HEADER.size
+        self._pointers = buf[pos:pos + 8 * n_terms].cast("Q")
+        pos += 8 * n_terms
+        self._block_offsets = buf[pos:pos + 4 * n_blocks].cast("I")
+        pos += 4 * n_blocks
+        self._doc_freqs = buf[pos:pos + 4 * n_terms].cast("I")
+        pos += 4 * n_terms
+        self._lengths = buf[pos:pos + 4 * n_terms].cast("I")
+        pos += 4 * n_terms
+        self._strings = buf[pos:]
+        self._last_lookup = (None, -1)
+
+    def _first_term(self, blk_no: int) -> bytes:
+        (length,), pos = decode_vbyte_prefix(self._strings, 1, self._block_offsets[blk_no])
+        return bytes(self._strings[pos:pos + length])
+
+    def _iter_block(self, blk_no: int) -> Iterator[bytes]:
+        strings = self._strings
+        (length,), pos = decode_vbyte_prefix(strings, 1, self._block_offsets[blk_no])
+        term = bytes(strings[pos:pos + length])
+        pos += length
+        yield term
+        for _ in range(min(self._block_k, self._n_terms - blk_no * self._block_k) - 1):
+            (prefix, length), pos = decode_vbyte_prefix(strings, 2, pos)
+            term = term[:prefix] + bytes(strings[pos:pos + length])
+            pos += length
+            yield term
+
+    def _lookup(self, term: str) -> int:
+        """
+        Returns the term number of term, or -1 if it is not in the dictionary.
+        """
+        last_term, last_index = self._last_lookup  # read once, prefetch threads look terms up too
+        if last_term == term:
+            return last_index
+        encoded = term.encode("utf-8")
+        lo, hi = 0, len(self._block_offsets)
+        while lo < hi:  # find the last block whose first term is <= term
+            mid = (lo + hi) // 2
+            if self._first_term(mid) <= encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        index = -1
+        if lo != 0:
+            for i, candidate in enumerate(self._iter_block(lo - 1)):
+                if candidate >= encoded:
+                    if candidate == encoded:
+                        index = (lo - 1) * self._block_k + i
+                    break
+        self._last_lookup = (term, index)
+        return index
+
+    def get_postings_format(self) -> str:
+        return self.postings_format
+
+    def get_term_pointer(self, term: str) -> int:
+        index = self._lookup(term)
+        if index == -1:
+            raise RuntimeError
+        return self._pointers[index]
+
+    def get_term_length(self, term: str) -> int:
+        index = self._lookup(term)
+        if index == -1:
+            raise RuntimeError
+        return self._lengths[index]
+
+    def get_term_freq(self, term: str) -> int:
+        index = self._lookup(term)
+        if index == -1:
+            return -1
+        return self._doc_freqs[index]
+
+    def __len__(self) -> int:
+        return self._n_terms
+
+    def __contains__(self, term: str) -> bool:
+        return self._lookup(term) != -1
+
+    def __iter__(self):
+        for blk_no in range(len(self._block_offsets)):
+            for term in self._iter_block(blk_no):
+                yield term.decode("utf-8")
+
+    def iter_entries(self) -> Iterator[Tuple[str, int, int, int]]:
+        """
+        Yields the (term, doc_freq, pointer, length) of every term in term order, straight from the mapped file,
+        so only the current entry is held in memory.
+        """
+        for index, term in enumerate(self):
+            yield term, self._doc_freqs[index], self._pointers[index], self._lengths[index]
+
+
+def load_dictionary(file_name: str):
+    """
+    Loads a dictionary file, either a compact dictionary or a pickled TermDict written by older versions.
+    """
+    with open(file_name, "rb") as f:
+        magic = f.read(len(COMPACT_DICT_MAGIC))
+    if magic == COMPACT_DICT_MAGIC:
+        return CompactTermDict(file_name)
+    with open(file_name, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from bench_corpus import generate_corpus
+from bench_suite import compare
+from bench_workload import generate_queries
+from bench_workload import WORKLOADS
+from query import parse
+
+
+def read_corpus(directory: str) -> dict:
+    docs = {}
+    for file_name in os.listdir(directory):
+        with open(os.path.join(directory, file_name), "rt") as f:
+            docs[file_name] = f.read()
+    return docs
+
+
+def test_corpus():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        first, second, other = (os.path.join(tmp_dir, name) for name in ("first", "second", "other"))
+        doc_ids = generate_corpus(first, 50, seed=7, vocab_size=500)
+        assert doc_ids == sorted(set(doc_ids)) and len(doc_ids) == 50
+        assert sorted(map(int, os.listdir(first))) == doc_ids
+        generate_corpus(second, 50, seed=7, vocab_size=500)
+        assert read_corpus(first) == read_corpus(second)
+        generate_corpus(other, 50, seed=8, vocab_size=500)
+        assert read_corpus(first) != read_corpus(other)
+
+
+def test_workloads():
+    terms = ["t{}".format(i) for i in range(300)]
+    for workload in WORKLOADS:
+        queries = generate_queries(workload, terms, 50, seed=3)
+        assert queries == generate_queries(workload, terms, 50, seed=3)
+        for query in queries:
+            parse(query.replace("(", "( ").replace(")", " )").split())  # never a syntax error
+
+
+def test_compare():
+    baseline = {"metrics": {"a_ms": 100.0, "b_ms": 0.2, "c_ms": 10.0, "gone_ms": 1.0}}
+    results = {"metrics": {"a_ms": 130.0, "b_ms": 0.5, "c_ms": 9.0, "new_ms": 1.0}}
+    rows = compare(results, baseline, 0.2, 1.0)
+    assert [(name, regressed) for name, _, _, regressed in rows] == [("a_ms", True), ("b_ms", False),
+                                                                     ("c_ms", False)]
+
+
+if __name__ == "__main__":
+    test_corpus()
+    test_workloads()
+    test_compare()
@@ -0,0 +1,86 @@
+import io
+import random
+
+from daat import build_cursor
+from daat import iter_docs
+from daat import write_docs
+from postinglist import Cursor
+from postinglist import EXHAUSTED
+from postinglist import PostingList
+from postingsfile import encode_postings
+from postingsfile import SkipPostingList
+from query import parse
+from query import plan
+
+QUERIES = [
+    "a AND b", "a OR b OR c", "NOT a", "a AND NOT b", "NOT a AND NOT b", "(a OR b) AND NOT (c AND d)",
+    "NOT (a OR b) OR c", "a AND b AND c AND d", "NOT NOT a OR NOT e", "(a AND NOT b) OR (c AND NOT d)",
+]
+
+
+def brute(node, postings: dict, all_ids: set) -> set:
+    """
+    Evaluates a query tree with Python sets.
+    """
+    name = type(node).__name__
+    if name == "Term":
+        return set(postings.get(node.term, []))
+    if name == "Not":
+        return all_ids - brute(node.child, postings, all_ids)
+    if name == "Or":
+        return set().union(*(brute(child, postings, all_ids) for child in node.children))
+    result = set.intersection(*(brute(child, postings, all_ids) for child in node.children))
+    for child in node.negated:
+        result -= brute(child, postings, all_ids)
+    return result
+
+
+def test():
+    rng = random.Random(17)
+    for _ in range(30):
+        all_ids = sorted(rng.sample(range(5000), 600))
+        postings = {term: sorted(rng.sample(all_ids, rng.choice([0, 3, 40, 300]))) for term in "abcde"}
+        encoded = {term: SkipPostingList(encode_postings(PostingList(ids))) for term, ids in postings.items()}
+        for query in QUERIES:
+            node = plan(parse(query.replace("(", "( ").replace(")", " )").split()),
+                        lambda term: len(postings[term]), len(all_ids))
+            expected = sorted(brute(node, postings, set(all_ids)))
+            for lists in (encoded, {term: PostingList(ids) for term, ids in postings.items()}):
+                cursor = build_cursor(node, lists.get, lambda: PostingList(all_ids))
+                assert list(iter_docs(cursor)) == expected, query
+                assert cursor.doc == EXHAUSTED
+
+
+def test_advance_to():
+    node = plan(parse("a OR b".split()), lambda term: 3, 0)
+    lists = {"a": PostingList([1, 5, 9]), "b": PostingList([2, 5, 12])}
+    cursor = build_cursor(node, lists.get, PostingList)
+    assert cursor.doc == 1
+    assert cursor.advance_to(6) == 9
+    assert cursor.advance_to(3) == 9  # never moves back
+    assert cursor.next() == 12 and cursor.next() == EXHAUSTED
+
+
+def test_abstract():
+    class NextOnly(Cursor):
+        def next(self) -> int:
+            return EXHAUSTED
+
+    try:
+        NextOnly()
+        assert False, "built without advance_to"
+    except TypeError:
+        pass
+
+
+def test_write_docs():
+    out = io.StringIO()
+    write_docs(PostingList(range(10000)).cursor(), out)
+    assert out.getvalue() == " ".join(map(str, range(10000)))
+
+
+if __name__ == "__main__":
+    test()
+    test_advance_to()
+    test_abstract()
+    test_write_docs()
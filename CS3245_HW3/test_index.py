@@ -1,6 +1,8 @@
 import linecache
-import pickle
 from termdict import TermDict
+from termdict import load_dictionary
+from postingsfile import read_posting
+from postingsfile import POSTINGS_FORMAT_TEXT
 
 dictionary = TermDict()
 
@@ -12,9 +14,8 @@ def test(dictionary_name: str, posting_name: str):
     """
     print("Testing...")
     try:
-        with open(dictionary_name, "rb") as f:
-            global dictionary
-            dictionary = pickle.load(f)
+        global dictionary
+        dictionary = load_dictionary(dictionary_name)
     except FileNotFoundError:
         print("Cannot load dictionary file.")
         return
@@ -30,6 +31,19 @@ def test(dictionary_name: str, posting_name: str):
     print("Doc Frequency test passed.")
 
 
+def check_binary_postings(postings_name) -> bool:
+    """
+    Tests that every binary posting decodes from its pointer and length to doc_freq doc ids.
+    """
+    global dictionary
+    for term in dictionary:
+        posting = read_posting(postings_name, dictionary.get_postings_format(),
+                               dictionary.get_term_pointer(term), dictionary.get_term_length(term))
+        if len(posting) != dictionary.get_term_freq(term):
+            return False
+    return True
+
+
 def test_posting_order(posting_name) -> bool:
     """
     Tests correctness of the order (alphabetical order) of postings.
@@ -46,7 +60,9 @@ def test_pointer(postings_name) -> bool:
     Tests correctness of pointer.
     """
     global dictionary
-    for term in dictionary.dict.keys():
+    if dictionary.get_postings_format() != POSTINGS_FORMAT_TEXT:
+        return check_binary_postings(postings_name)
+    for term in dictionary:
         pointer = dictionary.get_term_pointer(term)
         freq = dictionary.get_term_freq(term)
         line = linecache.getline(postings_name, pointer)
@@ -65,7 +81,9 @@ def test_freq(postings_name) -> bool:
     Tests correctness of document freq.
     """
     global dictionary
-    for term in dictionary.dict.keys():
+    if dictionary.get_postings_format() != POSTINGS_FORMAT_TEXT:
+        return check_binary_postings(postings_name)
+    for term in dictionary:
         pointer = dictionary.get_term_pointer(term)
         freq = dictionary.get_term_freq(term)
         line = linecache.getline(postings_name, pointer)
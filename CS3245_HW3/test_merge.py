@@ -0,0 +1,105 @@
+import contextlib
+import multiprocessing
+import os
+import tempfile
+
+import index
+from bench_corpus import generate_corpus
+from ranked import get_tf_path
+from shards import get_shard_path
+from tokenizer import TOKENIZER_FAST
+
+SINGLE_BLOCK = 1 << 40  # a memory limit no test corpus reaches
+TINY_MEM_LIMIT = 4000
+N_SHARDS = 3
+
+
+@contextlib.contextmanager
+def index_options(argv: list, out_dir: str, context=None):
+    """
+    Sets the options of index.py from argv, with its tmp directory and all doc ids in out_dir and its worker
+    processes started by context when given, and restores the previous options after.
+    """
+    names = ["TMP_DIR", "ALL_DOC_IDS_FILE", "postings_format", "mem_limit", "jobs", "tokenizer", "shards", "ranked",
+             "options_argv", "mp_context"]
+    saved = [getattr(index, name) for name in names]
+    os.makedirs(out_dir)
+    index.TMP_DIR, index.ALL_DOC_IDS_FILE = os.path.join(out_dir, "tmp"), os.path.join(out_dir, "all-ids.txt")
+    index.parse_options(argv)
+    index.mp_context = context or index.mp_context
+    try:
+        yield
+    finally:
+        for name, value in zip(names, saved):
+            setattr(index, name, value)
+
+
+def read_files(files: list) -> list:
+    contents = []
+    for file_name in files:
+        with open(file_name, "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+def build(corpus_dir: str, out_dir: str, mem_limit: int, jobs: int, ranked: bool, context=None) -> list:
+    """
+    Indexes the corpus into out_dir, with the worker processes of -j started by context when given,
+    and returns the number of blocks merged and the bytes of every index file.
+    """
+    argv = ["--mem-limit", str(mem_limit), "-j", str(jobs), "--tokenizer", TOKENIZER_FAST]
+    out_dict, out_postings = os.path.join(out_dir, "dictionary.txt"), os.path.join(out_dir, "postings.txt")
+    with index_options(argv + (["--ranked"] if ranked else []), out_dir, context):
+        blocks = index.create_blocks(corpus_dir, index.list_docs(corpus_dir), index.ALL_DOC_IDS_FILE)
+        index.merge_blocks(blocks, out_dict, out_postings)
+        index.clean_up()
+    return [len(blocks)] + read_files([out_dict, out_postings] + ([get_tf_path(out_postings)] if ranked else []))
+
+
+def build_sharded(corpus_dir: str, out_dir: str, context=None) -> list:
+    """
+    Indexes the corpus into N_SHARDS shards of text postings in out_dir, with the shard worker processes
+    started by context when given, and returns the bytes of every index file of every shard.
+    """
+    argv = ["-t", "--mem-limit", str(TINY_MEM_LIMIT), "-j", "2", "--shards", str(N_SHARDS), "--tokenizer",
+            TOKENIZER_FAST, "--ranked"]
+    out_dict, out_postings = os.path.join(out_dir, "dictionary.txt"), os.path.join(out_dir, "postings.txt")
+    with index_options(argv, out_dir, context):
+        index.build_shards(corpus_dir, index.list_docs(corpus_dir), out_dict, out_postings)
+        files = []
+        for shard_no in range(N_SHARDS):
+            shard_postings = get_shard_path(out_postings, shard_no)
+            files += [get_shard_path(out_dict, shard_no), shard_postings, get_tf_path(shard_postings),
+                      get_shard_path(index.ALL_DOC_IDS_FILE, shard_no)]
+    return read_files(files)
+
+
+def test_merge():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = os.path.join(tmp_dir, "corpus")
+        generate_corpus(corpus_dir, 80, seed=5, vocab_size=400)
+        for ranked in (False, True):
+            name = "ranked" if ranked else "boolean"
+            n_blocks, *single = build(corpus_dir, os.path.join(tmp_dir, name + "-single"), SINGLE_BLOCK, 1, ranked)
+            assert n_blocks == 1
+            n_blocks, *merged = build(corpus_dir, os.path.join(tmp_dir, name + "-merged"), TINY_MEM_LIMIT, 1, ranked)
+            assert n_blocks > 5 and merged == single
+            n_blocks, *parallel = build(corpus_dir, os.path.join(tmp_dir, name + "-j2"), TINY_MEM_LIMIT, 2, ranked)
+            assert n_blocks > 5 and parallel == single
+            spawned = build(corpus_dir, os.path.join(tmp_dir, name + "-spawn"), TINY_MEM_LIMIT, 2, ranked,
+                            multiprocessing.get_context("spawn"))
+            assert spawned[1:] == single  # the workers parsed the options again, nothing came through a fork
+
+
+def test_shards():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = os.path.join(tmp_dir, "corpus")
+        generate_corpus(corpus_dir, 60, seed=6, vocab_size=300)
+        forked = build_sharded(corpus_dir, os.path.join(tmp_dir, "default"))
+        assert all(forked) and forked[1].decode("ascii").strip()[0].isdigit()  # -t reached the workers
+        assert build_sharded(corpus_dir, os.path.join(tmp_dir, "spawn"), multiprocessing.get_context("spawn")) == forked
+
+
+if __name__ == "__main__":
+    test_merge()
+    test_shards()
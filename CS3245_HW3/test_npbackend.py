@@ -0,0 +1,44 @@
+import random
+
+import npbackend
+import postinglist
+from postinglist import PostingList
+from postingsfile import encode_postings
+from postingsfile import SkipPostingList
+
+SIZES = [0, 1, 7, 8, 60, 500, 4000]
+
+
+def random_list(rng: random.Random, size: int, max_doc_id: int) -> PostingList:
+    return PostingList(sorted(rng.sample(range(max_doc_id), min(size, max_doc_id))))
+
+
+def test():
+    if not npbackend.is_available():
+        return
+    rng = random.Random(3245)
+    for size1 in SIZES:
+        for size2 in SIZES:
+            list1 = random_list(rng, size1, 8000)
+            list2 = random_list(rng, size2, 8000)
+            for name in ("union", "intersect", "difference", "complement"):
+                expected = getattr(postinglist, name)(list1, list2)
+                result = getattr(npbackend, name)(list1, list2)
+                assert result == expected, (name, size1, size2)
+                assert result.get_ids().typecode == postinglist.POSTING_TYPECODE
+
+
+def test_encoded():
+    if not npbackend.is_available():
+        return
+    rng = random.Random(0)
+    short = random_list(rng, 20, 20000)
+    long = random_list(rng, 5000, 20000)
+    encoded = SkipPostingList(encode_postings(long))
+    assert npbackend.intersect(short, encoded) == postinglist.intersect(short, long)
+    assert encoded.get_blocks_decoded() <= len(short)  # skewed, so only blocks that may hold an id were decoded
+
+
+if __name__ == "__main__":
+    test()
+    test_encoded()
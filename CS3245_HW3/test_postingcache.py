@@ -0,0 +1,50 @@
+from postinglist import BitmapPostingList
+from postinglist import PostingList
+from postingcache import PostingCache
+from postingcache import CACHE_POLICY_COST
+
+
+def test_lru():
+    cache = PostingCache(budget=100)
+    cache.put("a", PostingList(range(10)))  # 40 bytes
+    cache.put("b", PostingList(range(10)))
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("c", PostingList(range(10)))
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.get("b") is None
+    assert cache.hits == 1 and cache.misses == 1 and cache.evictions == 1
+    assert cache.get_used_bytes() == 80
+    cache.put("huge", PostingList(range(100)))  # larger than the budget, never cached
+    assert "huge" not in cache and len(cache) == 2
+
+
+def test_cost():
+    cache = PostingCache(budget=90, policy=CACHE_POLICY_COST)
+    cache.put("long", PostingList(range(15)))  # 60 bytes
+    cache.put("short", PostingList(range(5)))
+    cache.get("long")
+    cache.get("short")
+    cache.put("other", PostingList(range(5)))  # "short" has the smallest doc_freq * (hits + 1)
+    assert "long" in cache and "other" in cache and "short" not in cache
+
+
+def test_decoded_budget():
+    doc_ids = list(range(0, 4000, 3))
+    cache = PostingCache(budget=BitmapPostingList.from_ids(doc_ids).nbytes() * 2)
+    for term in ("a", "b", "c"):
+        cache.put(term, BitmapPostingList.from_ids(doc_ids))
+        used = cache.get_used_bytes()
+        posting = cache.get(term)
+        posting.get_ids()  # decoding a cached posting must not take more than it was charged
+        assert 6 in posting and 5 not in posting
+        assert cache.get_used_bytes() == used
+    decoded = sum(posting.nbytes() for posting in map(cache.get, ("b", "c")))
+    assert "a" not in cache and cache.get_used_bytes() == decoded <= cache.budget
+    assert decoded >= 2 * (len(doc_ids) * 4 + 2 * (4000 // 8))
+
+
+if __name__ == "__main__":
+    test_lru()
+    test_cost()
+    test_decoded_budget()
+    print("Posting cache tests passed.")
@@ -0,0 +1,102 @@
+import random
+
+from postinglist import BitmapPostingList
+from postinglist import PostingList
+from postinglist import union
+from postinglist import intersect
+from postinglist import difference
+from postinglist import complement
+from postinglist import intersect_all
+from postinglist import union_all
+from sortedskiplist import SortedSkipList
+from sortedskiplist import union as skip_union
+from sortedskiplist import intersect as skip_intersect
+from sortedskiplist import complement as skip_complement
+
+
+def to_skip_list(ids) -> SortedSkipList:
+    res = SortedSkipList()
+    for i in ids:
+        res.add_val(i)
+    res.build_skip()
+    return res
+
+
+def test():
+    l1 = PostingList()
+    l2 = PostingList()
+    for i in [0, 5, 7, 1, 2, 9, 11, 6]:
+        l1.add_val(i)
+    for i in [11, 13, 15, 14, 12, 6, 6]:
+        l2.add_val(i)
+
+    assert str(l1) == "0 1 2 5 6 7 9 11"
+    assert str(l2) == "6 11 12 13 14 15"
+    assert str(intersect(l1, l2)) == "6 11"
+    assert str(union(l1, l2)) == "0 1 2 5 6 7 9 11 12 13 14 15"
+    assert str(difference(l1, l2)) == "0 1 2 5 7 9"
+    assert 7 in l1 and 8 not in l1
+
+    l3 = PostingList(range(10))
+    l4 = PostingList(range(0, 10, 2))
+    assert str(complement(l4, l3)) == "1 3 5 7 9"
+    assert len(intersect(l3, PostingList())) == 0
+
+
+def test_skip_to_str():
+    for n in [1, 2, 3, 4, 10, 17, 100]:
+        ids = list(range(n))
+        assert PostingList(ids).skip_to_str() == to_skip_list(ids).skip_to_str()
+
+
+def test_same_as_skip_list():
+    rng = random.Random(3245)
+    for _ in range(50):
+        a = rng.sample(range(2000), rng.randint(0, 300))
+        b = rng.sample(range(2000), rng.randint(0, 1500))
+        pa, pb = PostingList.from_unsorted(a), PostingList.from_unsorted(b)
+        sa, sb = to_skip_list(a), to_skip_list(b)
+        assert str(intersect(pa, pb)) == str(skip_intersect(sa, sb))
+        assert str(union(pa, pb)) == str(skip_union(sa, sb))
+        everything = PostingList.from_unsorted(a + b)
+        assert str(complement(pa, everything)) == str(skip_complement(sa, to_skip_list(a + b)))
+
+
+def test_n_ary():
+    rng = random.Random(16)
+    for _ in range(100):
+        lists = [PostingList.from_unsorted(rng.sample(range(500), rng.randint(0, 200)))
+                 for _ in range(rng.randint(1, 30))]
+        expected_union = PostingList()
+        expected_intersect = lists[0]
+        for posting in lists:
+            expected_union = union(expected_union, posting)
+            expected_intersect = intersect(expected_intersect, posting)
+        assert union_all(lists) == expected_union
+        assert intersect_all(lists) == expected_intersect
+    assert union_all([]) == PostingList() and intersect_all([]) == PostingList()
+
+
+def test_bitmap():
+    rng = random.Random(21)
+    for _ in range(100):
+        a, b = (sorted(rng.sample(range(3000), rng.randint(0, 2000))) for _ in range(2))
+        pa, pb = PostingList(a), PostingList(b)
+        ba, bb = BitmapPostingList.from_ids(a), BitmapPostingList.from_ids(b)
+        assert ba == pa and len(ba) == len(a) and (a[0] in ba if a else 5 not in ba)
+        for x, y in [(ba, bb), (ba, pb), (pa, bb)]:  # every mix of representations
+            assert union(x, y) == union(pa, pb)
+            assert intersect(x, y) == intersect(pa, pb)
+            assert difference(x, y) == difference(pa, pb)
+            assert union_all([x, y, pa]) == union_all([pa, pb])
+            assert intersect_all([x, y, pa]) == intersect(pa, pb)
+        assert isinstance(intersect(ba, bb), BitmapPostingList)
+
+
+if __name__ == "__main__":
+    test()
+    test_skip_to_str()
+    test_same_as_skip_list()
+    test_n_ary()
+    test_bitmap()
+    print("PostingList tests passed.")
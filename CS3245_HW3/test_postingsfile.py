@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+from postinglist import BitmapPostingList
+from postinglist import PostingList
+from postinglist import intersect
+from postingsfile import decode_postings
+from postingsfile import decode_vbyte
+from postingsfile import encode_bitmap
+from postingsfile import encode_postings
+from postingsfile import encode_vbyte
+from postingsfile import open_posting
+from postingsfile import PostingsReader
+from postingsfile import PostingsWriter
+from postingsfile import read_posting
+from postingsfile import SkipPostingList
+from postingsfile import POSTINGS_FORMAT_BINARY
+from postingsfile import POSTINGS_FORMAT_TEXT
+
+
+def test_vbyte():
+    out = bytearray()
+    numbers = [0, 1, 127, 128, 824, 16383, 16384, 2 ** 32 - 1]
+    for n in numbers:
+        encode_vbyte(n, out)
+    assert decode_vbyte(out) == numbers
+    out = bytearray()
+    encode_vbyte(824, out)
+    assert bytes(out) == bytes([0b00000110, 0b10111000])  # the textbook example
+
+    posting = PostingList([3, 7, 130, 20000, 20001])
+    assert decode_postings(encode_postings(posting)) == posting
+    posting = PostingList(range(5, 30000, 3))
+    assert decode_postings(encode_postings(posting)) == posting
+
+
+def test_skip_intersect():
+    long_posting = PostingList(range(0, 20000, 2))
+    short_posting = PostingList([1, 4, 9000, 9002, 19998, 25000])
+    encoded = SkipPostingList(encode_postings(long_posting))
+    assert len(encoded) == len(long_posting)
+    assert str(intersect(short_posting, encoded)) == "4 9000 9002 19998"
+    assert encoded.get_blocks_decoded() == 3  # out of 100 blocks
+    assert str(intersect(encoded, short_posting)) == "4 9000 9002 19998"
+    assert encoded == long_posting
+
+
+def test_bitmap():
+    # a bitmap container, an array container and a container of a single doc id
+    posting = PostingList(list(range(3, 60000, 3)) + list(range(70000, 90000, 50)) + [200000])
+    decoded = open_posting(encode_bitmap(posting.get_ids()))
+    assert isinstance(decoded, BitmapPostingList) and decoded == posting
+    assert decode_postings(encode_bitmap(posting.get_ids())) == posting
+    assert isinstance(open_posting(encode_postings(posting)), SkipPostingList)
+
+
+def test_writer():
+    postings = {"a": PostingList([1, 2, 3]), "b": PostingList([5]), "c": PostingList(range(0, 1000, 7)),
+                "d": PostingList(range(0, 5000, 2))}
+    for postings_format in [POSTINGS_FORMAT_TEXT, POSTINGS_FORMAT_BINARY]:
+        fd, file_name = tempfile.mkstemp()
+        os.close(fd)
+        pointers = {}
+        with PostingsWriter(file_name, postings_format) as writer:
+            for term, posting in postings.items():
+                pointers[term] = writer.write(term, posting)
+        with PostingsReader(file_name, postings_format) as reader:
+            for term, posting in postings.items():
+                pointer, length = pointers[term]
+                assert read_posting(file_name, postings_format, pointer, length) == posting
+                assert reader.read(pointer, length) == posting
+            if postings_format == POSTINGS_FORMAT_BINARY:
+                assert isinstance(reader.read(*pointers["d"]), BitmapPostingList)  # dense
+            kept = reader.read(*pointers["c"])
+        assert kept == postings["c"]  # postings outlive the reader
+        os.remove(file_name)
+
+
+if __name__ == "__main__":
+    test_vbyte()
+    test_skip_intersect()
+    test_bitmap()
+    test_writer()
+    print("Postings file tests passed.")
@@ -0,0 +1,55 @@
+from query import parse
+from query import plan
+from query import And
+from query import Not
+from query import QuerySyntaxError
+from query import tokenize
+
+DOC_FREQ = {"a": 50, "b": 5, "c": 500, "d": 1}
+
+
+def doc_freq(term: str) -> int:
+    return DOC_FREQ.get(term, -1)
+
+
+def test_parse():
+    assert str(parse("a OR b AND c".split())) == "(a OR (b AND c))"
+    assert str(parse("NOT a AND b".split())) == "(NOT a AND b)"
+    assert str(parse("( a OR b ) AND ( c OR ( d AND a ) )".split())) == "((a OR b) AND (c OR (d AND a)))"
+    assert str(parse("a b".split())) == "(a AND b)"
+    for bad in ["", "a AND", "( a OR b", "a )", "AND a", "NOT"]:
+        try:
+            parse(bad.split())
+            assert False, bad
+        except QuerySyntaxError:
+            pass
+
+
+def test_plan():
+    node = plan(parse("a AND ( c AND b ) AND d".split()), doc_freq, 1000)
+    assert str(node) == "(d AND b AND a AND c)"
+    assert node.estimate == 1
+
+    node = plan(parse("c AND NOT a AND b".split()), doc_freq, 1000)
+    assert isinstance(node, And)
+    assert str(node) == "(b AND c AND NOT a)"
+
+    node = plan(parse("NOT a AND NOT b".split()), doc_freq, 1000)
+    assert isinstance(node, Not)
+    assert str(node) == "NOT (b OR a)"
+    assert str(plan(parse("NOT NOT a".split()), doc_freq, 1000)) == "a"
+    assert plan(parse("zzz AND a".split()), doc_freq, 1000).children[0].estimate == 0
+
+
+def test_tokenize():
+    assert tokenize("(Oil AND price.) OR NOT \"crude\"") == ["(", "oil", "AND", "price", ")", "OR", "NOT", "crude"]
+    assert tokenize("a AND(b OR c)") == ["a", "AND", "(", "b", "OR", "c", ")"]
+    assert tokenize("and , AND") == ["and", "AND"]
+    assert str(parse(tokenize("((a OR b)) c"))) == "((a OR b) AND c)"
+
+
+if __name__ == "__main__":
+    test_parse()
+    test_plan()
+    test_tokenize()
+    print("Query tests passed.")
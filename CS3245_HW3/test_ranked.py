@@ -0,0 +1,86 @@
+import os
+import random
+import tempfile
+from array import array
+
+from postinglist import POSTING_TYPECODE
+from postinglist import PostingList
+from ranked import doc_norm
+from ranked import max_doc_weight
+from ranked import merge_tfs
+from ranked import ScoreStats
+from ranked import TermScorer
+from ranked import TfReader
+from ranked import TfWriter
+from ranked import top_k_exhaustive
+from ranked import top_k_maxscore
+
+
+def random_index(rng: random.Random) -> tuple:
+    """
+    Returns random postings with term frequencies over 300 documents, and the norms of the documents.
+    """
+    doc_tfs = {}
+    postings = []
+    for _ in range(6):
+        ids = sorted(rng.sample(range(1000, 1300), rng.choice([1, 5, 40, 150, 290])))
+        tfs = array(POSTING_TYPECODE, (rng.choice([1, 1, 1, 2, 3, 10]) for _ in ids))
+        for doc_id, tf in zip(ids, tfs):
+            doc_tfs.setdefault(doc_id, []).append(tf)
+        postings.append((array(POSTING_TYPECODE, ids), tfs))
+    norms = {doc_id: doc_norm(tfs) for doc_id, tfs in doc_tfs.items()}
+    return postings, norms
+
+
+def scorers(postings: list, weights: list, norms: dict) -> list:
+    return [TermScorer(ids, tfs, weight, max_doc_weight(ids, tfs, norms))
+            for (ids, tfs), weight in zip(postings, weights)]
+
+
+def test_maxscore():
+    rng = random.Random(11)
+    for _ in range(50):
+        postings, norms = random_index(rng)
+        n_terms = rng.randint(1, len(postings))
+        weights = [rng.choice([0.1, 0.5, 1.0, 2.3]) for _ in range(n_terms)]
+        for k in (1, 3, 10, 100, 1000):
+            expected = top_k_exhaustive(scorers(postings, weights, norms), k, norms)
+            stats = ScoreStats()
+            assert top_k_maxscore(scorers(postings, weights, norms), k, norms, stats) == expected, k
+            assert stats.scored <= stats.postings == sum(len(ids) for ids, _ in postings[:n_terms])
+
+
+def test_ties():
+    ids = array(POSTING_TYPECODE, [3, 5, 8])
+    tfs = array(POSTING_TYPECODE, [1, 1, 1])
+    norms = {3: 1.0, 5: 1.0, 8: 1.0}
+    assert top_k_maxscore(scorers([(ids, tfs)], [1.0], norms), 2, norms) == [3, 5]
+    assert top_k_maxscore([], 2, norms) == []
+
+
+def test_tf_file():
+    rng = random.Random(3)
+    postings, norms = random_index(rng)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "postings.txt.tf")
+        with TfWriter(path, norms) as writer:
+            for pointer, (ids, tfs) in enumerate(postings):
+                writer.write(pointer * 7, tfs, max_doc_weight(ids, tfs, norms))
+        with TfReader(path) as reader:
+            assert reader.norms == norms and reader.get_n_docs() == len(norms)
+            for pointer, (ids, tfs) in enumerate(postings):
+                assert reader.read_tfs(pointer * 7) == tfs
+                assert reader.get_max_weight(pointer * 7) == max_doc_weight(ids, tfs, norms)
+
+
+def test_merge_tfs():
+    parts = [(PostingList([1, 4, 9]), array(POSTING_TYPECODE, [2, 1, 5])),
+             (PostingList([2, 3, 12]), array(POSTING_TYPECODE, [7, 1, 1]))]
+    assert list(merge_tfs(parts)) == [2, 7, 1, 1, 5, 1]
+
+
+if __name__ == "__main__":
+    test_maxscore()
+    test_ties()
+    test_tf_file()
+    test_merge_tfs()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_corpus import generate_corpus
+from bench_workload import generate_queries
+from bench_workload import terms_by_freq
+from bench_workload import WORKLOADS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INDEX_PY, SEARCH_PY, CLIENT_PY = (os.path.join(HERE, name) for name in ("index.py", "search.py", "search_client.py"))
+INDEX_ARGS = ["-d", "dictionary.txt", "-p", "postings.txt"]
+SHARDED_ARGS = ["-d", "sharded.txt", "-p", "sharded-postings.txt", "--shards", "3"]
+N_SEGMENTS = 3
+SOCKET_TIMEOUT = 30  # seconds a server may take to load the index and listen
+
+
+def run(work_dir: str, command: list, **kwargs) -> str:
+    return subprocess.run([sys.executable] + command, cwd=work_dir, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True, **kwargs).stdout
+
+
+def batch_results(work_dir: str, search_args: list, index_args: list = INDEX_ARGS) -> list:
+    run(work_dir, [SEARCH_PY] + index_args + ["-q", "queries.txt", "-o", "results.txt"] + search_args)
+    with open(os.path.join(work_dir, "results.txt"), "rt") as f:
+        return f.read().splitlines()
+
+
+def add_segments(work_dir: str, corpus_dir: str, doc_ids: list):
+    """
+    Indexes the corpus into N_SEGMENTS segments with interleaved doc ids, each added from its own copy of
+    every N_SEGMENTS-th document.
+    """
+    for part_no in range(N_SEGMENTS):
+        part_dir = os.path.join(work_dir, "part{}".format(part_no))
+        os.makedirs(part_dir)
+        for doc_id in doc_ids[part_no::N_SEGMENTS]:
+            shutil.copy(os.path.join(corpus_dir, str(doc_id)), part_dir)
+        run(work_dir, [INDEX_PY, "-i", part_dir, "--segments", "segments", "--tokenizer", "fast"])
+
+
+def served_results(work_dir: str, queries: list, search_args: list) -> list:
+    """
+    Answers the queries with search.py --serve over stdin and stdout, and returns the results without latencies.
+    """
+    output = run(work_dir, [SEARCH_PY] + INDEX_ARGS + ["--serve"] + search_args, input="".join(
+        query + "\n" for query in queries))
+    responses = output.splitlines()
+    assert all(float(response.split("\t", 1)[0]) >= 0 for response in responses)
+    return [response.split("\t", 1)[1] for response in responses]
+
+
+def socket_results(work_dir: str, search_args: list) -> list:
+    """
+    Answers the queries with search_client.py, through a search.py --serve --socket server stopped after.
+    """
+    socket_path = os.path.join(work_dir, "search.sock")
+    server = subprocess.Popen([sys.executable, SEARCH_PY] + INDEX_ARGS + ["--serve", "--socket", socket_path]
+                              + search_args, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + SOCKET_TIMEOUT
+        while not os.path.exists(socket_path):
+            assert server.poll() is None and time.monotonic() < deadline
+            time.sleep(0.05)
+        run(work_dir, [CLIENT_PY, "-s", socket_path, "-q", "queries.txt", "-o", "client-results.txt"])
+    finally:
+        server.send_signal(signal.SIGTERM)
+    assert server.wait() == 0 and not os.path.exists(socket_path)
+    with open(os.path.join(work_dir, "client-results.txt"), "rt") as f:
+        return f.read().splitlines()
+
+
+def test_modes():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = os.path.join(tmp_dir, "corpus")
+        doc_ids = generate_corpus(corpus_dir, 60, seed=4, vocab_size=300)
+        run(tmp_dir, [INDEX_PY, "-i", corpus_dir] + INDEX_ARGS + ["--tokenizer", "fast", "--ranked"])
+        run(tmp_dir, [INDEX_PY, "-i", corpus_dir] + SHARDED_ARGS + ["--tokenizer", "fast", "-j", "2"])
+        add_segments(tmp_dir, corpus_dir, doc_ids)
+        terms = terms_by_freq(os.path.join(tmp_dir, "dictionary.txt"))
+        queries = [query for workload in WORKLOADS for query in generate_queries(workload, terms, 4, seed=4)]
+        with open(os.path.join(tmp_dir, "queries.txt"), "wt") as f:
+            f.write("".join(query + "\n" for query in queries))
+        for search_args in ([], ["--ranked", "5"]):
+            expected = batch_results(tmp_dir, search_args)
+            assert len(expected) == len(queries) and any(expected)
+            assert batch_results(tmp_dir, search_args + ["--prefetch", "2"]) == expected
+            assert served_results(tmp_dir, queries, search_args) == expected
+            assert socket_results(tmp_dir, search_args) == expected
+            if not search_args:  # shards and segments are searched without --ranked
+                assert batch_results(tmp_dir, [], SHARDED_ARGS) == expected
+                assert batch_results(tmp_dir, [], ["--segments", "segments"]) == expected
+
+
+if __name__ == "__main__":
+    test_modes()
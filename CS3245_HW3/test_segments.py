@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import segments
+from bench_corpus import generate_corpus
+from ranked import get_tf_path
+from segments import MERGE_FACTOR
+from segments import pick_merge
+from segments import read_manifest
+from segments import Segment
+from segments import TIER_DOCS
+from segments import update_manifest
+
+
+def test_pick_merge():
+    small = [Segment(no, 10, "") for no in range(MERGE_FACTOR - 1)]
+    assert pick_merge(small) is None
+    large = [Segment(no, TIER_DOCS, "") for no in range(10, 10 + MERGE_FACTOR)]
+    assert pick_merge(small + large) == large  # the only full tier
+    extra = Segment(99, 10, "")
+    assert pick_merge(large + small + [extra]) == small + [extra]  # the lowest full tier, oldest first
+    assert Segment(0, TIER_DOCS * MERGE_FACTOR, "").get_tier() == 2
+
+
+def test_manifest():
+    with tempfile.TemporaryDirectory() as directory:
+        with update_manifest(directory) as manifest:
+            for _ in range(3):
+                manifest.segments.append(Segment(manifest.take_segment_no(), 5, directory))
+        with update_manifest(directory) as manifest:
+            retired = manifest.segments[:2]
+            for segment in retired:
+                open(segment.get_ids_path(), "wt").close()
+                open(get_tf_path(segment.get_postings_path()), "wb").close()
+            manifest.retire(retired)
+        manifest = read_manifest(directory)
+        assert manifest.next_no == 3
+        assert [segment.blk_no for segment in manifest.segments] == [2]
+        assert [segment.blk_no for segment, _ in manifest.retired] == [0, 1]
+
+        saved = segments.RETIRE_SECONDS
+        segments.RETIRE_SECONDS = 0
+        try:
+            manifest.remove_expired()
+        finally:
+            segments.RETIRE_SECONDS = saved
+        assert manifest.retired == [] and not os.path.exists(retired[0].get_ids_path())
+        assert not os.path.exists(get_tf_path(retired[0].get_postings_path()))
+
+
+def test_claim():
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    with tempfile.TemporaryDirectory() as directory:
+        with update_manifest(directory) as manifest:
+            live = manifest.claim(["1", "2"])
+            abandoned = manifest.claim(["3"])
+        with update_manifest(directory) as manifest:
+            assert [(segment.blk_no, pid) for segment, pid in manifest.pending] == [(0, os.getpid()), (1, os.getpid())]
+            manifest.publish(live)
+            manifest.pending = [(segment, finished.pid) for segment, _ in manifest.pending]
+        manifest = read_manifest(directory)
+        assert [segment.blk_no for segment in manifest.segments] == [0] and len(manifest.pending) == 1
+        manifest.remove_abandoned()  # its process died before publishing it
+        assert manifest.pending == [] and not os.path.exists(abandoned.get_ids_path())
+
+
+def test_concurrent_adds():
+    index_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir, seg_dir = os.path.join(tmp_dir, "corpus"), os.path.join(tmp_dir, "segments")
+        doc_ids = generate_corpus(corpus_dir, 40, seed=2, vocab_size=200)
+        command = [sys.executable, index_py, "-i", corpus_dir, "--segments", seg_dir, "--tokenizer", "fast"]
+        adds = [subprocess.Popen(command, cwd=tmp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for _ in range(2)]
+        assert all(add.wait() == 0 for add in adds)
+        indexed = []
+        for segment in read_manifest(seg_dir).segments:
+            with open(segment.get_ids_path(), "rt") as f:
+                indexed.extend(map(int, f.read().split()))
+        assert sorted(indexed) == doc_ids  # every document in exactly one segment
+
+
+if __name__ == "__main__":
+    test_pick_merge()
+    test_manifest()
+    test_claim()
+    test_concurrent_adds()
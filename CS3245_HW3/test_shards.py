@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+from shards import get_shard_path
+from shards import read_shard_count
+from shards import split_docs
+from shards import write_shard_count
+
+
+def test_split_docs():
+    docs = [str(doc_id) for doc_id in range(1, 11)]
+    ranges = split_docs(docs, 3)
+    assert [len(r) for r in ranges] == [4, 3, 3]
+    assert sum(ranges, []) == docs  # contiguous and in doc id order
+    assert split_docs(docs[:2], 3) == [["1"], ["2"], []]
+
+
+def test_shard_path():
+    assert get_shard_path("dictionary.txt", 2) == "dictionary.txt.2"
+
+
+def test_shard_count():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dict_file = os.path.join(tmp_dir, "dictionary.txt")
+        assert read_shard_count(dict_file) is None
+        write_shard_count(dict_file, 3)
+        assert read_shard_count(dict_file) == 3
+
+
+if __name__ == "__main__":
+    test_split_docs()
+    test_shard_path()
+    test_shard_count()
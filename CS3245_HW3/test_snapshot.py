@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from postinglist import BitmapPostingList
+from snapshot import open_snapshot
+from snapshot import write_snapshot
+
+STEMS = {"running": "run", "companies": "compani", "prices": "price", "naïve": "naïv", "a": "a"}
+
+
+def test_snapshot():
+    doc_ids = [1, 5, 64, 65, 1000]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "dictionary.txt")
+        with open(source, "wt") as f:
+            f.write("terms")
+        sources = [source, os.path.join(tmp_dir, "missing.txt")]
+        file_name = os.path.join(tmp_dir, "snapshot.bin")
+        assert open_snapshot(file_name, sources) is None
+        write_snapshot(file_name, sources, BitmapPostingList.from_ids(doc_ids), STEMS)
+        snapshot = open_snapshot(file_name, sources)
+        assert len(snapshot) == len(STEMS) and snapshot.n_docs == len(doc_ids)
+        for token, stemmed in STEMS.items():
+            assert snapshot.get(token) == stemmed
+        for token in ["", "b", "run", "zzz"]:
+            assert snapshot.get(token) is None
+        all_doc_ids = snapshot.get_all_doc_ids()
+        assert list(all_doc_ids.get_ids()) == doc_ids and len(all_doc_ids) == len(doc_ids)
+        snapshot.close()
+        with open(source, "at") as f:
+            f.write(" changed")
+        assert open_snapshot(file_name, sources) is None  # taken before the source changed
+
+
+def test_empty():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "snapshot.bin")
+        write_snapshot(file_name, [], BitmapPostingList(), {})
+        snapshot = open_snapshot(file_name, [])
+        assert snapshot.get("a") is None and len(snapshot.get_all_doc_ids()) == 0
+        snapshot.close()
+        with open(file_name, "wb") as f:
+            f.write(b"not a snapshot")
+        assert open_snapshot(file_name, []) is None
+
+
+if __name__ == "__main__":
+    test_snapshot()
+    test_empty()
@@ -0,0 +1,27 @@
+from postinglist import PostingList
+from spimi import SpimiBuffer
+
+
+def test():
+    buffer = SpimiBuffer()
+    buffer.add_doc(1, ["oil", "price"])
+    buffer.add_doc(4, ["bank", "oil"])
+    buffer.add_doc(9, ["oil"])
+    assert len(buffer) == 3 and buffer.n_docs == 3
+    assert list(buffer.sorted_postings()) == [("bank", PostingList([4])), ("oil", PostingList([1, 4, 9])),
+                                              ("price", PostingList([1]))]
+
+
+def test_estimate():
+    buffer = SpimiBuffer()
+    buffer.add_doc(1, ["oil"])
+    first = buffer.estimate_bytes()
+    buffer.add_doc(2, ["oil"])
+    assert buffer.estimate_bytes() == first + 4  # a known term only costs its doc id
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.n_docs == 0 and buffer.estimate_bytes() == 0
+
+
+if __name__ == "__main__":
+    test()
+    test_estimate()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+
+from postinglist import intersect
+from postinglist import PostingList
+from postingsfile import encode_postings
+from postingsfile import SkipPostingList
+from stats import latency_summary
+from stats import Stats
+from stats import stats
+
+
+def test_disabled():
+    run = Stats()
+    run.add("a", 3)
+    run.add_latency(0.5)
+    with run.timer("stage"):
+        pass
+    assert run.counters == {} and run.timers == {} and run.latencies == []
+
+
+def test_delta():
+    run = Stats()
+    run.enabled = True
+    run.add("a", 3)
+    with run.timer("stage"):
+        pass
+    worker = Stats()
+    worker.enabled = True
+    worker.add("a")
+    worker.add("b", 2)
+    worker.add_time("stage", 1.0, 2)
+    run.merge_delta(worker.take_delta())
+    assert worker.counters == {} and worker.timers == {}
+    assert run.counters == {"a": 4, "b": 2}
+    assert run.timers["stage"][1] == 3 and run.timers["stage"][0] >= 1.0
+
+
+def test_write():
+    run = Stats()
+    run.enabled = True
+    for ms in range(1, 101):
+        run.add_latency(ms / 1000)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "stats.json")
+        run.write(path)
+        with open(path, "rt") as f:
+            written = json.load(f)
+    assert len(written["query_ms"]) == 100
+    assert written["queries"]["count"] == 100 and written["queries"]["max_ms"] == 100.0
+    assert latency_summary([3.0, 1.0, 2.0])["p50_ms"] == 2.0
+
+
+def test_intersect_counters():
+    long_ids = list(range(0, 20000, 2))
+    short_ids = [4, 5, 6, 1000, 19998]
+    stats.enabled = True
+    try:
+        for long in (PostingList(long_ids), SkipPostingList(encode_postings(PostingList(long_ids)))):
+            stats.take_delta()
+            assert intersect(PostingList(short_ids), long) == PostingList([4, 6, 1000, 19998])
+            counters = stats.counters
+            assert 0 < counters["intersect.skips"] <= len(short_ids)
+            assert 0 < counters["intersect.steps"] <= len(short_ids)
+    finally:
+        stats.enabled = False
+        stats.take_delta()
+
+
+if __name__ == "__main__":
+    test_disabled()
+    test_delta()
+    test_write()
+    test_intersect_counters()
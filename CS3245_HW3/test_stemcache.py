@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from stemcache import StemCache
+
+
+def test():
+    cache = StemCache(max_size=2)
+    assert cache.stem("running") == "run"
+    assert cache.stem("running") == "run"
+    assert cache.hits == 1 and cache.misses == 1
+    cache.stem("prices")
+    cache.stem("running")  # "running" is now the most recently used
+    cache.stem("traded")
+    assert "running" in cache and "traded" in cache and "prices" not in cache
+    assert len(cache) == 2
+
+
+def test_delta():
+    worker = StemCache()
+    worker.track_delta = True
+    worker.stem("markets")
+    worker.stem("markets")
+    parent = StemCache()
+    parent.merge_delta(worker.take_delta())
+    assert "markets" in parent
+    assert parent.hits == 1 and parent.misses == 1
+    assert worker.take_delta() == ({}, 0, 0)
+
+
+def test_bounded():
+    cache = StemCache(max_size=100)
+    for i in range(1000):
+        cache.stem("token{}s".format(i))
+    assert len(cache) == 100 and cache.misses == 1000
+    assert cache.take_delta()[0] == {}  # nothing kept for a delta outside a worker
+    cache.track_delta = True
+    cache.stem("markets")
+    assert cache.take_delta()[0] == {"markets": "market"}
+
+
+def test_save_load():
+    cache = StemCache()
+    cache.stem("companies")
+    fd, file_name = tempfile.mkstemp()
+    os.close(fd)
+    cache.save(file_name)
+    warm = StemCache()
+    assert warm.load(file_name)
+    assert warm.stem("companies") == "compani"
+    assert warm.hits == 1 and warm.misses == 0
+    os.remove(file_name)
+    assert not warm.load(file_name)
+
+
+def test_attach():
+    cache = StemCache()
+    cache.attach({"companies": "compani"})
+    assert cache.stem("companies") == "compani"
+    assert cache._stemmer is None  # answered without loading the stemmer
+    assert cache.stem("companies") == "compani" and "companies" in cache
+    assert cache.stem("running") == "run"
+    assert cache.hits == 2 and cache.misses == 1
+
+
+if __name__ == "__main__":
+    test()
+    test_delta()
+    test_bounded()
+    test_save_load()
+    test_attach()
+    print("Stem cache tests passed.")
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+from termdict import CompactTermDict
+from termdict import TermDict
+from termdict import load_dictionary
+from termdict import write_compact_dict
+
+
+def test_compact():
+    term_dict = TermDict("binary")
+    terms = ["aaa", "aab", "abc", "b", "bank", "banker", "bankrupt", "café", "zzz"] + \
+            ["t{:03d}".format(i) for i in range(100)]
+    for i, term in enumerate(terms):
+        term_dict.add_term(term)
+        term_dict.set_term_freq(term, i + 1)
+        term_dict.set_term_pointer(term, i * 1000)
+        term_dict.set_term_length(term, i * 7)
+    fd, file_name = tempfile.mkstemp()
+    os.close(fd)
+    write_compact_dict(term_dict, file_name)
+
+    compact = load_dictionary(file_name)
+    assert isinstance(compact, CompactTermDict)
+    assert compact.get_postings_format() == "binary"
+    assert len(compact) == len(terms)
+    assert list(compact) == sorted(terms)
+    for term in terms:
+        assert term in compact
+        assert compact.get_term_freq(term) == term_dict.get_term_freq(term)
+        assert compact.get_term_pointer(term) == term_dict.get_term_pointer(term)
+        assert compact.get_term_length(term) == term_dict.get_term_length(term)
+    for missing in ["", "a", "aac", "bankr", "t100", "zzzz", "ÿ"]:
+        assert missing not in compact
+        assert compact.get_term_freq(missing) == -1
+    os.remove(file_name)
+
+
+if __name__ == "__main__":
+    test_compact()
+    print("Compact dictionary tests passed.")
@@ -0,0 +1,46 @@
+from nltk.tokenize import word_tokenize
+
+from tokenizer import fast_tokens
+from tokenizer import get_tokenizer
+from tokenizer import STRIP_CHARS
+from tokenizer import TOKENIZER_FAST
+
+SENTENCES = [
+    "The company's shares rose 3.5% to $12.50, (up 1,000) in U.S. trading.",
+    "He said: \"we cannot, won't and shouldn't do it\" -- really... ok?!",
+    "AT&T's net; 10:30 a.m. oil-price vs. crude/fuel gonna wanna go",
+    "Prices of ``grain'' fell*; they'd, we'll, I'm, you've and we're told it's the banks'.",
+    "It is the company's.",
+    "Revenue fell to 5,000 dlrs from 4,5 and a:b c,d e,,5 x''y",
+    "Shares “rose” — sharply — in Q1 ‘98.",
+    "'hello' said 'x and d'ye more'n gimme lemme gotta wanna, cannot",
+]
+
+
+def nltk_sentence_tokens(sentence: str) -> set:
+    """
+    The tokens nltk_tokens gives for a single sentence, without the sentence tokenizer.
+    """
+    tokens = set()
+    for word in word_tokenize(sentence, preserve_line=True):
+        word = word.strip(STRIP_CHARS)
+        if word != "":
+            tokens.add(word.lower())
+    return tokens
+
+
+def test():
+    for sentence in SENTENCES:
+        assert fast_tokens(sentence) == nltk_sentence_tokens(sentence), sentence
+
+
+def test_sentences():
+    # a split off sentence final period is stripped anyway
+    assert fast_tokens("Oil rose.\nThe dollar's fall. It fell.") == {"oil", "rose", "the", "dollar", "s", "fall",
+                                                                     "it", "fell"}
+    assert get_tokenizer(TOKENIZER_FAST) is fast_tokens
+
+
+if __name__ == "__main__":
+    test()
+    test_sentences()
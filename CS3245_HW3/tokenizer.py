@@ -0,0 +1,96 @@
+import re
+import string
+from typing import Callable
+from typing import List
+
+TOKENIZER_NLTK = "nltk"
+TOKENIZER_FAST = "fast"
+TOKENIZERS = (TOKENIZER_NLTK, TOKENIZER_FAST)
+STRIP_CHARS = string.punctuation + "\n" + " "
+
+# Characters word_tokenize always splits off. ASCII punctuation would be stripped from the token anyway,
+# so it becomes a space, the other characters stay as tokens of their own.
+_SPLIT_PUNCTUATION = ";@#$%&?!*()[]{}<>\"`"
+_SPLIT_SYMBOLS = "«“‘„»”’‒–—―"
+_SPLIT_TABLE = str.maketrans({**{c: " " for c in _SPLIT_PUNCTUATION}, **{c: " " + c + " " for c in _SPLIT_SYMBOLS}})
+# commas and colons not followed by a digit, ellipses, double dashes, '' quotes and opening single quotes
+_SPLIT_RE = re.compile(r"[:,](?!\d)|\.{2,}|--|''|(?<!\w)'(?!(?i:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+# clitics at the end of a token, or before a sentence final period
+_CLITIC_RE = re.compile(r"(?<=[^'\s])('[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T)(?=\s|\.?$|\.\s)")
+_CONTRACTION_RE = re.compile(
+    r"(?i)\b(can)(not)\b|\b(d)('ye)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(lem)(me)\b|\b(more)('n)\b"
+    r"|\b(wan)(na)(?!\S)")
+
+
+def nltk_tokens(content: str) -> set:
+    """
+    Generates the set of lowercase word tokens of content with nltk's sentence and word tokenizers.
+    """
+    return set(nltk_token_list(content))
+
+
+def nltk_token_list(content: str) -> List[str]:
+    """
+    Generates the lowercase word tokens of content in order, repeated tokens included.
+    """
+    import nltk  # slow to import, only paid by the callers of the nltk tokenizer
+    sent_tokens = nltk.sent_tokenize(content)
+    word_tokens = []
+    for sent in sent_tokens:
+        words = nltk.word_tokenize(sent)
+        for word in words:
+            # if word.isalpha():
+            word = word.strip(STRIP_CHARS)
+            if word == "":
+                continue
+            word_tokens.append(word.lower())
+    return word_tokens
+
+
+def _split_contraction(match) -> str:
+    first, second = [group for group in match.groups() if group is not None]
+    return first + " " + second
+
+
+def fast_tokens(content: str) -> set:
+    """
+    Generates the same set of tokens as nltk_tokens with a few passes of str.translate and precompiled regexes.
+    Only the set of stripped tokens is kept, so sentence splitting is not needed: punctuation that word_tokenize
+    would split off is turned into whitespace, and a split off period is stripped anyway.
+    """
+    word_tokens = {word.strip(STRIP_CHARS) for word in _fast_split(content).split()}
+    word_tokens.discard("")
+    return {word.lower() for word in word_tokens}
+
+
+def fast_token_list(content: str) -> List[str]:
+    """
+    Generates the tokens of fast_tokens in order, repeated tokens included.
+    """
+    word_tokens = (word.strip(STRIP_CHARS) for word in _fast_split(content).split())
+    return [word.lower() for word in word_tokens if word != ""]
+
+
+def _fast_split(content: str) -> str:
+    content = _SPLIT_RE.sub(" ", content.translate(_SPLIT_TABLE))
+    content = _CLITIC_RE.sub(r" \1", content)
+    return _CONTRACTION_RE.sub(_split_contraction, content)
+
+
+def get_tokenizer(name: str) -> Callable[[str], set]:
+    if name == TOKENIZER_FAST:
+        return fast_tokens
+    if name == TOKENIZER_NLTK:
+        return nltk_tokens
+    raise ValueError("unknown tokenizer " + name)
+
+
+def get_token_lister(name: str) -> Callable[[str], List[str]]:
+    """
+    Returns the tokenizer that keeps every occurrence of a token, for term frequencies.
+    """
+    if name == TOKENIZER_FAST:
+        return fast_token_list
+    if name == TOKENIZER_NLTK:
+        return nltk_token_list
+    raise ValueError("unknown tokenizer " + name)